@@ -4,14 +4,16 @@ from typing import Annotated
 from fastapi import Depends, FastAPI, HTTPException, Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.openapi.utils import get_openapi
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from api.config import AppConfig
+from api.models.audit import AuditQueue
 from api.models.response import Response
 from api.routers import (
     audit,
     catalogue,
+    changes,
     coffee,
     comment,
     config,
@@ -19,6 +21,7 @@ from api.routers import (
     extraType,
     getRoles,
     requirement,
+    search,
     tag,
     topic,
     export,
@@ -43,6 +46,8 @@ api.include_router(requirement.router)
 api.include_router(extraType.router)
 api.include_router(extraEntry.router)
 api.include_router(audit.router)
+api.include_router(search.router)
+api.include_router(changes.router)
 api.include_router(coffee.router)
 api.include_router(export.router)
 
@@ -55,6 +60,18 @@ async def head() -> None:
     pass
 
 
+@api.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> str:
+    """
+    Metrics in the Prometheus text format
+    """
+    return (
+        "# HELP reqdb_audit_queue_depth Audit rows waiting to be written by the audit queue\n"
+        "# TYPE reqdb_audit_queue_depth gauge\n"
+        f"reqdb_audit_queue_depth {await AuditQueue.depth()}\n"
+    )
+
+
 @api.get("/openapi.json")
 async def openapi(
     roles: Annotated[dict, Depends(getRoles)],
@@ -1,9 +1,14 @@
+import asyncio
+import logging
+import time
 from os import getenv
 from typing import Any
 
-import requests
+import httpx
 from joserfc.jwk import KeySet
 
+logger: logging.Logger = logging.getLogger(__name__)
+
 
 class AppConfig:
     """
@@ -17,6 +22,12 @@ class AppConfig:
 
     SESSION_SECRET_KEY: str = getenv("SESSION_SECRET_KEY", "")
     DATABASE_URI: str = getenv("DATABASE_URI", "sqlite:////tmp/ReqDB.sqlite')")
+    ASYNC_DATABASE_URI: str = getenv("ASYNC_DATABASE_URI", "")
+    ASYNC_DATABASE_DRIVERS: dict[str, str] = {
+        "sqlite": "aiosqlite",
+        "postgresql": "asyncpg",
+        "mssql": "aioodbc",
+    }
 
     OAUTH_CLIENT_ID: str = getenv("OAUTH_CLIENT_ID", "")
     OAUTH_CLIENT_SECRET: str = getenv("OAUTH_CLIENT_SECRET", "")
@@ -32,6 +43,23 @@ class AppConfig:
     JWT_DECODE_ISSUER: str = ""
     JWT_PUBLIC_KEYS: KeySet
     JWT_JWK_URI: str = ""
+    JWT_JWK_REFRESH_INTERVAL: int = int(getenv("JWT_JWK_REFRESH_INTERVAL", 3600))
+    JWT_JWK_MIN_REFETCH_INTERVAL: int = 30
+    JWT_JWK_FETCHED_AT: float = 0
+    JWT_JWK_REFETCH_ATTEMPTED_AT: float = 0
+    JWT_JWK_REFETCH: asyncio.Task | None = None
+    JWT_CLAIMS_CACHE_SIZE: int = int(getenv("JWT_CLAIMS_CACHE_SIZE", 1024))
+    USER_CACHE_TTL: int = int(getenv("USER_CACHE_TTL", 300))
+    CATALOGUE_CACHE_TTL: int = int(getenv("CATALOGUE_CACHE_TTL", 3600))
+    ETAG_ACTIVE: bool = bool(int(getenv("ETAG_ACTIVE", 1)))
+    CHANGE_FEED_ACTIVE: bool = bool(int(getenv("CHANGE_FEED_ACTIVE", 1)))
+    AUDIT_QUEUE: str = getenv("AUDIT_QUEUE", "")
+    AUDIT_BATCH_SIZE: int = int(getenv("AUDIT_BATCH_SIZE", 500))
+    AUDIT_MAX_LATENCY: float = float(getenv("AUDIT_MAX_LATENCY", 1))
+    AUDIT_SNAPSHOT_INTERVAL: int = int(getenv("AUDIT_SNAPSHOT_INTERVAL", 20))
+    AUDIT_RETENTION_INTERVAL: int = int(getenv("AUDIT_RETENTION_INTERVAL", 3600))
+    AUDIT_ARCHIVE_PATH: str = getenv("AUDIT_ARCHIVE_PATH", "archive")
+    SOFT_DELETE_PURGE_INTERVAL: int = int(getenv("SOFT_DELETE_PURGE_INTERVAL", 3600))
 
     BASE_URL: str = getenv("BASE_URL", "http://localhost")
 
@@ -95,27 +123,29 @@ class AppConfig:
     }
 
     @classmethod
-    def getJWKs(cls) -> None:
+    async def getJWKs(cls) -> None:
         """
-        Returns the jwt signing keys from the authorities jwk list as dictionary
-        with kid -> pem
+        Fetches the jwt signing keys from the authorities jwk list and sets them as JWT_PUBLIC_KEYS
 
-        :return dict: Dict with kid: pem
+        :raises HTTPStatusError: Raises if the HTTP status is not ok
         """
-        response: requests.Response = requests.get(AppConfig.JWT_JWK_URI)
+        async with httpx.AsyncClient(timeout=10) as client:
+            response: httpx.Response = await client.get(cls.JWT_JWK_URI)
         response.raise_for_status()
-        cls.JWT_PUBLIC_KEYS: KeySet = KeySet.import_key_set(response.json())
+        cls.JWT_PUBLIC_KEYS = KeySet.import_key_set(response.json())
+        cls.JWT_JWK_FETCHED_AT = time.monotonic()
 
     @classmethod
-    def getOpenIdConfig(cls) -> None:
+    async def getOpenIdConfig(cls) -> None:
         """
         Fetches the oidc config from the provided config URL and sets the issuer and the jwk URI
 
         :raises AssertionError: Raises if "issuer" or "jwks_uri" are not present in the config
-        :raises HTTPError: Raises if the HTTP status is not ok
-        :raises requests.exceptions.JSONDecodeError: Raises if oauth config can't be decoded as json
+        :raises HTTPStatusError: Raises if the HTTP status is not ok
+        :raises JSONDecodeError: Raises if oauth config can't be decoded as json
         """
-        response: requests.Response = requests.get(cls.OAUTH_CONFIG)
+        async with httpx.AsyncClient(timeout=10) as client:
+            response: httpx.Response = await client.get(cls.OAUTH_CONFIG)
         response.raise_for_status()
         openIdConfig: dict = response.json()
 
@@ -127,6 +157,52 @@ class AppConfig:
         cls.JWT_JWK_URI = openIdConfig["jwks_uri"]
         cls.OAUTH_TOKEN_ENDPOINT = openIdConfig["token_endpoint"]
 
+    @classmethod
+    async def getOpenIdConfigAndJWKs(cls) -> None:
+        """
+        Fetches the oidc config and afterwards the jwt signing keys listed in the config
+        """
+        await cls.getOpenIdConfig()
+        await cls.getJWKs()
+
+    @classmethod
+    async def refetchJWKs(cls) -> bool:
+        """
+        Refetches the jwt signing keys, e.g. when a token is signed with an unknown kid.
+        Concurrent calls share one request and the keys are fetched at most every JWT_JWK_MIN_REFETCH_INTERVAL seconds,
+        failed attempts count as well so an unavailable authority is not asked for every token
+
+        :return bool: True if the keys were fetched
+        """
+        if cls.JWT_JWK_REFETCH is None or cls.JWT_JWK_REFETCH.done():
+            now: float = time.monotonic()
+            if (
+                now - max(cls.JWT_JWK_FETCHED_AT, cls.JWT_JWK_REFETCH_ATTEMPTED_AT)
+                < cls.JWT_JWK_MIN_REFETCH_INTERVAL
+            ):
+                return False
+            cls.JWT_JWK_REFETCH_ATTEMPTED_AT = now
+            cls.JWT_JWK_REFETCH = asyncio.create_task(cls.getJWKs())
+        try:
+            await asyncio.shield(cls.JWT_JWK_REFETCH)
+        except Exception as e:
+            logger.error(f"Can't refetch the jwt signing keys: {e}")
+            return False
+        return True
+
+    @classmethod
+    async def refreshOpenIdConfigAndJWKs(cls) -> None:
+        """
+        Refreshes the oidc config and the jwt signing keys every JWT_JWK_REFRESH_INTERVAL seconds.
+        Runs until cancelled, failed refreshes keep the current keys
+        """
+        while True:
+            await asyncio.sleep(cls.JWT_JWK_REFRESH_INTERVAL)
+            try:
+                await cls.getOpenIdConfigAndJWKs()
+            except Exception as e:
+                logger.error(f"Can't refresh the oidc config and jwt signing keys: {e}")
+
     @classmethod
     def setEmailActiveStatus(cls) -> None:
         """
@@ -202,10 +278,28 @@ class AppConfig:
             },
             "SOFT_DELETE": {
                 "value": "false",
-                "description": "If enabled items are not deleted from the database and only marked as deleted. (NOT IMPLEMENTED. ONLY PLACEHOLDER)",
+                "description": "If enabled items are not deleted from the database and only marked as deleted.",
                 "type": "boolean",
                 "category": "behavior",
             },
+            "SOFT_DELETE_RETENTION_DAYS": {
+                "value": "30",
+                "description": "Days items marked as deleted are kept before they are removed from the database (0 keeps them).",
+                "type": "integer",
+                "category": "behavior",
+            },
+            "AUDIT_RETENTION_DAYS": {
+                "value": "0",
+                "description": "Days audit log entries are kept in the database. Older entries are removed (0 keeps all entries).",
+                "type": "integer",
+                "category": "audit",
+            },
+            "AUDIT_ARCHIVE": {
+                "value": "true",
+                "description": "Write audit log entries to compressed archive files before they are removed by the retention.",
+                "type": "boolean",
+                "category": "audit",
+            },
             "JIRA_ACTIVE": {
                 "value": "false",
                 "description": "Activates export support for Jira.",
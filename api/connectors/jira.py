@@ -8,11 +8,14 @@ from fastapi import Request
 from fastapi.datastructures import URL
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.exc import DatabaseError
-from sqlmodel import Session, select
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from api.config import AppConfig
 from api.connectors import ConnectorConfig
 from api.error import BadRequest, Unauthorized, raiseDBErrorReadable
+from api.models import asyncEngine
 from api.models.db import Requirement, Token, User
 from api.models.insert import Insert
 from api.models.public import Export
@@ -21,11 +24,10 @@ from helper.cache import EncryptedRedisCache
 
 class Jira:
 
-    def __init__(self, session: Session) -> None:
+    def __init__(self) -> None:
         if ConnectorConfig.Atlassian.TENANT:
             self.client = httpx.Client()
             self.cloudId: str = self.getCloudId(ConnectorConfig.Atlassian.TENANT)
-            self.session: Session = session
             oauth = OAuth(update_token=self.updateToken)
             oauth.register(
                 name="AtlassianID",
@@ -49,12 +51,15 @@ class Jira:
             raise ValueError("Atlassian connection not configured")
 
     async def fetchToken(self, request: Request) -> dict[str, str | int] | None:
-        user: User | None = self.session.get(User, request.user)
-        if user is None:
-            raise Unauthorized(detail="User Id not found")
-        for token in user.tokens:
-            if token.name == "AtlassianID":
-                return token.to_token()
+        async with AsyncSession(asyncEngine) as session:
+            user: User | None = await session.get(
+                User, request.user, options=[selectinload(User.tokens)]
+            )
+            if user is None:
+                raise Unauthorized(detail="User Id not found")
+            for token in user.tokens:
+                if token.name == "AtlassianID":
+                    return token.to_token()
         return None
 
     def getCloudId(self, tenant) -> str:
@@ -85,30 +90,34 @@ class Jira:
     async def updateToken(
         self, name: str, token: dict, refresh_token=None, access_token=None
     ):
-        tokenDB: Token | None = None
-        if refresh_token:
-            tokenDB = self.session.exec(
-                select(Token)
-                .where(Token.name == name)
-                .where(Token.refresh_token == refresh_token)
-            ).first()
-        elif access_token:
-            tokenDB = self.session.exec(
-                select(Token)
-                .where(Token.name == name)
-                .where(Token.access_token == access_token)
-            ).first()
-
-        if tokenDB:
-            tokenDB.access_token = token["access_token"]
-            tokenDB.refresh_token = token["refresh_token"]
-            tokenDB.expires_at = token["expires_at"]
-            try:
-                self.session.commit()
-            except DatabaseError as e:
-                raiseDBErrorReadable(e)
-
-            self.session.add(tokenDB)
+        async with AsyncSession(asyncEngine) as session:
+            tokenDB: Token | None = None
+            if refresh_token:
+                tokenDB = (
+                    await session.exec(
+                        select(Token)
+                        .where(Token.name == name)
+                        .where(Token.refresh_token == refresh_token)
+                    )
+                ).first()
+            elif access_token:
+                tokenDB = (
+                    await session.exec(
+                        select(Token)
+                        .where(Token.name == name)
+                        .where(Token.access_token == access_token)
+                    )
+                ).first()
+
+            if tokenDB:
+                tokenDB.access_token = token["access_token"]
+                tokenDB.refresh_token = token["refresh_token"]
+                tokenDB.expires_at = token["expires_at"]
+                session.add(tokenDB)
+                try:
+                    await session.commit()
+                except DatabaseError as e:
+                    raiseDBErrorReadable(e)
 
     async def login(
         self, userId: str, request: Request, browser: bool
@@ -154,26 +163,29 @@ class Jira:
 
     async def connectUser(self, userId: str, token: Insert.Token) -> None:
         token.userId = userId
-        user: User | None = self.session.get(User, userId)
-        if user is None:
-            raise Unauthorized(detail="User ID not found")
+        async with AsyncSession(asyncEngine) as session:
+            user: User | None = await session.get(
+                User, userId, options=[selectinload(User.tokens)]
+            )
+            if user is None:
+                raise Unauthorized(detail="User ID not found")
 
-        tokenDB: Token = Token.model_validate(token)
+            tokenDB: Token = Token.model_validate(token)
 
-        for userToken in user.tokens:
-            if userToken.name == "AtlassianID":
-                self.session.delete(userToken)
-        try:
-            self.session.commit()
-        except DatabaseError as e:
-            raiseDBErrorReadable(e)
+            for userToken in user.tokens:
+                if userToken.name == "AtlassianID":
+                    await session.delete(userToken)
+            try:
+                await session.commit()
+            except DatabaseError as e:
+                raiseDBErrorReadable(e)
 
-        self.session.add(tokenDB)
-        try:
-            self.session.commit()
-        except DatabaseError as e:
-            raiseDBErrorReadable(e)
-        self.session.refresh(tokenDB)
+            session.add(tokenDB)
+            try:
+                await session.commit()
+            except DatabaseError as e:
+                raiseDBErrorReadable(e)
+            await session.refresh(tokenDB)
 
     async def createIssueFromRequirement(
         self,
@@ -1,15 +1,31 @@
 import smtplib
 import time
+from collections.abc import AsyncGenerator, Sequence
 from email.message import EmailMessage
+from typing import Annotated, Any
 from urllib.parse import urlparse
 
-from fastapi import Response
-from sqlmodel import Session, select
+from fastapi import Query
+from fastapi import Response as FastAPIResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import DDL, inspect
+from sqlalchemy.orm import joinedload, load_only
+from sqlalchemy.schema import CreateColumn
+from sqlmodel import Session, SQLModel, and_, col, func, or_, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
 
 from api.config import AppConfig
 from api.error import ConflictError, NotFound
-from api.models import engine
-from api.models.db import Comment, Configuration, Topic, User
+from api.models import asyncEngine, engine
+from api.models.configuration import DynamicConfiguration
+from api.models.db import Comment, Configuration, Requirement, Topic, User
+from api.models.response import Pagination, Response, Serializer
+from api.models.tree import CommentThread
+
+# maximum number of IDs in one IN query, e.g. for batches
+IN_BATCH_SIZE = 1000
 
 
 def checkAndUpdateConfigDB():
@@ -34,8 +50,14 @@ def checkAndUpdateConfigDB():
             else:
                 if config["description"] != item.description:
                     item.description = config["description"]
-                if config["type"] != item.description:
+                if config["type"] != item.type:
                     item.type = config["type"]
+                    try:
+                        item.value = DynamicConfiguration.validate(
+                            item.type, item.value
+                        )
+                    except ValueError:
+                        item.value = config["value"]
                 if config["category"] != item.category:
                     item.category = config["category"]
                 session.add(item)
@@ -46,6 +68,43 @@ def checkAndUpdateConfigDB():
         session.commit()
 
 
+def createMissingIndexes():
+    """
+    Creates indexes which were added to the models after their tables were created.
+    SQLModel.metadata.create_all only creates indexes together with new tables
+    """
+
+    with engine.begin() as connection:
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+def createMissingColumns():
+    """
+    Adds columns which were added to the models after their tables were created.
+    SQLModel.metadata.create_all only creates columns together with new tables.
+    New columns need a server default or must be nullable
+    """
+
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing: set[str] = {
+                column["name"] for column in inspector.get_columns(table.name)
+            }
+            for column in table.columns:
+                if column.name not in existing:
+                    connection.execute(
+                        DDL(
+                            f"ALTER TABLE {connection.dialect.identifier_preparer.format_table(table)} "
+                            f"ADD COLUMN {CreateColumn(column).compile(connection)}"
+                        )
+                    )
+
+
 def sendNotificationMail(recipient: str, subject: str, content: str):
     """
     Sends an email notification to a specific recipient
@@ -76,41 +135,323 @@ def sendNotificationMail(recipient: str, subject: str, content: str):
         s.sendmail(AppConfig.EMAIL_FROM, recipient, msg.as_string())
 
 
-def checkParentTopicChildren(
-    topicID: int | None, session: Session, forRequirements: bool = False
+async def checkParentTopicChildren(
+    topicID: int | None, session: AsyncSession, forRequirements: bool = False
 ):
     """
     Checks if the topic has topic or requirements of children
 
     :param int topicID: The topic ID to check
-    :param Session session: The DB session
+    :param AsyncSession session: The DB session
     :param bool forRequirements: True if you want to check for adding a requirement, defaults to False
     :raises NotFound: Raises if the topic with the ID is not found
     :raises ConflictError: Raises, if the topic already has requirements when searching for requirements
     :raises ConflictError: Raises, if the topic has already children when searching for children
     """
     if topicID:
-        topic = session.get(Topic, topicID)
-        if not topic:
-            raise NotFound(detail="Parent not found")
-        if forRequirements and len(topic.requirements) > 0:
-            raise ConflictError(
-                detail=[
+        await checkParentTopicsChildren({topicID}, session, forRequirements)
+
+
+async def checkParentTopicsChildren(
+    topicIDs: set[int], session: AsyncSession, forRequirements: bool = False
+):
+    """
+    Checks if the topics have topic or requirements of children with one query per check (used for batches)
+
+    :param set[int] topicIDs: The topic IDs to check
+    :param AsyncSession session: The DB session
+    :param bool forRequirements: True if you want to check for adding a requirement, defaults to False
+    :raises NotFound: Raises if a topic with the ID is not found
+    :raises ConflictError: Raises, if a topic already has requirements when searching for requirements
+    :raises ConflictError: Raises, if a topic has already children when searching for children
+    """
+    if len(topicIDs) == 0:
+        return
+    found = await getByIds(session, Topic, topicIDs, raiseNotFound=False)
+    if len(found) < len(topicIDs):
+        raise NotFound(detail="Parent not found")
+    column = col(Requirement.parentId) if forRequirements else col(Topic.parentId)
+    occupied: Sequence[int] = (
+        await session.exec(select(column).where(column.in_(topicIDs)).distinct())
+    ).all()
+    if len(occupied) > 0:
+        raise ConflictError(
+            detail=(
+                [
                     "Can't add child to parent Topic",
                     "Topic has already requirements.",
                 ]
-            )
-        if not forRequirements and len(topic.children) > 0:
-            raise ConflictError(
-                detail=[
+                if forRequirements
+                else [
                     "Can't add requirement to parent Topic",
                     "Topic has already children.",
                 ]
             )
+            + (
+                [f"Topic IDs: {', '.join(str(id) for id in sorted(occupied))}"]
+                if len(topicIDs) > 1
+                else []
+            )
+        )
+
+
+async def countRows(
+    session: AsyncSession, model: type[SQLModel], condition: Any
+) -> int:
+    """
+    Counts the rows of a table matching a condition without loading them (e.g. the children of a topic)
+
+    :param AsyncSession session: The DB session
+    :param type[SQLModel] model: The table
+    :param Any condition: The where condition of the rows
+    :return int: The number of rows
+    """
+    return (
+        await session.exec(select(func.count()).select_from(model).where(condition))
+    ).one()
+
+
+async def getByIds(
+    session: AsyncSession,
+    model: type[SQLModel],
+    ids: set[int],
+    options: Sequence = (),
+    raiseNotFound: bool = True,
+) -> dict[int, Any]:
+    """
+    Loads the rows of a table by their IDs with IN queries of IN_BATCH_SIZE IDs each instead of one query per ID
+
+    :param AsyncSession session: The DB session
+    :param type[SQLModel] model: The table class (e.g. Tag)
+    :param set[int] ids: The IDs to load
+    :param Sequence options: Loader options for the rows
+    :param bool raiseNotFound: Raise if not all rows are found, defaults to True
+    :raises NotFound: Raises if a row with an ID is not found
+    :return dict[int, Any]: The rows by their ID ordered by ID
+    """
+    ordered: list[int] = sorted(ids)
+    rows: dict[int, Any] = {}
+    for i in range(0, len(ordered), IN_BATCH_SIZE):
+        statement = select(model).where(
+            col(model.id).in_(ordered[i : i + IN_BATCH_SIZE])  # type: ignore
+        )
+        for row in (await session.exec(statement.options(*options))).all():
+            rows[row.id] = row  # type: ignore
+    missing: list[int] = [id for id in ordered if id not in rows]
+    if raiseNotFound and len(missing) > 0:
+        raise NotFound(
+            detail=f"{model.__name__} with ID {', '.join(str(id) for id in missing)} not found"
+        )
+    return dict(sorted(rows.items()))
+
+
+async def setAssociations(
+    session: AsyncSession,
+    item: SQLModel,
+    name: str,
+    model: type[SQLModel],
+    ids: list[int],
+) -> None:
+    """
+    Sets a many to many relationship (e.g. Requirement.tags) to the rows with the IDs.
+    Only the difference to the current associations is changed and only the rows not associated yet
+    are loaded with their ID column (see getByIds). The relationship has to be loaded for persistent items
+
+    :param AsyncSession session: The DB session
+    :param SQLModel item: The item owning the relationship (e.g. a Requirement)
+    :param str name: The name of the relationship (e.g. tags)
+    :param type[SQLModel] model: The table class of the associated rows (e.g. Tag)
+    :param list[int] ids: The IDs of the rows which should be associated
+    :raises NotFound: Raises if rows with the IDs are not found
+    """
+    collection: list = getattr(item, name)
+    current: dict[int, Any] = {row.id: row for row in collection}
+    wanted: dict[int, None] = dict.fromkeys(ids)
+    new: dict[int, Any] = await getByIds(
+        session,
+        model,
+        set(wanted) - current.keys(),
+        [load_only(model.id)],  # type: ignore
+    )
+    for id, row in current.items():
+        if id not in wanted:
+            collection.remove(row)
+    for id in wanted:
+        if id in new:
+            collection.append(new[id])
+
+
+class Paginator:
+    """
+    Keyset pagination for the list and find endpoints. Used as dependency (Annotated[Paginator, Depends()]).
+    Items are ordered by their id and a page starts after the id given as cursor,
+    so a page is fetched with an index range scan independent of its position.
+    Without a limit all items are returned to keep the behavior for existing clients.
+    """
+
+    STREAM_BATCH_SIZE: int = 100
+
+    def __init__(
+        self,
+        limit: Annotated[int | None, Query(ge=1, le=1000)] = None,
+        after: int | None = None,
+        total: bool = False,
+    ):
+        """
+        :param int | None limit: Maximum number of items in the page, defaults to None (all items)
+        :param int | None after: Cursor (id of the last item of the previous page), defaults to None
+        :param bool total: Count all items matching the query, defaults to False
+        """
+        self.limit = limit
+        self.after = after
+        self.total = total
+        self.page: Pagination | None = None
+
+    async def fetch(
+        self,
+        session: AsyncSession,
+        statement: SelectOfScalar,
+        model: Any,
+        orderBy: Any = None,
+        descending: bool = False,
+    ) -> Sequence:
+        """
+        Executes the statement for the requested page and sets the page information.
+        If orderBy is given the items are ordered by (orderBy, id) and the cursor position
+        is resolved from the item with the cursor id, so the cursor stays the id of the last item.
+
+        :param AsyncSession session: The DB session
+        :param SelectOfScalar statement: The select statement for the list (including filters and loader options)
+        :param Any model: The selected table class (needs an id column)
+        :param Any orderBy: Column to order by before the id, defaults to None (only the id)
+        :param bool descending: Order descending, defaults to False
+        :return Sequence: The items of the page
+        """
+        total: int | None = await self._total(session, statement)
+        statement = self._pageStatement(statement, model, orderBy, descending)
+        if self.limit is not None:
+            statement = statement.limit(self.limit + 1)
+        items = (await session.exec(statement)).unique().all()
+        cursor: int | None = None
+        if self.limit is not None and len(items) > self.limit:
+            items = items[: self.limit]
+            cursor = items[-1].id
+        self.page = Pagination(
+            limit=self.limit, count=len(items), next=cursor, total=total
+        )
+        return items
+
+    async def respond(
+        self,
+        session: AsyncSession,
+        statement: SelectOfScalar,
+        model: Any,
+        responseClass: Any,
+        orderBy: Any = None,
+        descending: bool = False,
+    ) -> FastAPIResponse:
+        """
+        Returns the response for the requested page.
+        Without a limit the items are streamed from a server side cursor in batches of STREAM_BATCH_SIZE,
+        so the memory needed for a request does not depend on the size of the table
+
+        :param AsyncSession session: The DB session
+        :param SelectOfScalar statement: The select statement for the list (including filters and loader options)
+        :param Any model: The selected table class (needs an id column)
+        :param Any responseClass: The list response class (e.g. Response.Requirement.List)
+        :param Any orderBy: Column to order by before the id, defaults to None (only the id)
+        :param bool descending: Order descending, defaults to False
+        :return FastAPIResponse: The JSON response
+        """
+        if self.limit is not None:
+            items = await self.fetch(session, statement, model, orderBy, descending)
+            return Response.buildResponse(responseClass, items, page=self.page)  # type: ignore
+        total: int | None = await self._total(session, statement)
+        statement = self._pageStatement(statement, model, orderBy, descending)
+        dataModel = Serializer.dataModel(responseClass)
+
+        async def streamItems() -> AsyncGenerator[bytes, None]:
+            count: int = 0
+            yield b'{"status":200,"data":['
+            async with AsyncSession(asyncEngine) as streamSession:
+                result = await streamSession.stream_scalars(
+                    statement.execution_options(yield_per=self.STREAM_BATCH_SIZE)
+                )
+                async for partition in result.partitions():
+                    yield b"".join(
+                        (b"," if count + i > 0 else b"")
+                        + Serializer.dumpItem(item, dataModel)
+                        for i, item in enumerate(partition)
+                    )
+                    count += len(partition)
+                    for item in partition:
+                        streamSession.expunge(item)
+            page = Pagination(limit=None, count=count, next=None, total=total)
+            yield b'],"page":' + page.model_dump_json().encode() + b"}"
+
+        return StreamingResponse(streamItems(), media_type="application/json")
+
+    async def _total(
+        self, session: AsyncSession, statement: SelectOfScalar
+    ) -> int | None:
+        """
+        Counts all items matching the statement if the total was requested
+
+        :param AsyncSession session: The DB session
+        :param SelectOfScalar statement: The select statement for the list
+        :return int | None: The number of items or None if the total was not requested
+        """
+        if self.total is False:
+            return None
+        return (
+            await session.exec(
+                select(func.count()).select_from(statement.order_by(None).subquery())
+            )
+        ).one()
+
+    def _pageStatement(
+        self, statement: SelectOfScalar, model: Any, orderBy: Any, descending: bool
+    ) -> SelectOfScalar:
+        """
+        Orders the statement by (orderBy, id) and restricts it to the items behind the cursor
+
+        :param SelectOfScalar statement: The select statement for the list
+        :param Any model: The selected table class
+        :param Any orderBy: Column to order by before the id or None
+        :param bool descending: Order descending
+        :return SelectOfScalar: The ordered statement
+        """
+        id = col(model.id)
+        columns = [id] if orderBy is None else [col(orderBy), id]
+        statement = statement.order_by(
+            *[c.desc() if descending else c.asc() for c in columns]
+        )
+        if self.after is not None:
+            statement = statement.where(self._afterCursor(model, columns, descending))
+        return statement
+
+    def _afterCursor(self, model: Any, columns: list, descending: bool):
+        """
+        Builds the where clause for all items behind the cursor in the given order
+
+        :param Any model: The selected table class
+        :param list columns: The order columns, the id is always the last one
+        :param bool descending: Order descending
+        :return ColumnElement[bool]: The where clause
+        """
+        id = columns[-1]
+        after = id < self.after if descending else id > self.after
+        if len(columns) == 1:
+            return after
+        cursorValue = (
+            select(columns[0]).where(col(model.id) == self.after).scalar_subquery()
+        )
+        behind = columns[0] < cursorValue if descending else columns[0] > cursorValue
+        return or_(behind, and_(columns[0] == cursorValue, after))
 
 
 class RequestTimer:
-    def __init__(self, response: Response, target: str):
+    def __init__(self, response: FastAPIResponse, target: str):
         self.response = response
         self.target = target
         self.startTime: int
@@ -130,23 +471,37 @@ class RequestTimer:
             ] += f",{self.target};dur={str(processTime/1000000)}"
 
 
-async def sendNotificationMailForNewComment(session: Session, commentID: int):
+async def sendNotificationMailForNewComment(commentID: int):
     """
     Sends an email notification to users when they activated to receive those for new comments.
     This is only activated when the AppConfig is set up correctly
 
-    :param Session session: DB Session
     :param int commentID: Id for the new comment
     """
 
     if AppConfig.EMAIL_ACTIVE is True:
-        comment = session.get(Comment, commentID)
-        if comment:
-            emailRecipientsFromChain = checkParentCommentAuthor(comment.parent)
+        async with AsyncSession(asyncEngine) as session:
+            comment = await session.get(
+                Comment,
+                commentID,
+                options=[
+                    joinedload(Comment.requirement),
+                    joinedload(Comment.author),
+                ],
+            )
+            if not comment:
+                return
+            emailRecipientsFromChain = (
+                await CommentThread.chainRecipients(session, comment.parentId)
+                if comment.parentId is not None
+                else set()
+            )
             emailRecipientsFromRequirement = (
-                session.exec(
-                    select(User).where(
-                        User.notificationMailOnRequirementComment == True
+                (
+                    await session.exec(
+                        select(User).where(
+                            User.notificationMailOnRequirementComment == True
+                        )
                     )
                 )
                 .unique()
@@ -158,7 +513,8 @@ async def sendNotificationMailForNewComment(session: Session, commentID: int):
                     AppConfig.EMAIL_SEND_SELF is True
                     or chainRecipient != comment.author.email
                 ):
-                    sendNotificationMail(
+                    await run_in_threadpool(
+                        sendNotificationMail,
                         chainRecipient,
                         f"A user added a comment to a chain you are participating in (Requirement: {comment.requirement.key})",
                         f"{comment.author.email} added following comment to {comment.requirement.key} in reply to a comment from you:\n\n-------\n{comment.comment}\n-------\n\nGo to the requirement: {AppConfig.BASE_URL}/Browse/Requirement/{comment.requirement.id}",
@@ -174,28 +530,9 @@ async def sendNotificationMailForNewComment(session: Session, commentID: int):
                         or recipient.id != comment.authorId
                     )
                 ):
-                    sendNotificationMail(
+                    await run_in_threadpool(
+                        sendNotificationMail,
                         recipient.email,
                         f"A user added a new comment to a requirement ({comment.requirement.key})",
                         f"{comment.author.email} added following comment to {comment.requirement.key}:\n\n-------\n{comment.comment}\n-------\n\nGo to the requirement: {AppConfig.BASE_URL}/Browse/Requirement/{comment.requirement.id}",
                     )
-
-
-def checkParentCommentAuthor(comment: Comment | None) -> set:
-    """
-    Returns a set of authors for a comment chain with activated notification on comment
-
-    :param Comment comment: The comment to search
-    :return set: A set of notification recipients
-    """
-    r = []
-    if comment is not None:
-        if comment.parentId is not None:
-            r += checkParentCommentAuthor(comment.parent)
-        if (
-            comment.author.notificationMailOnCommentChain is True
-            and comment.author.active is True
-            and comment.author.service is False
-        ):
-            r.append(comment.author.email)
-    return set(r)
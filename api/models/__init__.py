@@ -1,11 +1,21 @@
+from collections.abc import Sequence
 from typing import Annotated
 
 from fastapi import Depends
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Field, Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from api.config import AppConfig
+from api.models.audit import AuditQueue, AuditTrail
 from api.models.base import UserBase
-from api.models.db import Audit, TableBase
+from api.models.changes import SessionChanges
+# registers the listeners of the soft delete (do_orm_execute, before_flush) for all sessions
+from api.models.softdelete import SoftDelete  # noqa: F401
+from api.models.db import TableBase
+from helper.cache import CatalogueCache, DataVersion, InvalidationBus
+from helper.feed import ChangeFeed
 
 
 class EntityBase(SQLModel):
@@ -18,23 +28,69 @@ def get_session():
         yield session
 
 
+async def get_async_session():
+    async with AsyncSession(asyncEngine, expire_on_commit=False) as session:
+        try:
+            yield session
+        finally:
+            await publishCommitted(session)
+
+
+async def publishCommitted(session: AsyncSession) -> None:
+    """
+    Passes the changes committed by a session to the caches, the change feed and the audit queue.
+    Sessions which are not created by get_async_session have to call it after their last commit
+
+    :param AsyncSession session: The DB session
+    """
+    catalogues: set[int] = SessionChanges.committedCatalogues(session)
+    changes: list[dict] = SessionChanges.committedEvents(session)
+    await CatalogueCache.invalidate(catalogues)
+    await InvalidationBus.publish(changes)
+    await ChangeFeed.publish(changes, catalogues)
+    if len(SessionChanges.committedTables(session)) > 0:
+        await DataVersion.increment()
+    await AuditQueue.put(session, AuditTrail.committed(session))
+
+
+def getAsyncDatabaseURI() -> str:
+    """
+    Returns the database URI for the async engine.
+    If ASYNC_DATABASE_URI is not set the async driver is derived from the dialect of DATABASE_URI
+
+    :return str: Database URI with an async driver
+    """
+    if AppConfig.ASYNC_DATABASE_URI != "":
+        return AppConfig.ASYNC_DATABASE_URI
+    url = make_url(AppConfig.DATABASE_URI)
+    if url.get_backend_name() in AppConfig.ASYNC_DATABASE_DRIVERS:
+        url = url.set(
+            drivername=f"{url.get_backend_name()}+{AppConfig.ASYNC_DATABASE_DRIVERS[url.get_backend_name()]}"
+        )
+    return url.render_as_string(hide_password=False)
+
+
 if AppConfig.DATABASE_URI.startswith("sqlite"):
     connect_args = {"check_same_thread": False}
 else:
     connect_args = {}
 
-engine = create_engine(AppConfig.DATABASE_URI, connect_args=connect_args, pool_pre_ping=True)
+engine = create_engine(
+    AppConfig.DATABASE_URI, connect_args=connect_args, pool_pre_ping=True
+)
+asyncEngine = create_async_engine(getAsyncDatabaseURI(), pool_pre_ping=True)
 SessionDep = Annotated[Session, Depends(get_session)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session, scope="function")]
 
 
-def audit(session: Session, action: int, model: TableBase | UserBase, user: str):
-    session.add(
-        Audit(
-            userId=user,
-            table=model.__tablename__,
-            target_id=str(model.id),
-            action=action,
-            data=model.model_dump(mode="json") if action != 2 else {},
-        )
-    )
-    session.commit()
+def audit(session: AsyncSession, action: int, model: TableBase | UserBase, user: str):
+    AuditTrail.add(session, action, [model], user)
+
+
+def auditAll(
+    session: AsyncSession,
+    action: int,
+    models: Sequence[TableBase | UserBase],
+    user: str,
+):
+    AuditTrail.add(session, action, models, user)
@@ -0,0 +1,612 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import socket
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any
+
+from pydantic_core import to_jsonable_python
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import Session, SQLModel
+
+from api.config import AppConfig
+from api.models.base import timestamp
+from api.models.db import Audit, Configuration
+from helper.cache import DataVersion, EncryptedRedisCache
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+class AuditTrail:
+    """
+    Writes the audit log as part of the unit of work.
+    The routes register the audited objects with AuditTrail.add before the commit. Before the commit the session
+    is flushed and the audit rows are inserted, so the ids of new objects are known and the rows are committed
+    (or rolled back) together with the change in one transaction.
+    The payload is built from the loaded column state, so no relationship or expired attribute is loaded.
+    Pending entries are kept in session.info["audit"], rows deleted without loading them in session.info["auditDeleted"].
+    If the AuditQueue is active, the rows are handed to the queue after the commit instead of being inserted.
+
+    Insert rows store the full state (snapshot). Update rows store only the columns changed by the flushes
+    of the transaction (collected in session.info["auditChanges"]), every AUDIT_SNAPSHOT_INTERVAL row of an object
+    stores the full state again, so the state at an audit row is rebuilt from at most that many rows.
+    """
+
+    snapshotInterval: int = AppConfig.AUDIT_SNAPSHOT_INTERVAL
+
+    @staticmethod
+    def add(
+        session: Session | Any, action: int, models: Sequence[SQLModel], user: str
+    ) -> None:
+        """
+        Registers objects to be audited with the next commit
+
+        :param Session | AsyncSession session: The DB session
+        :param int action: The audited action (0: add, 1: update, 2: delete)
+        :param Sequence[SQLModel] models: The changed objects
+        :param str user: The id of the user changing the objects
+        """
+        session.info.setdefault("audit", []).extend(
+            (action, model, user) for model in models
+        )
+
+    @staticmethod
+    def addDeleted(
+        session: Session | Any, model: type[SQLModel], ids: Sequence[int], user: str
+    ) -> None:
+        """
+        Registers rows deleted without loading them (e.g. marked by the soft delete) to be audited with the next commit
+
+        :param Session | AsyncSession session: The DB session
+        :param type[SQLModel] model: The table of the rows
+        :param Sequence[int] ids: The ids of the deleted rows
+        :param str user: The id of the user deleting the rows
+        """
+        session.info.setdefault("auditDeleted", []).extend(
+            (model.__tablename__, str(id), user) for id in ids
+        )
+
+    @staticmethod
+    def data(model: SQLModel, keys: set[str] | None = None) -> dict:
+        """
+        Returns the audit payload of an object from its loaded column values
+
+        :param SQLModel model: The audited object
+        :param set[str] | None keys: Only these columns (diff), defaults to None (all columns)
+        :return dict: The JSON compatible column values
+        """
+        state = inspect(model)
+        return to_jsonable_python(
+            {
+                attribute.key: state.dict[attribute.key]
+                for attribute in state.mapper.column_attrs
+                if attribute.key in state.dict
+                and (keys is None or attribute.key in keys)
+            }
+        )
+
+    @staticmethod
+    def collectChanges(session: Session) -> None:
+        """
+        Adds the changed columns of the flushed objects to session.info["auditChanges"]
+
+        :param Session session: The flushing DB session
+        """
+        changes: dict = session.info.setdefault("auditChanges", {})
+        for model in session.dirty:
+            state = inspect(model)
+            keys: set[str] = {
+                attribute.key
+                for attribute in state.mapper.column_attrs
+                if state.attrs[attribute.key].history.has_changes()
+            }
+            if len(keys) > 0:
+                changes.setdefault(state.key, set()).update(keys)
+
+    @staticmethod
+    def snapshotTargets(
+        session: Session, updates: list[tuple[int, SQLModel, str]]
+    ) -> set[tuple[str, str]]:
+        """
+        Returns the updated objects which need a full snapshot, because they have no snapshot yet
+        or AUDIT_SNAPSHOT_INTERVAL rows since their last snapshot
+
+        :param Session session: The committing DB session
+        :param list[tuple[int, SQLModel, str]] updates: The registered updates
+        :return set[tuple[str, str]]: The table and target id of the objects which need a snapshot
+        """
+        if AuditTrail.snapshotInterval <= 1:
+            return {(m.__tablename__, str(m.id)) for _, m, _ in updates}  # type: ignore
+        audit = Audit.__table__
+        last = audit.alias("last")
+        lastSnapshot = (
+            select(func.max(last.c.timestamp))
+            .where(
+                last.c.table == audit.c.table,
+                last.c.target_id == audit.c.target_id,
+                last.c.snapshot == True,
+            )
+            .scalar_subquery()
+        )
+        targets: dict[str, set[str]] = {}
+        for _, model, _ in updates:
+            targets.setdefault(model.__tablename__, set()).add(str(model.id))  # type: ignore
+        snapshots: set[tuple[str, str]] = set()
+        for table, ids in targets.items():
+            counts: dict[str, int] = dict(
+                session.connection()
+                .execute(
+                    select(audit.c.target_id, func.count())
+                    .where(
+                        audit.c.table == table,
+                        audit.c.target_id.in_(ids),
+                        audit.c.timestamp >= func.coalesce(lastSnapshot, -1),
+                    )
+                    .group_by(audit.c.target_id)
+                )
+                .all()
+            )
+            snapshots.update(
+                (table, id)
+                for id in ids
+                if counts.get(id, 0) == 0 or counts[id] >= AuditTrail.snapshotInterval
+            )
+        return snapshots
+
+    @staticmethod
+    def write(session: Session) -> None:
+        """
+        Inserts the audit rows for the registered objects which were flushed.
+        Objects which were never added to the session have no id and are skipped
+
+        :param Session session: The committing DB session
+        """
+        entries: list[tuple[int, SQLModel, str]] = [
+            entry
+            for entry in session.info.pop("audit", [])
+            if entry[1].id is not None  # type: ignore
+        ]
+        changes: dict = session.info.pop("auditChanges", {})
+        snapshots: set[tuple[str, str]] = AuditTrail.snapshotTargets(
+            session, [entry for entry in entries if entry[0] == 1]
+        )
+        rows: list[dict] = []
+        for action, model, user in entries:
+            snapshot: bool = action == 0 or (
+                action == 1 and (model.__tablename__, str(model.id)) in snapshots  # type: ignore
+            )
+            rows.append(
+                {
+                    "timestamp": timestamp(),
+                    "table": model.__tablename__,
+                    "target_id": str(model.id),  # type: ignore
+                    "action": action,
+                    "data": (
+                        {}
+                        if action == 2
+                        else AuditTrail.data(
+                            model,
+                            (
+                                None
+                                if snapshot
+                                else changes.get(inspect(model).key, set())
+                            ),
+                        )
+                    ),
+                    "snapshot": snapshot,
+                    "userId": user,
+                }
+            )
+        rows.extend(
+            {
+                "timestamp": timestamp(),
+                "table": table,
+                "target_id": targetId,
+                "action": 2,
+                "data": {},
+                "snapshot": False,
+                "userId": user,
+            }
+            for table, targetId, user in session.info.pop("auditDeleted", [])
+        )
+        if len(rows) == 0:
+            return
+        if AuditQueue.active:
+            session.info.setdefault("auditQueued", []).extend(rows)
+        else:
+            session.connection().execute(insert(Audit.__table__), rows)  # type: ignore
+
+    @staticmethod
+    def committed(session: Session | Any) -> list[dict]:
+        """
+        Returns and resets the audit rows of the committed transactions of the session which wait for the AuditQueue
+
+        :param Session | AsyncSession session: The DB session
+        :return list[dict]: The audit rows
+        """
+        return session.info.pop("auditCommitted", [])
+
+    @staticmethod
+    async def state(session: Any, point: Audit) -> dict:
+        """
+        Rebuilds the state of the audited object at an audit row
+        from the last snapshot before the row and the diffs after it.
+        A delete row keeps the last state of the object
+
+        :param AsyncSession session: The DB session
+        :param Audit point: The audit row
+        :return dict: The column values of the object after the audited change
+        """
+        last = select(func.max(Audit.timestamp)).where(
+            Audit.table == point.table,
+            Audit.target_id == point.target_id,
+            Audit.snapshot == True,
+            Audit.timestamp <= point.timestamp,
+        )
+        rows = (
+            await session.exec(
+                select(Audit.action, Audit.data, Audit.snapshot, Audit.id)
+                .where(
+                    Audit.table == point.table,
+                    Audit.target_id == point.target_id,
+                    Audit.timestamp <= point.timestamp,
+                    Audit.timestamp
+                    >= func.coalesce(last.correlate(None).scalar_subquery(), -1),
+                )
+                .order_by(Audit.timestamp, Audit.id)
+            )
+        ).all()
+        state: dict = {}
+        for action, data, snapshot, id in rows:
+            if snapshot:
+                state = dict(data)
+            elif action == 1:
+                state.update(data)
+            if id == point.id:
+                break
+        return state
+
+
+class AuditQueue:
+    """
+    Optional asynchronous audit pipeline (AUDIT_QUEUE), so audit inserts do not compete with the writes of large imports.
+    The committed audit rows are enqueued and inserted by a background worker in batches of up to AUDIT_BATCH_SIZE rows,
+    at the latest AUDIT_MAX_LATENCY seconds after the first row of a batch was enqueued.
+
+    memory: The rows are kept in an in-process queue. Rows still queued are written when the worker stops,
+    rows of a crashed process are lost.
+    redis: The rows are added to a Redis stream and read with a consumer group. A row is acknowledged after it was
+    inserted, rows of a crashed worker are claimed by the next worker starting (at least once delivery).
+    If Redis is not available, the rows are inserted directly.
+
+    The DataVersion is incremented after every batch, so ETags of the audit log change when the rows are written.
+    """
+
+    mode: str = AppConfig.AUDIT_QUEUE
+    active: bool = mode in ("memory", "redis")
+    batchSize: int = AppConfig.AUDIT_BATCH_SIZE
+    maxLatency: float = AppConfig.AUDIT_MAX_LATENCY
+    store = EncryptedRedisCache.store
+    stream: str = "ReqDB:AuditQueue"
+    group: str = "ReqDB"
+    consumer: str = f"{socket.gethostname()}:{os.getpid()}"
+    # minimal idle time in ms before the rows of another consumer are claimed
+    claimIdleTime: int = 60000
+    queue: asyncio.Queue | None = None
+    # rows taken from the memory queue which are not inserted yet
+    batch: list[dict] = []
+
+    @classmethod
+    def _queue(cls) -> asyncio.Queue:
+        if cls.queue is None:
+            cls.queue = asyncio.Queue()
+        return cls.queue
+
+    @classmethod
+    async def put(cls, session: Any, rows: list[dict]) -> None:
+        """
+        Enqueues committed audit rows
+
+        :param AsyncSession session: The DB session which committed the rows, used if Redis is not available
+        :param list[dict] rows: The audit rows
+        """
+        if len(rows) == 0:
+            return
+        if cls.mode == "redis":
+            try:
+                async with cls.store.pipeline(transaction=False) as pipe:
+                    for row in rows:
+                        pipe.xadd(cls.stream, {"row": json.dumps(row)})
+                    await pipe.execute()
+                return
+            except RedisError as e:
+                logger.warning(
+                    f"Can't enqueue audit rows, inserting them directly: {e}"
+                )
+                await session.execute(insert(Audit.__table__), rows)  # type: ignore
+                await session.commit()
+                return
+        for row in rows:
+            cls._queue().put_nowait(row)
+
+    @classmethod
+    async def depth(cls) -> int:
+        """
+        Returns the number of audit rows waiting to be inserted
+
+        :return int: The queue depth
+        """
+        if cls.mode == "redis":
+            try:
+                return await cls.store.xlen(cls.stream)
+            except RedisError:
+                return 0
+        return cls._queue().qsize() + len(cls.batch)
+
+    @classmethod
+    async def work(cls, engine: AsyncEngine) -> None:
+        """
+        Inserts the queued audit rows in batches until it is cancelled. Runs as background task of the app
+
+        :param AsyncEngine engine: The async DB engine
+        """
+        if cls.mode == "redis":
+            while True:
+                try:
+                    await cls._consume(engine)
+                except RedisError as e:
+                    logger.error(f"Audit queue consumer failed: {e}")
+                    await asyncio.sleep(5)
+        queue: asyncio.Queue = cls._queue()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                cls.batch = [await queue.get()]
+                deadline: float = loop.time() + cls.maxLatency
+                while len(cls.batch) < cls.batchSize:
+                    try:
+                        cls.batch.append(
+                            await asyncio.wait_for(queue.get(), deadline - loop.time())
+                        )
+                    except TimeoutError:
+                        break
+                await cls._insert(engine, cls.batch)
+                cls.batch = []
+        except asyncio.CancelledError:
+            while not queue.empty():
+                cls.batch.append(queue.get_nowait())
+            if len(cls.batch) > 0:
+                await cls._insert(engine, cls.batch, retry=False)
+                cls.batch = []
+            raise
+
+    @classmethod
+    async def _consume(cls, engine: AsyncEngine) -> None:
+        """
+        Reads the audit rows from the Redis stream with the consumer group and inserts them in batches.
+        Rows of consumers which are idle for claimIdleTime and the own unacknowledged rows are inserted first
+
+        :param AsyncEngine engine: The async DB engine
+        """
+        try:
+            await cls.store.xgroup_create(cls.stream, cls.group, id="0", mkstream=True)
+        except ResponseError:
+            pass  # group exists
+        entries: list = (
+            await cls.store.xautoclaim(
+                cls.stream,
+                cls.group,
+                cls.consumer,
+                cls.claimIdleTime,
+                count=cls.batchSize,
+            )
+        )[1]
+        # "0" reads the pending rows of this consumer, ">" new rows
+        cursor: str = "0"
+        loop = asyncio.get_running_loop()
+        while True:
+            deadline: float = loop.time() + cls.maxLatency
+            while len(entries) < cls.batchSize:
+                block: int = int((deadline - loop.time()) * 1000)
+                if len(entries) > 0 and block <= 0:
+                    break
+                response = await cls.store.xreadgroup(
+                    cls.group,
+                    cls.consumer,
+                    {cls.stream: cursor},
+                    count=cls.batchSize - len(entries),
+                    block=max(block, 1) if len(entries) > 0 else 0,
+                )
+                streamEntries: list = response[0][1] if len(response) > 0 else []
+                if cursor == "0" and len(streamEntries) == 0:
+                    cursor = ">"
+                entries.extend(streamEntries)
+            await cls._insert(
+                engine, [json.loads(fields["row"]) for _, fields in entries]
+            )
+            ids: list[str] = [id for id, _ in entries]
+            await cls.store.xack(cls.stream, cls.group, *ids)
+            await cls.store.xdel(cls.stream, *ids)
+            entries = []
+
+    @classmethod
+    async def _insert(
+        cls, engine: AsyncEngine, rows: list[dict], retry: bool = True
+    ) -> None:
+        """
+        Inserts a batch of audit rows in one transaction. Failed inserts are retried after AUDIT_MAX_LATENCY seconds
+
+        :param AsyncEngine engine: The async DB engine
+        :param list[dict] rows: The audit rows
+        :param bool retry: Retry until the rows are inserted, defaults to True
+        """
+        while True:
+            try:
+                async with engine.begin() as connection:
+                    await connection.execute(insert(Audit.__table__), rows)  # type: ignore
+                break
+            except Exception as e:
+                logger.error(f"Can't insert {len(rows)} audit rows: {e}")
+                if not retry:
+                    return
+                await asyncio.sleep(cls.maxLatency)
+        await DataVersion.increment()
+
+
+class AuditArchive:
+    """
+    Retention of the audit log. Rows older than the AUDIT_RETENTION_DAYS (dynamic configuration, 0 keeps all rows)
+    are moved out of the audit table, so the audit table and the queries on it only cover the retention period.
+    If AUDIT_ARCHIVE is enabled, the expired rows are appended to gzip compressed monthly archives
+    (audit-YYYY-MM.ndjson.gz, one JSON row per line) in AUDIT_ARCHIVE_PATH before they are deleted.
+
+    The last snapshot of an object before the cutoff and the rows after it are kept, so every remaining row
+    can be rebuilt. Only objects without rows after the cutoff are removed completely.
+    The job runs every AUDIT_RETENTION_INTERVAL seconds in one worker at a time (Redis lock). The rows are archived and
+    deleted in batches, rows of an interrupted batch can be archived twice.
+    """
+
+    interval: int = AppConfig.AUDIT_RETENTION_INTERVAL
+    path: str = AppConfig.AUDIT_ARCHIVE_PATH
+    store = EncryptedRedisCache.store
+    lock: str = "ReqDB:AuditArchive"
+    batchSize: int = 1000
+
+    @staticmethod
+    def expired(cutoff: float):
+        """
+        Returns the condition for the expired audit rows
+
+        :param float cutoff: Rows older than this timestamp are expired
+        :return ColumnElement[bool]: The where condition
+        """
+        audit = Audit.__table__
+        other = audit.alias("other")
+        same = (other.c.table == audit.c.table) & (
+            other.c.target_id == audit.c.target_id
+        )
+        lastSnapshot = (
+            select(func.max(other.c.timestamp))
+            .where(same, other.c.snapshot == True, other.c.timestamp < cutoff)
+            .scalar_subquery()
+        )
+        newer = select(other.c.id).where(same, other.c.timestamp >= cutoff)
+        return (audit.c.timestamp < cutoff) & (
+            (audit.c.timestamp < lastSnapshot) | ~newer.exists()
+        )
+
+    @staticmethod
+    def run(engine: Any, now: float | None = None) -> int:
+        """
+        Archives and deletes the expired audit rows
+
+        :param Engine engine: The DB engine
+        :param float | None now: The current timestamp, defaults to None (now)
+        :return int: The number of removed rows
+        """
+        with Session(engine) as session:
+            days = session.get(Configuration, "AUDIT_RETENTION_DAYS")
+            archive = session.get(Configuration, "AUDIT_ARCHIVE")
+        if days is None or int(days.value or 0) <= 0:
+            return 0
+        cutoff: float = (now or timestamp()) - int(days.value) * 86400
+        archived: bool = archive is not None and archive.value == "true"
+        audit = Audit.__table__
+        removed: int = 0
+        while True:
+            with engine.begin() as connection:
+                rows = (
+                    connection.execute(
+                        select(audit)
+                        .where(AuditArchive.expired(cutoff))
+                        .order_by(audit.c.timestamp, audit.c.id)
+                        .limit(AuditArchive.batchSize)
+                    )
+                    .mappings()
+                    .all()
+                )
+                if len(rows) == 0:
+                    return removed
+                if archived:
+                    AuditArchive.write(rows)
+                connection.execute(
+                    delete(audit).where(audit.c.id.in_([row["id"] for row in rows]))
+                )
+                removed += len(rows)
+
+    @staticmethod
+    def write(rows: Sequence) -> None:
+        """
+        Appends audit rows to the monthly archives. Every append adds a gzip member, which gzip readers concatenate
+
+        :param Sequence rows: The audit rows
+        """
+        months: dict[str, list[str]] = {}
+        for row in rows:
+            month: str = datetime.fromtimestamp(row["timestamp"]).strftime("%Y-%m")
+            months.setdefault(month, []).append(
+                f"{json.dumps(to_jsonable_python(dict(row)))}\n"
+            )
+        os.makedirs(AuditArchive.path, exist_ok=True)
+        for month, lines in months.items():
+            with gzip.open(
+                os.path.join(AuditArchive.path, f"audit-{month}.ndjson.gz"), "at"
+            ) as archive:
+                archive.writelines(lines)
+
+    @classmethod
+    async def schedule(cls, engine: Any) -> None:
+        """
+        Runs the retention every AUDIT_RETENTION_INTERVAL seconds until it is cancelled. Runs as background task of the app
+
+        :param Engine engine: The DB engine
+        """
+        while True:
+            try:
+                if await cls.store.set(
+                    cls.lock, AuditQueue.consumer, nx=True, ex=cls.interval
+                ):
+                    if await asyncio.to_thread(cls.run, engine) > 0:
+                        await DataVersion.increment()
+            except RedisError as e:
+                logger.error(f"Can't lock the audit retention: {e}")
+            except Exception as e:
+                logger.error(f"Audit retention failed: {e}")
+            await asyncio.sleep(cls.interval)
+
+
+@event.listens_for(Session, "after_flush")
+def collectAuditChanges(session: Session, flushContext) -> None:
+    AuditTrail.collectChanges(session)
+
+
+@event.listens_for(Session, "before_commit")
+def writeAudit(session: Session) -> None:
+    if (
+        len(session.info.get("audit", [])) + len(session.info.get("auditDeleted", []))
+        > 0
+    ):
+        session.flush()
+        AuditTrail.write(session)
+
+
+@event.listens_for(Session, "after_commit")
+def commitAudit(session: Session) -> None:
+    session.info.pop("auditChanges", None)
+    if "auditQueued" in session.info:
+        session.info.setdefault("auditCommitted", []).extend(
+            session.info.pop("auditQueued")
+        )
+
+
+@event.listens_for(Session, "after_rollback")
+def discardAudit(session: Session) -> None:
+    session.info.pop("audit", None)
+    session.info.pop("auditDeleted", None)
+    session.info.pop("auditChanges", None)
+    session.info.pop("auditQueued", None)
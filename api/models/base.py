@@ -1,6 +1,7 @@
 from datetime import datetime
 
 from pydantic import computed_field
+from sqlalchemy import true
 from sqlmodel import JSON, Column, Field, SQLModel
 
 
@@ -43,6 +44,7 @@ class AuditBase(SQLModel):
     target_id: str = Field(index=True)
     action: int
     data: dict = Field(default_factory=dict, sa_column=Column(JSON))
+    snapshot: bool = Field(default=True, sa_column_kwargs={"server_default": true()})
 
     userId: str = Field(foreign_key="user.id")
 
@@ -0,0 +1,261 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, col, or_, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.models.db import (
+    Catalogue,
+    CatalogueTag,
+    CatalogueTopic,
+    Comment,
+    Configuration,
+    ExtraEntry,
+    ExtraType,
+    Requirement,
+    RequirementTag,
+    Tag,
+    Topic,
+    TopicClosure,
+    User,
+)
+from api.models.tree import TopicTree
+
+
+class SessionChanges:
+    """
+    Tracks the changes of a session, so caches and validators can be invalidated after the commit.
+    The changed tables are collected as well as the catalogues containing the changed rows.
+    The changed rows are resolved to their catalogues before and after every flush,
+    which covers deleted and moved objects (old position) as well as new objects (new position).
+    Changes of committed transactions are collected in session.info["committedTables"] and session.info["committedCatalogues"].
+    The changed objects are collected after every flush for the change feed and the local caches (session.info["committedEvents"]).
+    """
+
+    # table class: key of the id set the changed row is resolved from
+    seeds: dict[type, str] = {
+        Catalogue: "catalogues",
+        Topic: "topics",
+        Requirement: "requirements",
+        ExtraEntry: "extraEntries",
+        ExtraType: "extraTypes",
+        Comment: "comments",
+        Tag: "tags",
+        User: "users",
+    }
+    # table class: type of the changed objects in the change events
+    types: dict[type, str] = {**seeds, Configuration: "configuration"}
+
+    @staticmethod
+    def changedIds(session: Session) -> dict[str, set]:
+        """
+        Returns the ids of the new, changed and deleted rows in the session grouped by their seed
+
+        :param Session session: The DB session
+        :return dict[str, set]: The changed ids per seed
+        """
+        ids: dict[str, set] = {}
+        for item in [*session.new, *session.dirty, *session.deleted]:
+            seed: str | None = SessionChanges.seeds.get(type(item))
+            if seed is not None and item.id is not None:
+                ids.setdefault(seed, set()).add(item.id)
+        return ids
+
+    @staticmethod
+    def affectedCatalogues(connection: Connection, ids: dict[str, set]) -> set[int]:
+        """
+        Resolves the changed rows to the ids of the catalogues containing them
+
+        :param Connection connection: The connection of the flushing session
+        :param dict[str, set] ids: The changed ids per seed
+        :return set[int]: The ids of the affected catalogues
+        """
+        catalogues: set[int] = set(ids.get("catalogues", set()))
+        topics: set[int] = set(ids.get("topics", set()))
+        requirements: set[int] = set(ids.get("requirements", set()))
+
+        def scalars(statement) -> set:
+            return set(connection.execute(statement).scalars().all())
+
+        if "extraEntries" in ids or "extraTypes" in ids:
+            requirements |= scalars(
+                select(ExtraEntry.requirementId).where(
+                    or_(
+                        col(ExtraEntry.id).in_(ids.get("extraEntries", set())),
+                        col(ExtraEntry.extraTypeId).in_(ids.get("extraTypes", set())),
+                    )
+                )
+            )
+        if "comments" in ids or "users" in ids:
+            requirements |= scalars(
+                select(Comment.requirementId).where(
+                    or_(
+                        col(Comment.id).in_(ids.get("comments", set())),
+                        col(Comment.authorId).in_(ids.get("users", set())),
+                    )
+                )
+            )
+        if "tags" in ids:
+            requirements |= scalars(
+                select(RequirementTag.requirementId).where(
+                    col(RequirementTag.tagId).in_(ids["tags"])
+                )
+            )
+            catalogues |= scalars(
+                select(CatalogueTag.catalogueId).where(
+                    col(CatalogueTag.tagId).in_(ids["tags"])
+                )
+            )
+        if len(requirements) > 0:
+            topics |= scalars(
+                select(Requirement.parentId).where(
+                    col(Requirement.id).in_(requirements)
+                )
+            )
+        if len(topics) > 0:
+            catalogues |= scalars(
+                select(CatalogueTopic.catalogueId).where(
+                    col(CatalogueTopic.topicId).in_(
+                        select(TopicClosure.ancestorId).where(
+                            col(TopicClosure.descendantId).in_(topics)
+                        )
+                    )
+                )
+            )
+        return catalogues
+
+    @staticmethod
+    def collect(session: Session) -> None:
+        """
+        Adds the changed tables and the catalogues affected by the pending changes of the session
+        to session.info["pendingTables"] and session.info["pendingCatalogues"]
+
+        :param Session session: The DB session
+        """
+        items: list = [*session.new, *session.dirty, *session.deleted]
+        session.info.setdefault("pendingTables", set()).update(
+            type(item).__tablename__ for item in items
+        )
+        ids: dict[str, set] = SessionChanges.changedIds(session)
+        if len(ids) == 0:
+            return
+        session.info.setdefault("pendingCatalogues", set()).update(
+            SessionChanges.affectedCatalogues(session.connection(), ids)
+        )
+
+    @staticmethod
+    def collectEvents(session: Session) -> None:
+        """
+        Adds the objects changed by the flush of the session with their last change (INSERT, UPDATE or DELETE)
+        to session.info["pendingEvents"]. Objects without net changes are skipped, objects marked as deleted (soft delete) are a DELETE,
+        an object added and updated in one transaction stays an INSERT. The events are keyed by the type and the primary key of the object
+
+        :param Session session: The flushing DB session
+        """
+        events: dict[tuple[str, int], str] = session.info.setdefault(
+            "pendingEvents", {}
+        )
+        for verb, items in [
+            ("INSERT", session.new),
+            ("UPDATE", session.dirty),
+            ("DELETE", session.deleted),
+        ]:
+            for item in items:
+                name: str | None = SessionChanges.types.get(type(item))
+                if name is None:
+                    continue
+                id = inspect(item).mapper.primary_key_from_instance(item)[0]
+                if id is None:
+                    continue
+                if verb == "UPDATE" and not session.is_modified(item):
+                    continue
+                if verb == "UPDATE" and getattr(item, "deleted", False):
+                    events[(name, id)] = "DELETE"
+                elif verb != "UPDATE" or events.get((name, id)) != "INSERT":
+                    events[(name, id)] = verb
+
+    @staticmethod
+    def collectDeleted(session: Session, model: type, ids: set[int]) -> None:
+        """
+        Adds rows marked as deleted with a bulk UPDATE (soft delete) to the pending changes of the session,
+        as they are not part of the flushes
+
+        :param Session session: The DB session
+        :param type model: The table of the rows
+        :param set[int] ids: The ids of the marked rows
+        """
+        if len(ids) == 0:
+            return
+        session.info.setdefault("pendingTables", set()).add(model.__tablename__)
+        session.info.setdefault("pendingCatalogues", set()).update(
+            SessionChanges.affectedCatalogues(
+                session.connection(), {SessionChanges.seeds[model]: ids}
+            )
+        )
+        events: dict[tuple[str, int], str] = session.info.setdefault(
+            "pendingEvents", {}
+        )
+        for id in ids:
+            events[(SessionChanges.types[model], id)] = "DELETE"
+
+    @staticmethod
+    def committedEvents(session: Session | AsyncSession) -> list[dict]:
+        """
+        Returns and resets the objects changed by the committed transactions of the session
+
+        :param Session | AsyncSession session: The DB session
+        :return list[dict]: The changes with the type (e.g. requirements), the primary key and the verb of the object
+        """
+        return [
+            {"type": type, "id": id, "verb": verb}
+            for (type, id), verb in session.info.pop("committedEvents", {}).items()
+        ]
+
+    @staticmethod
+    def committedTables(session: Session | AsyncSession) -> set[str]:
+        """
+        Returns and resets the tables changed by the committed transactions of the session
+
+        :param Session | AsyncSession session: The DB session
+        :return set[str]: The names of the changed tables
+        """
+        return session.info.pop("committedTables", set())
+
+    @staticmethod
+    def committedCatalogues(session: Session | AsyncSession) -> set[int]:
+        """
+        Returns and resets the catalogues affected by the committed transactions of the session
+
+        :param Session | AsyncSession session: The DB session
+        :return set[int]: The ids of the affected catalogues
+        """
+        return session.info.pop("committedCatalogues", set())
+
+
+@event.listens_for(Session, "before_flush")
+def collectBeforeFlush(session: Session, flushContext, instances) -> None:
+    SessionChanges.collect(session)
+
+
+@event.listens_for(Session, "after_flush")
+def collectAfterFlush(session: Session, flushContext) -> None:
+    TopicTree.maintain(session)
+    SessionChanges.collect(session)
+    SessionChanges.collectEvents(session)
+
+
+@event.listens_for(Session, "after_commit")
+def commitChanges(session: Session) -> None:
+    for name in ["Tables", "Catalogues"]:
+        session.info.setdefault(f"committed{name}", set()).update(
+            session.info.pop(f"pending{name}", set())
+        )
+    session.info.setdefault("committedEvents", {}).update(
+        session.info.pop("pendingEvents", {})
+    )
+
+
+@event.listens_for(Session, "after_rollback")
+def rollbackChanges(session: Session) -> None:
+    session.info.pop("pendingTables", None)
+    session.info.pop("pendingCatalogues", None)
+    session.info.pop("pendingEvents", None)
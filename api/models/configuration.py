@@ -0,0 +1,136 @@
+from collections.abc import Callable
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.config import AppConfig
+from api.models.db import Configuration
+from api.models.response import Response
+from helper.cache import InvalidationBus
+
+
+class DynamicConfiguration:
+    """
+    Per worker cache of the dynamic configuration (Configuration table).
+    All rows are loaded at once and kept with their typed values, the static configuration of the frontend
+    is kept as serialized response. Changes are evicted on every worker by the InvalidationBus and the rows are
+    loaded again on the next read, so the database is only read after a change.
+    A load which started before an eviction is not cached, as it may have read the old values.
+    """
+
+    # configuration type: conversion of the stored value
+    types: dict[str, Callable[[str], bool | int | str]] = {
+        "boolean": lambda value: value == "true",
+        "integer": int,
+    }
+    values: dict[str, bool | int | str] | None = None
+    static: bytes | None = None
+    generation: int = 0
+
+    @classmethod
+    async def load(cls, session: AsyncSession) -> dict[str, bool | int | str]:
+        """
+        Returns the typed values of all configuration items. The items are loaded if they are not cached
+
+        :param AsyncSession session: The DB session
+        :return dict[str, bool | int | str]: The values by the key of the configuration item
+        """
+        if cls.values is not None:
+            return cls.values
+        generation: int = cls.generation
+        values: dict[str, bool | int | str] = {
+            config.key: cls.types.get(config.type, str)(config.value)
+            for config in (await session.exec(select(Configuration))).all()
+        }
+        static: bytes = cls.buildStatic(values)
+        if generation == cls.generation:
+            cls.values, cls.static = values, static
+        return values
+
+    @classmethod
+    def validate(cls, type: str, value: str) -> str:
+        """
+        Checks if a value can be stored for a configuration item of the given type
+
+        :param str type: The type of the configuration item
+        :param str value: The new value
+        :raises ValueError: Raises if the value does not match the type
+        :return str: The value as it is stored
+        """
+        if type == "boolean" and value not in ("true", "false"):
+            raise ValueError(f"'{value}' is not a boolean (true or false)")
+        if type == "integer":
+            try:
+                return str(int(value))
+            except ValueError:
+                raise ValueError(f"'{value}' is not an integer") from None
+        return value
+
+    @classmethod
+    async def get(
+        cls, session: AsyncSession, key: str, default: bool | int | str | None = None
+    ) -> bool | int | str | None:
+        """
+        Returns the typed value of a configuration item
+
+        :param AsyncSession session: The DB session, only used if the configuration is not cached
+        :param str key: The key of the configuration item
+        :param bool | int | str | None default: The value if the item does not exist, defaults to None
+        :return bool | int | str | None: The value of the item
+        """
+        return (await cls.load(session)).get(key, default)
+
+    @classmethod
+    async def getStatic(cls, session: AsyncSession) -> bytes:
+        """
+        Returns the serialized response of the static configuration
+
+        :param AsyncSession session: The DB session, only used if the configuration is not cached
+        :return bytes: The JSON response body
+        """
+        static: bytes | None = cls.static
+        if static is None:
+            static = cls.buildStatic(await cls.load(session))
+        return static
+
+    @staticmethod
+    def buildStatic(values: dict[str, bool | int | str]) -> bytes:
+        """
+        Serializes the static configuration (login and home page) of the frontend
+
+        :param dict[str, bool | int | str] values: The values of the configuration items
+        :return bytes: The JSON response body
+        """
+        return Response.buildResponse(
+            Response.Configuration.Static,
+            {
+                "oauth": {"provider": AppConfig.OAUTH_PROVIDER},
+                "home": {
+                    "title": values.get("HOME_TITLE") or "Welcome to ReqDB",
+                    "MOTD": {
+                        "pre": values.get("HOME_MOTD_PRE", ""),
+                        "post": values.get("HOME_MOTD_POST", ""),
+                    },
+                },
+                "login": {
+                    "MOTD": {
+                        "pre": values.get("LOGIN_MOTD_PRE", ""),
+                        "post": values.get("LOGIN_MOTD_POST", ""),
+                    },
+                },
+            },  # type: ignore
+        ).body
+
+    @classmethod
+    def evict(cls, keys: set | None) -> None:
+        """
+        Drops the cached configuration after a change
+
+        :param set | None keys: The keys of the changed configuration items or None if changes may have been missed
+        """
+        cls.generation += 1
+        cls.values = None
+        cls.static = None
+
+
+InvalidationBus.subscribe("configuration", DynamicConfiguration.evict)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from sqlalchemy import Index, column, false, true
 from sqlalchemy.orm import Mapped, relationship
 from sqlmodel import Field, Relationship, SQLModel, inspect
 
@@ -15,6 +16,7 @@ from api.models.base import (
     TokenBase,
     TopicBase,
     UserBase,
+    timestamp,
 )
 
 
@@ -25,12 +27,47 @@ def getModelTable(model):
 
 
 def SARelationship(**kwargs):
+    kwargs.setdefault("lazy", "raise_on_sql")
     return Relationship(sa_relationship=relationship(**kwargs))
 
 
+def softDeleteIndexes(table: str, *columns: str) -> tuple[Index, ...]:
+    """
+    Returns the partial indexes of a soft deletable table.
+    The indexes on the columns only cover the rows which are not deleted, as all queries filter the deleted rows.
+    The index on deletedAt only covers the deleted rows (tombstones) for the purge
+
+    :param str table: The table name
+    :param str columns: The columns which are indexed for the rows which are not deleted
+    :return tuple[Index, ...]: The indexes
+    """
+    active = column("deleted") == false()
+    deleted = column("deleted") == true()
+    return (
+        *[
+            Index(
+                f"ix_{table}_{name}_active",
+                name,
+                postgresql_where=active,
+                sqlite_where=active,
+                mssql_where=active,
+            )
+            for name in columns
+        ],
+        Index(
+            f"ix_{table}_deletedAt_deleted",
+            "deletedAt",
+            postgresql_where=deleted,
+            sqlite_where=deleted,
+            mssql_where=deleted,
+        ),
+    )
+
+
 class TableBase(SQLModel):
     id: int = Field(default=None, primary_key=True)
     deleted: bool = Field(default=False)
+    deletedAt: float | None = Field(default=None)
 
 
 class CatalogueTag(SQLModel, table=True):
@@ -51,6 +88,13 @@ class CatalogueTopic(SQLModel, table=True):
     topicId: int = Field(foreign_key="topic.id", primary_key=True)
 
 
+class TopicClosure(SQLModel, table=True):
+    __tablename__ = "TopicClosure"  # type: ignore
+    ancestorId: int = Field(primary_key=True)
+    descendantId: int = Field(primary_key=True, index=True)
+    depth: int
+
+
 class User(UserBase, table=True):
     comments: Mapped[list[Comment]] = SARelationship(
         back_populates="author",
@@ -68,7 +112,6 @@ class Token(TokenBase, table=True):
     id: int | None = Field(default=None, primary_key=True)
     user: User = SARelationship(
         back_populates="tokens",
-        lazy="joined",
     )
 
     def __repr__(self):
@@ -76,56 +119,78 @@ class Token(TokenBase, table=True):
 
 
 class Audit(AuditBase, SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_audit_table_timestamp", "table", "timestamp"),
+        Index("ix_audit_table_target_id_timestamp", "table", "target_id", "timestamp"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
-    user: User = Relationship()
+    # time the row was inserted, which is later than the timestamp of the change if the audit queue is used
+    inserted: float | None = Field(
+        default=None, sa_column_kwargs={"default": timestamp}
+    )
+    user: User = Relationship(sa_relationship_kwargs={"lazy": "raise_on_sql"})
 
     def __repr__(self):
         return f'<Audit "{self.action}">'
 
 
 class Topic(TopicBase, TableBase, table=True):
+    __table_args__ = softDeleteIndexes("topic", "parentId")
+
     parent: Mapped[Topic | None] = SARelationship(
         back_populates="children",
         remote_side="Topic.id",
-        lazy="joined",
     )
     children: Mapped[list[Topic]] = SARelationship(
         back_populates="parent",
-        lazy="joined",
     )
     requirements: Mapped[list[Requirement]] = SARelationship(
         back_populates="parent",
         cascade="all, delete-orphan",
-        lazy="joined",
     )
     catalogues: Mapped[list[Catalogue]] = SARelationship(
         back_populates="topics", secondary=getModelTable(CatalogueTopic)
     )
+    descendants: Mapped[list[Topic]] = SARelationship(
+        secondary=getModelTable(TopicClosure),
+        primaryjoin="and_(Topic.id == TopicClosure.ancestorId, TopicClosure.depth > 0)",
+        secondaryjoin="Topic.id == TopicClosure.descendantId",
+        viewonly=True,
+    )
+    ancestors: Mapped[list[Topic]] = SARelationship(
+        secondary=getModelTable(TopicClosure),
+        primaryjoin="and_(Topic.id == TopicClosure.descendantId, TopicClosure.depth > 0)",
+        secondaryjoin="Topic.id == TopicClosure.ancestorId",
+        viewonly=True,
+    )
 
     def __repr__(self):
         return f'<Topic "{self.title}">'
 
 
 class Requirement(RequirementBase, TableBase, table=True):
-    parent: Topic = Relationship(back_populates="requirements")
+    __table_args__ = softDeleteIndexes("requirement", "parentId")
+
+    parent: Topic = Relationship(
+        back_populates="requirements",
+        sa_relationship_kwargs={"lazy": "raise_on_sql"},
+    )
 
     tags: Mapped[list[Tag]] = SARelationship(
         back_populates="requirements",
         secondary=getModelTable(RequirementTag),
-        lazy="joined",
     )
 
     extras: Mapped[list[ExtraEntry]] = SARelationship(
         back_populates="requirement",
         cascade="all, delete-orphan",
-        lazy="joined",
     )
 
     comments: Mapped[list[Comment]] = SARelationship(
         back_populates="requirement",
         cascade="all, delete-orphan",
         order_by="Comment.created",
-        lazy="joined",
     )
 
     def __repr__(self):
@@ -133,16 +198,16 @@ class Requirement(RequirementBase, TableBase, table=True):
 
 
 class Catalogue(CatalogueBase, TableBase, table=True):
+    __table_args__ = softDeleteIndexes("catalogue")
+
     topics: Mapped[list[Topic]] = SARelationship(
         back_populates="catalogues",
         secondary=getModelTable(CatalogueTopic),
-        lazy="joined",
     )
 
     tags: Mapped[list[Tag]] = SARelationship(
         back_populates="catalogues",
         secondary=getModelTable(CatalogueTag),
-        lazy="joined",
     )
 
     def __repr__(self):
@@ -150,28 +215,37 @@ class Catalogue(CatalogueBase, TableBase, table=True):
 
 
 class Comment(CommentBase, TableBase, table=True):
-    requirement: Requirement = Relationship(back_populates="comments")
+    __table_args__ = softDeleteIndexes("comment", "requirementId", "parentId")
+
+    requirement: Requirement = Relationship(
+        back_populates="comments",
+        sa_relationship_kwargs={"lazy": "raise_on_sql"},
+    )
 
     author: User = Relationship(
         back_populates="comments",
-        sa_relationship_kwargs={"lazy": "joined"},
+        sa_relationship_kwargs={"lazy": "raise_on_sql"},
     )
 
     parent: Mapped[Comment | None] = SARelationship(
         back_populates="children",
         remote_side="Comment.id",
-        lazy="joined",
     )
 
     children: Mapped[list[Comment]] = SARelationship(
         back_populates="parent",
         order_by="Comment.created",
-        lazy="joined",
         cascade="all, delete-orphan",
     )
+    thread: Mapped[list[Comment]] = SARelationship(
+        secondary=getModelTable(Requirement),
+        primaryjoin="Comment.requirementId == Requirement.id",
+        secondaryjoin="Requirement.id == Comment.requirementId",
+        viewonly=True,
+    )
 
     def __repr__(self):
-        return f'<Comment "{self.author}: {self.comment[:20]}">'
+        return f'<Comment "{self.authorId}: {self.comment[:20]}">'
 
 
 class Configuration(ConfigurationBase, table=True):
@@ -182,10 +256,10 @@ class Configuration(ConfigurationBase, table=True):
 
 class ExtraType(ExtraTypeBase, TableBase, table=True):
     __tablename__ = "extra_type"  # type: ignore
+    __table_args__ = softDeleteIndexes("extra_type")
 
     children: Mapped[list[ExtraEntry]] = SARelationship(
         back_populates="extraType",
-        lazy="joined",
         cascade="all, delete-orphan",
     )
 
@@ -195,18 +269,24 @@ class ExtraType(ExtraTypeBase, TableBase, table=True):
 
 class ExtraEntry(ExtraEntryBase, TableBase, table=True):
     __tablename__ = "extra_entry"  # type: ignore
+    __table_args__ = softDeleteIndexes("extra_entry", "requirementId")
 
     extraType: ExtraType = Relationship(
         back_populates="children",
-        sa_relationship_kwargs={"lazy": "joined"},
+        sa_relationship_kwargs={"lazy": "raise_on_sql"},
+    )
+    requirement: Requirement = Relationship(
+        back_populates="extras",
+        sa_relationship_kwargs={"lazy": "raise_on_sql"},
     )
-    requirement: Requirement = Relationship(back_populates="extras")
 
     def __repr__(self):
         return f'<ExtraEntry "{self.content[:20]}">'
 
 
 class Tag(TagBase, TableBase, table=True):
+    __table_args__ = softDeleteIndexes("tag")
+
     requirements: Mapped[list[Requirement]] = SARelationship(
         back_populates="tags",
         secondary=getModelTable(RequirementTag),
@@ -214,7 +294,6 @@ class Tag(TagBase, TableBase, table=True):
     catalogues: Mapped[list[Catalogue]] = SARelationship(
         back_populates="tags",
         secondary=getModelTable(CatalogueTag),
-        lazy="joined",
     )
 
     def __repr__(self):
@@ -0,0 +1,141 @@
+from functools import cache
+
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.interfaces import MANYTOONE
+from sqlalchemy.orm.strategy_options import _AbstractLoad
+
+from api.models import db
+from api.models.base import (
+    AuditBase,
+    CatalogueBase,
+    CommentBase,
+    ConfigurationBase,
+    ExtraEntryBase,
+    ExtraTypeBase,
+    RequirementBase,
+    TagBase,
+    TopicBase,
+    UserBase,
+)
+from api.models.response import ResponseBase, Serializer
+
+
+class Loader:
+    """
+    Loader profiles for the response models.
+    All relationships in api.models.db are declared with lazy="raise_on_sql", so every query
+    has to state which relationships it needs. The profile for a response class
+    is derived from the public model in its data field and contains exactly the
+    relationships serialized by that model.
+    """
+
+    tables: dict[type[BaseModel], type] = {
+        AuditBase: db.Audit,
+        CatalogueBase: db.Catalogue,
+        CommentBase: db.Comment,
+        ConfigurationBase: db.Configuration,
+        ExtraEntryBase: db.ExtraEntry,
+        ExtraTypeBase: db.ExtraType,
+        RequirementBase: db.Requirement,
+        TagBase: db.Tag,
+        TopicBase: db.Topic,
+        UserBase: db.User,
+    }
+
+    # recursive relationship: view only relationship covering all levels at once (e.g. over a closure table)
+    flattened: dict[str, str] = {
+        "Topic.children": "descendants",
+        "Topic.parent": "ancestors",
+        "Comment.children": "thread",
+    }
+
+    @staticmethod
+    @cache
+    def options(
+        model: type[ResponseBase] | type[BaseModel],
+    ) -> tuple[_AbstractLoad, ...]:
+        """
+        Returns the loader options for a response class or a public model
+
+        :param type[ResponseBase] | type[BaseModel] model: Response class (e.g. Response.Catalogue.OneWithTags) or public model
+        :return tuple[_AbstractLoad, ...]: Loader options for select(...).options() and session.get(options=...)
+        """
+        if issubclass(model, ResponseBase):
+            model = Serializer.innerModel(model.model_fields["data"].annotation, model)  # type: ignore
+            if model is None:
+                return ()
+        return tuple(Loader._profile(Loader._ormClass(model), model))
+
+    @staticmethod
+    def _profile(
+        ormClass: type, model: type[BaseModel], stack: tuple = ()
+    ) -> list[_AbstractLoad]:
+        """
+        Builds the loader options for all relationships serialized by a public model.
+        Fields referencing the model itself (e.g. Topic.children) are loaded recursively.
+        If a view only relationship covers all levels, they are loaded at once
+        and the relationship is filled from the loaded levels, otherwise one query per level is needed.
+
+        :param type ormClass: The mapped class from api.models.db
+        :param type[BaseModel] model: The public model
+        :param tuple stack: Models already visited on this path
+        :return list[_AbstractLoad]: Loader options relative to ormClass
+        """
+        relationships = inspect(ormClass).relationships
+        options: list[_AbstractLoad] = []
+        recursive: list = []
+        for name, field in model.model_fields.items():
+            if name not in relationships:
+                continue
+            attribute = getattr(ormClass, name)
+            target: type[BaseModel] | None = Serializer.innerModel(
+                field.annotation, model
+            )
+            if target is model:
+                recursive.append((name, attribute))
+            elif target is None or target in stack:
+                options.append(selectinload(attribute))
+            else:
+                nested = Loader._profile(
+                    relationships[name].mapper.class_, target, stack + (model,)
+                )
+                if relationships[name].direction is MANYTOONE:
+                    options.append(joinedload(attribute).options(*nested))
+                else:
+                    options.append(selectinload(attribute).options(*nested))
+        siblings = list(options)
+        for name, attribute in recursive:
+            flat: str | None = Loader.flattened.get(f"{ormClass.__name__}.{name}")
+            load = (
+                joinedload
+                if relationships[name].direction is MANYTOONE
+                else selectinload
+            )
+            if flat is None:
+                options.append(
+                    selectinload(attribute, recursion_depth=-1).options(*siblings)
+                )
+            else:
+                options.append(load(attribute))
+                options.append(
+                    selectinload(getattr(ormClass, flat)).options(
+                        load(attribute), *siblings
+                    )
+                )
+        return options
+
+    @staticmethod
+    def _ormClass(model: type[BaseModel]) -> type:
+        """
+        Returns the mapped class for a public model by its shared base model (e.g. Topic.Base -> db.Topic)
+
+        :param type[BaseModel] model: The public model
+        :raises LookupError: Raises, if no mapped class shares a base with the model
+        :return type: The mapped class
+        """
+        for base, ormClass in Loader.tables.items():
+            if issubclass(model, base):
+                return ormClass
+        raise LookupError(f"No table found for {model.__qualname__}")
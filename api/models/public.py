@@ -143,6 +143,28 @@ class ExtraEntry:
         pass
 
 
+class SearchResult(SQLModel):
+    type: str
+    id: int
+    rank: float
+    title: str
+    key: str | None = None
+    requirementId: int | None = None
+
+
+class Change(SQLModel):
+    type: str
+    id: str
+    verb: str
+    timestamp: float
+
+
+class Changes(SQLModel):
+    cursor: int
+    more: bool
+    changes: list[Change]
+
+
 class Export:
     class Jira:
         class Token(SQLModel):
@@ -1,4 +1,9 @@
-from typing import Generic, TypeVar
+import json
+import sys
+from collections.abc import Callable
+from functools import cache
+from types import UnionType
+from typing import Any, ForwardRef, Generic, TypeVar, Union, get_args, get_origin
 
 from fastapi import Response as FastAPIResponse
 from pydantic import BaseModel
@@ -6,11 +11,13 @@ from pydantic import BaseModel
 from api.models.public import (
     Audit,
     Catalogue,
+    Changes,
     Comment,
     Configuration,
     ExtraEntry,
     ExtraType,
     Requirement,
+    SearchResult,
     StaticConfiguration,
     Tag,
     Topic,
@@ -18,12 +25,17 @@ from api.models.public import (
     Export,
 )
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class Pagination(BaseModel):
-    offset: int
-    limit: int
+    limit: int | None = None
     count: int
-    total: int
+    next: int | None = None
+    total: int | None = None
 
 
 Data = TypeVar("Data")
@@ -43,14 +55,14 @@ class Response:
 
         class List(ResponseBase):
             data: list[Tag.Base]
-            # page: Pagination
+            page: Pagination | None = None
 
         class OneWithRequirementsAndCatalogues(ResponseBase):
             data: Tag.WithRequirementsAndCatalogues
 
         class ListWithRequirements(ResponseBase):
             data: list[Tag.WithRequirementsAndCatalogues]
-            # page: Pagination
+            page: Pagination | None = None
 
     class Configuration:
 
@@ -60,7 +72,7 @@ class Response:
 
             class List(ResponseBase):
                 data: list[Configuration]
-                # page: Pagination
+                page: Pagination | None = None
 
         class Static(ResponseBase):
             data: StaticConfiguration
@@ -72,18 +84,18 @@ class Response:
 
         class List(ResponseBase):
             data: list[Catalogue.Base]
-            # page: Pagination
+            page: Pagination | None = None
 
         class OneWithTags(ResponseBase):
             data: Catalogue.WithTags
 
         class ListWithTags(ResponseBase):
             data: list[Catalogue.WithTags]
-            # page: Pagination
+            page: Pagination | None = None
 
         class ListWithTopics(ResponseBase):
             data: list[Catalogue.WithTopics]
-            # page: Pagination
+            page: Pagination | None = None
 
         class OneWithTopics(ResponseBase):
             data: Catalogue.WithTopics
@@ -96,11 +108,11 @@ class Response:
 
         class ListWithTopicsAndRequirements(ResponseBase):
             data: list[Catalogue.WithTagsAndTopicsAndRequirements]
-            # page: Pagination
+            page: Pagination | None = None
 
         class ListWithTopicsAndRequirementsAndComments(ResponseBase):
             data: list[Catalogue.WithTagsAndTopicsAndRequirementsAndComments]
-            # page: Pagination
+            page: Pagination | None = None
 
     class Comment:
 
@@ -109,7 +121,7 @@ class Response:
 
         class List(ResponseBase):
             data: list[Comment.WithRequirement]
-            # page: Pagination
+            page: Pagination | None = None
 
     class Topic:
 
@@ -118,14 +130,14 @@ class Response:
 
         class List(ResponseBase):
             data: list[Topic.WithParent]
-            # page: Pagination
+            page: Pagination | None = None
 
         class OneWithRequirements(ResponseBase):
             data: Topic.WithChildrenAndRequirements
 
         class ListWithRequirements(ResponseBase):
             data: list[Topic.WithChildrenAndRequirements]
-            # page: Pagination
+            page: Pagination | None = None
 
     class Requirement:
 
@@ -134,14 +146,14 @@ class Response:
 
         class List(ResponseBase):
             data: list[Requirement.WithExtrasAndTagsAndParent]
-            # page: Pagination
+            page: Pagination | None = None
 
         class OneWithComments(ResponseBase):
             data: Requirement.WithExtrasAndTagsAndCommentsAndParent
 
         class ListWithComments(ResponseBase):
             data: list[Requirement.WithExtrasAndTagsAndCommentsAndParent]
-            # page: Pagination
+            page: Pagination | None = None
 
     class ExtraType:
 
@@ -150,7 +162,7 @@ class Response:
 
         class List(ResponseBase):
             data: list[ExtraType]
-            # page: Pagination
+            page: Pagination | None = None
 
     class ExtraEntry:
 
@@ -159,10 +171,20 @@ class Response:
 
         class List(ResponseBase):
             data: list[ExtraEntry.WithExtraTypeAndRequirement]
-            # page: Pagination
+            page: Pagination | None = None
 
     class Audit(ResponseBase):
         data: list[Audit]
+        page: Pagination | None = None
+
+    class AuditState(ResponseBase):
+        data: Audit
+
+    class Changes(ResponseBase):
+        data: Changes
+
+    class Search(ResponseBase):
+        data: list[SearchResult]
 
     class TeePod(ResponseBase):
         data: str
@@ -174,7 +196,7 @@ class Response:
 
         class List(ResponseBase):
             data: list[User]
-            # page: Pagination
+            page: Pagination | None = None
 
     class Export:
         class Jira:
@@ -210,10 +232,215 @@ class Response:
 
     @staticmethod
     def buildResponse(
-        responseClass: ResponseBase.__class__, data: ResponseBase, status: int = 200
+        responseClass: ResponseBase.__class__,
+        data: ResponseBase,
+        status: int = 200,
+        page: Pagination | None = None,
     ) -> FastAPIResponse:
+        """
+        Builds the JSON response for a response class.
+        ORM objects are serialized directly by the public model of the response class,
+        all other data is validated and serialized by the response class itself
+
+        :param ResponseBase.__class__ responseClass: The response class (e.g. Response.Catalogue.OneWithTags)
+        :param ResponseBase data: The data of the response
+        :param int status: The HTTP status code, defaults to 200
+        :param Pagination | None page: The pagination info for list responses, defaults to None
+        :return FastAPIResponse: The JSON response
+        """
+        content: bytes | str | None = Serializer.dumps(
+            responseClass, data, status, page
+        )
+        if content is None:
+            content = (
+                responseClass(status=status, data=data)
+                if page is None
+                else responseClass(status=status, data=data, page=page)
+            ).model_dump_json()
         return FastAPIResponse(
             status_code=status,
             media_type="application/json",
-            content=responseClass(status=status, data=data).model_dump_json(),
+            content=content,
         )
+
+
+class Serializer:
+    """
+    Serializer for ORM objects loaded from the database.
+    The ORM objects are already valid, so instead of validating them again into the public models,
+    the fields of the public model are read directly from the ORM objects and encoded with orjson
+    (if installed, json otherwise). The fields of every public model are collected only once.
+    """
+
+    @staticmethod
+    def dumps(
+        responseClass: type[ResponseBase],
+        data: Any,
+        status: int = 200,
+        page: Pagination | None = None,
+    ) -> bytes | None:
+        """
+        Serializes the ORM objects of a response
+
+        :param type[ResponseBase] responseClass: The response class
+        :param Any data: ORM object or list of ORM objects
+        :param int status: The HTTP status code, defaults to 200
+        :param Pagination | None page: The pagination info for list responses, defaults to None
+        :return bytes | None: The JSON response body or None if data does not contain ORM objects
+        """
+        model: type[BaseModel] | None = Serializer.dataModel(responseClass)
+        items: list = data if isinstance(data, list) else [data]
+        if model is None or (len(items) > 0 and not Serializer.isORM(items[0])):
+            return None
+        content: dict[str, Any] = {
+            "status": status,
+            "data": (
+                [Serializer.toDict(item, model) for item in data]
+                if isinstance(data, list)
+                else Serializer.toDict(data, model)
+            ),
+        }
+        if "page" in responseClass.model_fields:
+            content["page"] = None if page is None else page.model_dump()
+        try:
+            return Serializer.encode(content)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def dumpItem(item: Any, model: type[BaseModel]) -> bytes:
+        """
+        Serializes a single ORM object with the fields of a public model.
+        Falls back to the public model if the fields can't be encoded directly
+
+        :param Any item: The ORM object
+        :param type[BaseModel] model: The public model
+        :return bytes: The JSON of the object
+        """
+        try:
+            return Serializer.encode(Serializer.toDict(item, model))
+        except (TypeError, ValueError):
+            return (
+                model.model_validate(item, from_attributes=True)
+                .model_dump_json()
+                .encode()
+            )
+
+    @staticmethod
+    def encode(content: Any) -> bytes:
+        """
+        Encodes JSON compatible content with orjson if installed, json otherwise
+
+        :param Any content: The content to encode
+        :raises TypeError: Raises if the content contains types which can't be encoded
+        :return bytes: The encoded JSON
+        """
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+    @staticmethod
+    def isORM(item: Any) -> bool:
+        """
+        Checks if an object is an instance of a mapped class
+
+        :param Any item: The object to check
+        :return bool: True if the object is loaded from the database
+        """
+        return getattr(type(item), "__table__", None) is not None
+
+    @staticmethod
+    @cache
+    def dataModel(responseClass: type[ResponseBase]) -> type[BaseModel] | None:
+        """
+        Returns the public model in the data field of a response class
+
+        :param type[ResponseBase] responseClass: The response class
+        :return type[BaseModel] | None: The public model or None
+        """
+        if "data" not in responseClass.model_fields:
+            return None
+        return Serializer.innerModel(
+            responseClass.model_fields["data"].annotation, responseClass
+        )
+
+    @staticmethod
+    @cache
+    def fields(
+        model: type[BaseModel],
+    ) -> tuple[tuple[str, type[BaseModel] | None, Callable[[Any], Any]], ...]:
+        """
+        Returns the serialized fields of a public model including computed fields
+
+        :param type[BaseModel] model: The public model
+        :return tuple[tuple[str, type[BaseModel] | None, Callable[[Any], Any]], ...]: Tuples of name, nested model and getter
+        """
+        fields: list[tuple[str, type[BaseModel] | None, Callable[[Any], Any]]] = []
+        for name, field in model.model_fields.items():
+            default = (
+                None
+                if field.is_required()
+                else field.get_default(call_default_factory=True)
+            )
+            fields.append(
+                (
+                    name,
+                    Serializer.innerModel(field.annotation, model),
+                    lambda item, name=name, default=default: getattr(
+                        item, name, default
+                    ),
+                )
+            )
+        for name, decorator in model.__pydantic_decorators__.computed_fields.items():
+            fields.append((name, None, decorator.info.wrapped_property.fget))
+        return tuple(fields)
+
+    @staticmethod
+    def toDict(item: Any, model: type[BaseModel]) -> dict[str, Any]:
+        """
+        Converts an ORM object into a dict with the fields of a public model
+
+        :param Any item: The ORM object
+        :param type[BaseModel] model: The public model
+        :return dict[str, Any]: The fields of the public model
+        """
+        content: dict[str, Any] = {}
+        for name, nested, getter in Serializer.fields(model):
+            value = getter(item)
+            if nested is not None and value is not None:
+                value = (
+                    [Serializer.toDict(v, nested) for v in value]
+                    if isinstance(value, list)
+                    else Serializer.toDict(value, nested)
+                )
+            content[name] = value
+        return content
+
+    @staticmethod
+    def innerModel(annotation, model: type[BaseModel]) -> type[BaseModel] | None:
+        """
+        Unwraps list and optional annotations to the contained model.
+        Forward references are resolved in the namespace the model was declared in
+
+        :param annotation: A field annotation
+        :param type[BaseModel] model: The model declaring the field
+        :return type[BaseModel] | None: The contained model or None
+        """
+        if isinstance(annotation, str):
+            annotation = ForwardRef(annotation)
+        if isinstance(annotation, ForwardRef):
+            module = sys.modules[model.__module__]
+            namespace = module
+            for name in model.__qualname__.split(".")[:-1]:
+                namespace = getattr(namespace, name)
+            annotation = eval(
+                annotation.__forward_arg__, vars(module), dict(vars(namespace))
+            )
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            return annotation
+        if get_origin(annotation) in (list, Union, UnionType):
+            for arg in get_args(annotation):
+                inner = Serializer.innerModel(arg, model)
+                if inner is not None:
+                    return inner
+        return None
@@ -0,0 +1,173 @@
+import re
+
+from sqlalchemy import String, column, inspect, literal, literal_column, table, text
+from sqlalchemy.engine import make_url
+from sqlmodel import and_, col, func, or_, select
+from sqlmodel.sql.expression import Select
+
+from api.config import AppConfig
+from api.models import engine
+from api.models.db import Catalogue, Comment, ExtraEntry, Requirement, Tag, Topic
+
+
+class SearchIndex:
+    """
+    Full text search over the searchable tables.
+    The index is chosen by the dialect of the DATABASE_URI:
+    SQLite uses an external content FTS5 table per table which is kept in sync by triggers,
+    PostgreSQL uses a GIN index on a tsvector expression which is maintained by the database itself.
+    Other dialects fall back to a LIKE search.
+    """
+
+    # kind: (table class, indexed columns, column used as title in the results)
+    tables: dict[str, tuple[type, list[str], str]] = {
+        "requirements": (Requirement, ["key", "title", "description"], "title"),
+        "topics": (Topic, ["key", "title", "description"], "title"),
+        "catalogues": (Catalogue, ["key", "title", "description"], "title"),
+        "tags": (Tag, ["name"], "name"),
+        "extraEntries": (ExtraEntry, ["content"], "content"),
+        "comments": (Comment, ["comment"], "comment"),
+    }
+
+    dialect: str = make_url(AppConfig.DATABASE_URI).get_backend_name()
+
+    @staticmethod
+    def create() -> None:
+        """
+        Creates the search index for all searchable tables if it does not exist yet.
+        A new SQLite FTS5 table is filled with the existing rows.
+        """
+        if SearchIndex.dialect == "sqlite":
+            SearchIndex._createSQLite()
+        elif SearchIndex.dialect == "postgresql":
+            with engine.begin() as connection:
+                for kind, (model, _, _) in SearchIndex.tables.items():
+                    vector = SearchIndex._postgresVector(kind).compile(
+                        dialect=connection.dialect,
+                        compile_kwargs={"literal_binds": True},
+                    )
+                    connection.execute(
+                        text(
+                            f'CREATE INDEX IF NOT EXISTS ix_{model.__tablename__}_search ON "{model.__tablename__}" USING GIN (({vector}))'
+                        )
+                    )
+
+    @staticmethod
+    def _createSQLite() -> None:
+        """
+        Creates the FTS5 tables and the insert, delete and update triggers
+        """
+        with engine.begin() as connection:
+            existing = inspect(connection).get_table_names()
+            for model, columns, _ in SearchIndex.tables.values():
+                name: str = model.__tablename__
+                fts = f"{name}_fts"
+                names = ", ".join(columns)
+                new = ", ".join(f"new.{c}" for c in columns)
+                old = ", ".join(f"old.{c}" for c in columns)
+                connection.execute(
+                    text(
+                        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{name}', content_rowid='id')"
+                    )
+                )
+                connection.execute(
+                    text(
+                        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {name} BEGIN "
+                        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END"
+                    )
+                )
+                connection.execute(
+                    text(
+                        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {name} BEGIN "
+                        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); END"
+                    )
+                )
+                connection.execute(
+                    text(
+                        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {names} ON {name} BEGIN "
+                        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+                        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END"
+                    )
+                )
+                if fts not in existing:
+                    connection.execute(
+                        text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+                    )
+
+    @staticmethod
+    def _postgresVector(kind: str):
+        """
+        Returns the tsvector expression for a table. The same expression is used for the index and the query,
+        so PostgreSQL can use the expression index
+
+        :param str kind: The searchable kind (e.g. requirements)
+        :return ColumnElement: The tsvector expression
+        """
+        columns = SearchIndex.tables[kind][1]
+        empty = literal_column("''", String)
+        document = func.coalesce(column(columns[0], String), empty)
+        for c in columns[1:]:
+            document = (
+                document
+                + literal_column("' '", String)
+                + func.coalesce(column(c, String), empty)
+            )
+        return func.to_tsvector(literal_column("'simple'::regconfig"), document)
+
+    @staticmethod
+    def statement(kind: str, query: str, limit: int) -> Select | None:
+        """
+        Returns the statement for the best matching ids and their rank (higher is better) of a table.
+        Every word of the query has to match (as prefix). The ranks are only comparable within one table
+
+        :param str kind: The searchable kind (e.g. requirements)
+        :param str query: The search query
+        :param int limit: Maximum number of results
+        :return Select | None: Select of (id, rank) or None if the query contains no words
+        """
+        terms: list[str] = re.findall(r"\w+", query)
+        if len(terms) == 0:
+            return None
+        model, columns, _ = SearchIndex.tables[kind]
+        id = col(model.id)
+
+        if SearchIndex.dialect == "sqlite":
+            fts = f"{model.__tablename__}_fts"
+            ftsTable = table(fts, column("rowid"))
+            match = " ".join(f'"{term}"*' for term in terms)
+            rank = -func.bm25(literal_column(fts))
+            # joined to the table, so the rows marked as deleted are filtered before the limit
+            return (
+                select(id, rank.label("rank"))
+                .select_from(ftsTable)
+                .join(model, id == ftsTable.c.rowid)
+                .where(literal_column(fts).op("MATCH")(match))
+                .order_by(rank.desc())
+                .limit(limit)
+            )
+        if SearchIndex.dialect == "postgresql":
+            vector = SearchIndex._postgresVector(kind)
+            tsquery = func.to_tsquery(
+                literal_column("'simple'::regconfig"),
+                " & ".join(f"{term}:*" for term in terms),
+            )
+            rank = func.ts_rank(vector, tsquery)
+            return (
+                select(id, rank.label("rank"))
+                .where(vector.op("@@")(tsquery))
+                .order_by(rank.desc())
+                .limit(limit)
+            )
+        return (
+            select(id, literal(0.0).label("rank"))
+            .where(
+                and_(
+                    *[
+                        or_(*[col(getattr(model, c)).contains(term) for c in columns])
+                        for term in terms
+                    ]
+                )
+            )
+            .order_by(id)
+            .limit(limit)
+        )
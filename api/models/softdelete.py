@@ -0,0 +1,350 @@
+import asyncio
+import logging
+from typing import Any
+
+from redis.exceptions import RedisError
+from sqlalchemy import delete, event, inspect, update
+from sqlalchemy.orm import ORMExecuteState, with_loader_criteria
+from sqlmodel import Session, col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.config import AppConfig
+from api.error import ConflictError
+from api.models.audit import AuditTrail
+from api.models.base import timestamp
+from api.models.changes import SessionChanges
+from api.models.configuration import DynamicConfiguration
+from api.models.db import (
+    Catalogue,
+    CatalogueTag,
+    CatalogueTopic,
+    Comment,
+    Configuration,
+    ExtraEntry,
+    ExtraType,
+    Requirement,
+    RequirementTag,
+    TableBase,
+    Tag,
+    Topic,
+    TopicClosure,
+)
+from api.models.tree import CommentThread
+from helper.cache import DataVersion, EncryptedRedisCache
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+class SoftDelete:
+    """
+    Soft delete (SOFT_DELETE in the dynamic configuration).
+    A deleted item is only marked as deleted, the items which the hard delete removes with it (cascade) are marked
+    with one UPDATE statement per table instead of being loaded and deleted one by one.
+    All ORM queries filter the deleted rows (see filterDeleted), so the marked rows are invisible for the API.
+    The execution option include_deleted=True disables the filter for a query.
+
+    Deleted rows older than SOFT_DELETE_RETENTION_DAYS (dynamic configuration, 0 keeps them) are purged
+    every SOFT_DELETE_PURGE_INTERVAL seconds in one worker at a time (Redis lock).
+    """
+
+    interval: int = AppConfig.SOFT_DELETE_PURGE_INTERVAL
+    store = EncryptedRedisCache.store
+    lock: str = "ReqDB:SoftDeletePurge"
+    # maximum number of IDs in one IN query of the purge
+    batchSize: int = 1000
+    models: tuple[type[TableBase], ...] = (
+        Catalogue,
+        Comment,
+        ExtraEntry,
+        ExtraType,
+        Requirement,
+        Tag,
+        Topic,
+    )
+    criteria: list = [
+        with_loader_criteria(model, col(model.deleted) == False, include_aliases=True)
+        for model in models
+    ]
+    # table class: unique column, whose values stay taken by the rows marked as deleted until they are purged
+    uniques: dict[type[TableBase], str] = {
+        Catalogue: "key",
+        Requirement: "key",
+        Tag: "name",
+        Topic: "key",
+    }
+
+    @staticmethod
+    async def active(session: AsyncSession) -> bool:
+        """
+        Returns if soft delete is enabled
+
+        :param AsyncSession session: The DB session
+        :return bool: True, if SOFT_DELETE is enabled
+        """
+        return await DynamicConfiguration.get(session, "SOFT_DELETE") is True
+
+    @staticmethod
+    async def delete(session: AsyncSession, item: TableBase, userId: str) -> None:
+        """
+        Deletes an item or marks it and its dependent items as deleted, if soft delete is enabled.
+        Children of a topic are moved to the root like with the hard delete.
+        The item itself is audited by the caller, the marked dependent items are audited here
+
+        :param AsyncSession session: The DB session
+        :param TableBase item: The item to delete
+        :param str userId: The id of the deleting user
+        """
+        if not await SoftDelete.active(session):
+            await session.delete(item)
+            return
+        item.deleted = True
+        item.deletedAt = timestamp()
+        session.add(item)
+        requirements = None
+        if isinstance(item, Topic):
+            children = await session.exec(
+                select(Topic).where(col(Topic.parentId) == item.id)
+            )
+            for child in children.all():
+                child.parentId = None
+            requirements = select(Requirement.id).where(
+                col(Requirement.parentId) == item.id
+            )
+            await SoftDelete.mark(
+                session, Requirement, col(Requirement.id).in_(requirements), userId
+            )
+        if isinstance(item, Requirement):
+            requirements = select(Requirement.id).where(col(Requirement.id) == item.id)
+        if requirements is not None:
+            await SoftDelete.mark(
+                session,
+                ExtraEntry,
+                col(ExtraEntry.requirementId).in_(requirements),
+                userId,
+            )
+            await SoftDelete.mark(
+                session, Comment, col(Comment.requirementId).in_(requirements), userId
+            )
+        if isinstance(item, Comment):
+            await SoftDelete.mark(
+                session,
+                Comment,
+                col(Comment.id).in_(select(CommentThread.subtree(item.id).c.id))
+                & (col(Comment.id) != item.id),
+                userId,
+            )
+        if isinstance(item, ExtraType):
+            await SoftDelete.mark(
+                session, ExtraEntry, col(ExtraEntry.extraTypeId) == item.id, userId
+            )
+
+    @staticmethod
+    async def mark(
+        session: AsyncSession, model: type[TableBase], condition: Any, userId: str
+    ) -> None:
+        """
+        Marks the rows of a table matching a condition as deleted with UPDATE statements of up to batchSize ids.
+        The rows are not loaded, so their ids are passed to SessionChanges and the AuditTrail
+
+        :param AsyncSession session: The DB session
+        :param type[TableBase] model: The table
+        :param Any condition: The where condition of the rows
+        :param str userId: The id of the deleting user
+        """
+        # the condition may select the rows through rows marked before (e.g. the requirements of a topic)
+        ids: list[int] = sorted(
+            (
+                await session.exec(
+                    select(model.id)
+                    .where(condition, col(model.deleted) == False)
+                    .execution_options(include_deleted=True)
+                )
+            ).all()
+        )
+        deletedAt: float = timestamp()
+        for i in range(0, len(ids), SoftDelete.batchSize):
+            await session.exec(
+                update(model)  # type: ignore
+                .where(col(model.id).in_(ids[i : i + SoftDelete.batchSize]))
+                .values(deleted=True, deletedAt=deletedAt)
+                .execution_options(synchronize_session=False)
+            )
+        await session.run_sync(SessionChanges.collectDeleted, model, set(ids))
+        AuditTrail.addDeleted(session, model, ids, userId)
+
+    @staticmethod
+    def checkUniques(session: Session) -> None:
+        """
+        Checks if new or changed objects take a unique value (e.g. the key) of a row marked as deleted.
+        The unique constraints cover the deleted rows, so the value is only free again after the purge
+
+        :param Session session: The flushing DB session
+        :raises ConflictError: Raises, if a value belongs to a deleted row
+        """
+        values: dict[type[TableBase], set[str]] = {}
+        for item in [*session.new, *session.dirty]:
+            name: str | None = SoftDelete.uniques.get(type(item))
+            if name is None or (
+                item in session.dirty
+                and not inspect(item).attrs[name].history.has_changes()
+            ):
+                continue
+            values.setdefault(type(item), set()).add(getattr(item, name))
+        for model, names in values.items():
+            column = col(getattr(model, SoftDelete.uniques[model]))
+            taken: list[str] = sorted(
+                session.connection()
+                .execute(
+                    select(column).where(column.in_(names), col(model.deleted) == True)
+                )
+                .scalars()
+                .all()
+            )
+            if len(taken) > 0:
+                raise ConflictError(
+                    detail=[
+                        f"{model.__name__} {SoftDelete.uniques[model]} {', '.join(taken)} belongs to a deleted {model.__name__.lower()}.",
+                        "The deleted item keeps it until it is purged (SOFT_DELETE_RETENTION_DAYS).",
+                    ]
+                )
+
+    @staticmethod
+    def purge(engine: Any, now: float | None = None) -> int:
+        """
+        Deletes the rows which are marked as deleted for longer than SOFT_DELETE_RETENTION_DAYS
+        together with the rows depending on them
+
+        :param Engine engine: The DB engine
+        :param float | None now: The current timestamp, defaults to None (now)
+        :return int: The number of purged rows
+        """
+        with Session(engine) as session:
+            days = session.get(Configuration, "SOFT_DELETE_RETENTION_DAYS")
+        if days is None or int(days.value or 0) <= 0:
+            return 0
+        cutoff: float = (now or timestamp()) - int(days.value) * 86400
+        with engine.begin() as connection:
+
+            def ids(statement) -> set[int]:
+                return set(connection.execute(statement).scalars().all())
+
+            def expired(model: type[TableBase]) -> set[int]:
+                return ids(
+                    select(model.id).where(
+                        col(model.deleted) == True, col(model.deletedAt) < cutoff
+                    )
+                )
+
+            def chunks(values: set[int], reverse: bool = False) -> list[list[int]]:
+                ordered: list[int] = sorted(values, reverse=reverse)
+                return [
+                    ordered[i : i + SoftDelete.batchSize]
+                    for i in range(0, len(ordered), SoftDelete.batchSize)
+                ]
+
+            def remove(model: Any, column: Any, values: set[int], reverse=False):
+                for chunk in chunks(values, reverse):
+                    connection.execute(delete(model).where(col(column).in_(chunk)))
+
+            topics: set[int] = expired(Topic)
+            requirements: set[int] = expired(Requirement)
+            catalogues: set[int] = expired(Catalogue)
+            tags: set[int] = expired(Tag)
+            extraTypes: set[int] = expired(ExtraType)
+            for chunk in chunks(topics):
+                requirements |= ids(
+                    select(Requirement.id).where(col(Requirement.parentId).in_(chunk))
+                )
+            extraEntries: set[int] = expired(ExtraEntry)
+            comments: set[int] = expired(Comment)
+            for chunk in chunks(requirements):
+                extraEntries |= ids(
+                    select(ExtraEntry.id).where(
+                        col(ExtraEntry.requirementId).in_(chunk)
+                    )
+                )
+                comments |= ids(
+                    select(Comment.id).where(col(Comment.requirementId).in_(chunk))
+                )
+            for chunk in chunks(extraTypes):
+                extraEntries |= ids(
+                    select(ExtraEntry.id).where(col(ExtraEntry.extraTypeId).in_(chunk))
+                )
+            replies: set[int] = comments
+            while len(replies) > 0:
+                replies = set()
+                for chunk in chunks(comments):
+                    replies |= ids(
+                        select(Comment.id).where(col(Comment.parentId).in_(chunk))
+                    )
+                replies -= comments
+                comments |= replies
+
+            remove(RequirementTag, RequirementTag.requirementId, requirements)
+            remove(RequirementTag, RequirementTag.tagId, tags)
+            remove(CatalogueTag, CatalogueTag.catalogueId, catalogues)
+            remove(CatalogueTag, CatalogueTag.tagId, tags)
+            remove(CatalogueTopic, CatalogueTopic.catalogueId, catalogues)
+            remove(CatalogueTopic, CatalogueTopic.topicId, topics)
+            # replies are newer than their parents
+            remove(Comment, Comment.id, comments, reverse=True)
+            remove(ExtraEntry, ExtraEntry.id, extraEntries)
+            remove(Requirement, Requirement.id, requirements)
+            for chunk in chunks(topics):
+                connection.execute(
+                    update(Topic)
+                    .where(col(Topic.parentId).in_(chunk))
+                    .values(parentId=None)
+                )
+            remove(TopicClosure, TopicClosure.ancestorId, topics)
+            remove(TopicClosure, TopicClosure.descendantId, topics)
+            remove(Topic, Topic.id, topics)
+            remove(ExtraType, ExtraType.id, extraTypes)
+            remove(Tag, Tag.id, tags)
+            remove(Catalogue, Catalogue.id, catalogues)
+        return sum(
+            len(purged)
+            for purged in [
+                topics,
+                requirements,
+                catalogues,
+                tags,
+                extraTypes,
+                extraEntries,
+                comments,
+            ]
+        )
+
+    @classmethod
+    async def schedule(cls, engine: Any) -> None:
+        """
+        Runs the purge every SOFT_DELETE_PURGE_INTERVAL seconds until it is cancelled. Runs as background task of the app
+
+        :param Engine engine: The DB engine
+        """
+        while True:
+            try:
+                if await cls.store.set(cls.lock, "purge", nx=True, ex=cls.interval):
+                    if await asyncio.to_thread(cls.purge, engine) > 0:
+                        await DataVersion.increment()
+            except RedisError as e:
+                logger.error(f"Can't lock the soft delete purge: {e}")
+            except Exception as e:
+                logger.error(f"Soft delete purge failed: {e}")
+            await asyncio.sleep(cls.interval)
+
+
+@event.listens_for(Session, "before_flush")
+def checkDeletedUniques(session: Session, flushContext, instances) -> None:
+    SoftDelete.checkUniques(session)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def filterDeleted(state: ORMExecuteState) -> None:
+    if (
+        state.is_select
+        and not state.is_column_load
+        and not state.is_relationship_load
+        and not state.execution_options.get("include_deleted", False)
+    ):
+        state.statement = state.statement.options(*SoftDelete.criteria)
@@ -0,0 +1,273 @@
+from collections.abc import Sequence
+
+from sqlalchemy import CTE, delete, insert, inspect, literal, true
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import Session, col, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.models.db import Comment, Topic, TopicClosure, User
+
+
+class TopicTree:
+    """
+    Closure table for the topic hierarchy.
+    The TopicClosure table contains a row (ancestorId, descendantId, depth) for every topic and each of its ancestors
+    including the topic itself (depth 0), so the subtree, the ancestors or the depth of a topic are a single indexed query.
+    The rows are maintained after every flush from the new, moved and deleted topics of the session.
+    """
+
+    closure = TopicClosure.__table__
+
+    @staticmethod
+    def create(connection: Connection) -> None:
+        """
+        Fills the closure table from the parent ids of all topics if it is empty (e.g. when it was just created)
+
+        :param Connection connection: The DB connection
+        """
+        if connection.execute(select(func.count()).select_from(TopicClosure)).scalar():
+            return
+        parents: dict[int, int | None] = dict(
+            connection.execute(select(Topic.id, Topic.parentId)).all()
+        )
+        rows: list[dict[str, int]] = []
+        for topicId in parents:
+            ancestorId: int | None = topicId
+            depth: int = 0
+            while ancestorId is not None and depth <= len(parents):
+                rows.append(
+                    {
+                        "ancestorId": ancestorId,
+                        "descendantId": topicId,
+                        "depth": depth,
+                    }
+                )
+                ancestorId = parents.get(ancestorId)
+                depth += 1
+        if len(rows) > 0:
+            connection.execute(insert(TopicTree.closure), rows)
+
+    @staticmethod
+    def maintain(session: Session) -> None:
+        """
+        Updates the closure table for the topics changed by the flush of the session.
+        Deleted topics are removed, new topics are added below the ancestors of their parent
+        and moved topics are detached with their subtree from the old ancestors and attached to the new ones
+
+        :param Session session: The flushing DB session
+        """
+        connection: Connection = session.connection()
+        for topic in session.deleted:
+            if isinstance(topic, Topic):
+                connection.execute(
+                    delete(TopicTree.closure).where(
+                        (TopicTree.closure.c.ancestorId == topic.id)
+                        | (TopicTree.closure.c.descendantId == topic.id)
+                    )
+                )
+        new: dict[int, Topic] = {
+            topic.id: topic for topic in session.new if isinstance(topic, Topic)
+        }
+        while len(new) > 0:
+            for topic in [t for t in new.values() if t.parentId not in new]:
+                TopicTree._add(connection, topic.id, topic.parentId)
+                del new[topic.id]
+        for topic in session.dirty:
+            if (
+                isinstance(topic, Topic)
+                and inspect(topic).attrs.parentId.history.has_changes()
+            ):
+                TopicTree._move(connection, topic.id, topic.parentId)
+
+    @staticmethod
+    def _add(connection: Connection, topicId: int, parentId: int | None) -> None:
+        """
+        Adds a new topic below the ancestors of its parent
+
+        :param Connection connection: The connection of the flushing session
+        :param int topicId: The id of the new topic
+        :param int | None parentId: The id of the parent topic
+        """
+        closure = TopicTree.closure
+        connection.execute(
+            insert(closure).values(ancestorId=topicId, descendantId=topicId, depth=0)
+        )
+        if parentId is not None:
+            connection.execute(
+                insert(closure).from_select(
+                    ["ancestorId", "descendantId", "depth"],
+                    select(
+                        closure.c.ancestorId, literal(topicId), closure.c.depth + 1
+                    ).where(closure.c.descendantId == parentId),
+                )
+            )
+
+    @staticmethod
+    def _move(connection: Connection, topicId: int, parentId: int | None) -> None:
+        """
+        Moves a topic with its subtree below a new parent
+
+        :param Connection connection: The connection of the flushing session
+        :param int topicId: The id of the moved topic
+        :param int | None parentId: The id of the new parent topic
+        """
+        closure = TopicTree.closure
+        subtree = select(closure.c.descendantId).where(closure.c.ancestorId == topicId)
+        connection.execute(
+            delete(closure).where(
+                closure.c.descendantId.in_(subtree),
+                closure.c.ancestorId.in_(
+                    select(closure.c.ancestorId).where(
+                        closure.c.descendantId == topicId,
+                        closure.c.ancestorId != topicId,
+                    )
+                ),
+            )
+        )
+        if parentId is not None:
+            above = closure.alias("above")
+            below = closure.alias("below")
+            connection.execute(
+                insert(closure).from_select(
+                    ["ancestorId", "descendantId", "depth"],
+                    select(
+                        above.c.ancestorId,
+                        below.c.descendantId,
+                        above.c.depth + below.c.depth + 1,
+                    )
+                    # every ancestor of the new parent with every topic of the moved subtree
+                    .select_from(above.join(below, true())).where(
+                        above.c.descendantId == parentId,
+                        below.c.ancestorId == topicId,
+                    ),
+                )
+            )
+
+    @staticmethod
+    async def cycles(session: AsyncSession, moves: dict[int, int | None]) -> list[int]:
+        """
+        Returns the topics which would become their own ancestor by the moves.
+        The moves are checked together, as moves within one batch can create a cycle no single move creates
+
+        :param AsyncSession session: The DB session
+        :param dict[int, int | None] moves: The new parent id by the id of the moved topic
+        :return list[int]: The ids of the moved topics in a cycle
+        """
+        parentIds: set[int] = {id for id in moves.values() if id is not None}
+        parents: dict[int, int | None] = dict(
+            (
+                await session.exec(
+                    select(Topic.id, Topic.parentId).where(
+                        col(Topic.id).in_(
+                            select(TopicClosure.ancestorId).where(
+                                col(TopicClosure.descendantId).in_(parentIds)
+                            )
+                        )
+                    )
+                    # soft deleted ancestors keep their place in the closure table
+                    .execution_options(include_deleted=True)
+                )
+            ).all()
+        )
+        parents.update(moves)
+        cycles: list[int] = []
+        for topicId, parentId in moves.items():
+            steps: int = 0
+            while parentId is not None and parentId != topicId and steps < len(parents):
+                parentId = parents.get(parentId)
+                steps += 1
+            if parentId == topicId:
+                cycles.append(topicId)
+        return cycles
+
+
+class CommentThread:
+    """
+    Comment threads of the requirements.
+    A thread below a comment and the chain of parents above a comment are each fetched with a single recursive CTE
+    over Comment.parentId. A loaded thread is assembled in memory, so the children of all levels are set without further queries.
+    All comments of a requirement are loaded with the view only relationship Comment.thread, which needs no recursion.
+    """
+
+    @staticmethod
+    def subtree(commentId: int) -> CTE:
+        """
+        Returns the recursive CTE of the ids of a comment and all replies below it
+
+        :param int commentId: The id of the root comment
+        :return CTE: The CTE with the column id
+        """
+        thread = select(Comment.id).where(col(Comment.id) == commentId)
+        thread = thread.cte("thread", recursive=True)
+        return thread.union_all(
+            select(Comment.id).join(thread, col(Comment.parentId) == thread.c.id)
+        )
+
+    @staticmethod
+    async def load(
+        session: AsyncSession, commentId: int, options: Sequence = ()
+    ) -> Comment | None:
+        """
+        Loads a comment with all replies below it
+
+        :param AsyncSession session: The DB session
+        :param int commentId: The id of the root comment of the thread
+        :param Sequence options: Loader options for every comment in the thread (e.g. joinedload(Comment.author))
+        :return Comment | None: The comment with its parent and the children of all levels or None if the comment does not exist
+        """
+        thread = CommentThread.subtree(commentId)
+        comments: Sequence[Comment] = (
+            await session.exec(
+                select(Comment)
+                .where(col(Comment.id).in_(select(thread.c.id)))
+                .order_by(col(Comment.created))
+                .options(*options)
+            )
+        ).all()
+        byId: dict[int | None, Comment] = {comment.id: comment for comment in comments}
+        children: dict[int | None, list[Comment]] = {}
+        for comment in comments:
+            children.setdefault(comment.parentId, []).append(comment)
+        for comment in comments:
+            set_committed_value(comment, "children", children.get(comment.id, []))
+            if comment.id != commentId:
+                set_committed_value(comment, "parent", byId[comment.parentId])
+        root: Comment | None = byId.get(commentId)
+        if root is not None and root.parentId is not None:
+            set_committed_value(
+                root, "parent", await session.get(Comment, root.parentId)
+            )
+        return root
+
+    @staticmethod
+    async def chainRecipients(session: AsyncSession, commentId: int) -> set[str]:
+        """
+        Returns the mail addresses of the authors of a comment and its parents
+        which activated the notification on comments in their chain
+
+        :param AsyncSession session: The DB session
+        :param int commentId: The id of the last comment of the chain
+        :return set[str]: The notification recipients
+        """
+        chain = select(Comment.id, Comment.parentId, Comment.authorId).where(
+            col(Comment.id) == commentId
+        )
+        chain = chain.cte("chain", recursive=True)
+        chain = chain.union_all(
+            select(Comment.id, Comment.parentId, Comment.authorId).join(
+                chain, col(Comment.id) == chain.c.parentId
+            )
+        )
+        return set(
+            (
+                await session.exec(
+                    select(User.email).where(
+                        col(User.id).in_(select(chain.c.authorId)),
+                        col(User.notificationMailOnCommentChain) == True,
+                        col(User.active) == True,
+                        col(User.service) == False,
+                    )
+                )
+            ).all()
+        )
@@ -74,3 +74,12 @@ class Update:
     class ServiceUser(SQLModel):
         model_config = ConfigDict(from_attributes=True)  # type: ignore
         email: str | None = None
+
+    class TagWithId(Tag):
+        id: int
+
+    class TopicWithId(Topic):
+        id: int
+
+    class RequirementWithId(Requirement):
+        id: int
@@ -1,3 +1,6 @@
+import hashlib
+import time
+from collections import OrderedDict
 from collections.abc import Callable, Coroutine
 from typing import Any
 
@@ -5,14 +8,16 @@ from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.routing import APIRoute
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from joserfc import jwt
+from joserfc.errors import InvalidKeyIdError
 from joserfc.jwk import Key
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from api.config import AppConfig
 from api.error import AuthConfigMissing, Forbidden, Unauthorized
 from api.models import audit as dbAudit
-from api.models import engine
+from api.models import asyncEngine
 from api.models.db import User
+from helper.cache import DataVersion, KnownUserCache
 
 auth = {
     "getStaticConfig": {"required": False, "roles": []},
@@ -29,6 +34,8 @@ auth = {
     "getTag": {"required": True, "roles": ["Requirements.Reader"]},
     "patchTag": {"required": True, "roles": ["Requirements.Writer"]},
     "addTag": {"required": True, "roles": ["Requirements.Writer"]},
+    "addTags": {"required": True, "roles": ["Requirements.Writer"]},
+    "patchTags": {"required": True, "roles": ["Requirements.Writer"]},
     "deleteTag": {"required": True, "roles": ["Requirements.Writer"]},
     "getCatalogues": {"required": True, "roles": ["Requirements.Reader"]},
     "findCatalogues": {"required": True, "roles": ["Requirements.Reader"]},
@@ -47,12 +54,16 @@ auth = {
     "getTopic": {"required": True, "roles": ["Requirements.Reader"]},
     "patchTopic": {"required": True, "roles": ["Requirements.Writer"]},
     "addTopic": {"required": True, "roles": ["Requirements.Writer"]},
+    "addTopics": {"required": True, "roles": ["Requirements.Writer"]},
+    "patchTopics": {"required": True, "roles": ["Requirements.Writer"]},
     "deleteTopic": {"required": True, "roles": ["Requirements.Writer"]},
     "getRequirements": {"required": True, "roles": ["Requirements.Reader"]},
     "findRequirements": {"required": True, "roles": ["Requirements.Reader"]},
     "getRequirement": {"required": True, "roles": ["Requirements.Reader"]},
     "patchRequirement": {"required": True, "roles": ["Requirements.Writer"]},
     "addRequirement": {"required": True, "roles": ["Requirements.Writer"]},
+    "addRequirements": {"required": True, "roles": ["Requirements.Writer"]},
+    "patchRequirements": {"required": True, "roles": ["Requirements.Writer"]},
     "deleteRequirement": {"required": True, "roles": ["Requirements.Writer"]},
     "getExtraTypes": {"required": True, "roles": ["Requirements.Reader"]},
     "findExtraTypes": {"required": True, "roles": ["Requirements.Reader"]},
@@ -66,8 +77,13 @@ auth = {
     "patchExtraEntry": {"required": True, "roles": ["Requirements.Writer"]},
     "addExtraEntry": {"required": True, "roles": ["Requirements.Writer"]},
     "deleteExtraEntry": {"required": True, "roles": ["Requirements.Writer"]},
+    "search": {"required": True, "roles": ["Requirements.Reader"]},
+    "getChanges": {"required": True, "roles": ["Requirements.Reader"]},
+    "getChangeEvents": {"required": True, "roles": ["Requirements.Reader"]},
     "getCoffee": {"required": True, "roles": ["Requirements.Reader"]},
     "getAudit": {"required": True, "roles": ["Requirements.Auditor"]},
+    "getAuditExport": {"required": True, "roles": ["Requirements.Auditor"]},
+    "getAuditState": {"required": True, "roles": ["Requirements.Auditor"]},
     "getJiraLogin": {"required": True, "roles": []},
     "getJiraCallback": {"required": False, "roles": []},
     "postJiraConnectUser": {"required": True, "roles": []},
@@ -77,6 +93,37 @@ auth = {
     "postJiraExport": {"required": True, "roles": ["Requirements.Reader"]},
 }
 
+# GET routes answered with an ETag. Their data is only changed through the API sessions, which increment the DataVersion
+conditional: set[str] = {
+    "getStaticConfig",
+    "getSystemConfig",
+    "getServiceUsers",
+    "getTags",
+    "findTags",
+    "getTag",
+    "getCatalogues",
+    "findCatalogues",
+    "getCatalogue",
+    "getComments",
+    "findComments",
+    "getComment",
+    "getTopics",
+    "findTopics",
+    "getTopic",
+    "getRequirements",
+    "findRequirements",
+    "getRequirement",
+    "getExtraTypes",
+    "findExtraTypes",
+    "getExtraType",
+    "getExtraEntries",
+    "findExtraEntries",
+    "getExtraEntry",
+    "search",
+    "getAudit",
+    "getAuditState",
+}
+
 
 class HTTPBearerWithUnauthorizedError(HTTPBearer):
     """
@@ -119,13 +166,61 @@ class RBACRoute(APIRoute):
                 if credentials is None:
                     raise Unauthorized(detail="No credentials provided")
                 jwt: dict[str, str] = await validateJWT(credentials)
+                request.state.claims = jwt
                 await checkAccess(jwt, auth[request.scope["route"].name]["roles"])
+            etag: str | None = None
+            if request.method == "GET" and request.scope["route"].name in conditional:
+                etag = await getETag(request)
+                if etag is not None and isNotModified(request, etag):
+                    return Response(
+                        status_code=304,
+                        headers={"ETag": etag, "Cache-Control": "private, no-cache"},
+                    )
             response: Response = await original_route_handler(request)
+            if etag is not None and response.status_code == 200:
+                response.headers["ETag"] = etag
+                response.headers["Cache-Control"] = "private, no-cache"
             return response
 
         return checkAccessRouteHandler
 
 
+async def getETag(request: Request) -> str | None:
+    """
+    Returns the strong ETag for a GET request.
+    The ETag is derived from the DataVersion, the requested URL and the user and roles of the request,
+    so it changes with every committed change and differs between users
+
+    :param Request request: The current request
+    :return str | None: The quoted ETag or None if the DataVersion is not available
+    """
+    version: int | None = await DataVersion.get()
+    if version is None:
+        return None
+    claims: dict[str, Any] = getattr(request.state, "claims", {})
+    roles: list[str] = sorted(claims.get("roles", []))
+    digest: str = hashlib.sha256(
+        f"{version}:{request.url.path}?{request.url.query}:{claims.get('sub', '')}:{','.join(roles)}".encode()
+    ).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def isNotModified(request: Request, etag: str) -> bool:
+    """
+    Checks if the If-None-Match header of the request matches the ETag
+
+    :param Request request: The current request
+    :param str etag: The current ETag
+    :return bool: True if the client has the current version
+    """
+    ifNoneMatch: str | None = request.headers.get("If-None-Match")
+    if ifNoneMatch is None:
+        return False
+    if ifNoneMatch.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in ifNoneMatch.split(",")]
+
+
 class AuthRouter(APIRouter):
     """
     The router for the API with the RBAC route class
@@ -137,45 +232,128 @@ class AuthRouter(APIRouter):
         super().__init__(route_class=RBACRoute, **kwargs)
 
 
+class ClaimsCache:
+    """
+    Bounded LRU cache for the claims of JWTs with a verified signature.
+    The entries are keyed by the SHA-256 hash of the token and are dropped when the token expires.
+    """
+
+    def __init__(self, maxSize: int) -> None:
+        self.maxSize: int = maxSize
+        self.entries: OrderedDict[str, dict[str, Any]] = OrderedDict()
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> dict[str, Any] | None:
+        """
+        Returns the cached claims for a token
+
+        :param str token: The JWT
+        :return dict[str, Any] | None: The claims or None if the token is unknown or expired
+        """
+        key = self.key(token)
+        claims = self.entries.get(key)
+        if claims is None:
+            return None
+        if claims["exp"] <= time.time():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return claims
+
+    def set(self, token: str, claims: dict[str, Any]) -> None:
+        """
+        Adds the claims of a verified token. Tokens without expiry are not cached
+
+        :param str token: The JWT
+        :param dict[str, Any] claims: The verified claims
+        """
+        if self.maxSize <= 0 or not isinstance(claims.get("exp"), (int, float)):
+            return
+        key = self.key(token)
+        self.entries[key] = claims
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+
+claimsCache = ClaimsCache(AppConfig.JWT_CLAIMS_CACHE_SIZE)
+
+
 def getClaims(credentials: str) -> dict[str, Any]:
     """
-    Validates the OAuth JWT and returns the claims
+    Validates the OAuth JWT and returns the claims.
+    The signature of a token is only verified once, the claims are validated on every call
 
     :param str credentials: JWT from the Authentication header
     :return dict[str, Any]: Parsed and validated claims
     """
-    token: jwt.Token = jwt.decode(credentials, AppConfig.JWT_PUBLIC_KEYS)
+    claims: dict[str, Any] | None = claimsCache.get(credentials)
+    if claims is None:
+        token: jwt.Token = jwt.decode(credentials, AppConfig.JWT_PUBLIC_KEYS)
+        claims = token.claims
     claims_requests = jwt.JWTClaimsRegistry(
         iss={"essential": True, "value": AppConfig.JWT_DECODE_ISSUER},
         aud={"essential": True, "value": AppConfig.OAUTH_CLIENT_ID},
     )
-    claims_requests.validate(token.claims)
+    claims_requests.validate(claims)
+    claimsCache.set(credentials, claims)
+
+    return claims
 
-    return token.claims
+
+def getRequestClaims(
+    request: Request, credentials: HTTPAuthorizationCredentials
+) -> dict[str, Any]:
+    """
+    Returns the claims already validated for this request by the RBACRoute or validates the JWT
+
+    :param Request request: The current request
+    :param HTTPAuthorizationCredentials credentials: The given JWT
+    :raises Unauthorized: Raises, if the claim can't be decoded
+    :return dict[str, Any]: Parsed and validated claims
+    """
+    if hasattr(request.state, "claims"):
+        return request.state.claims
+    try:
+        return getClaims(credentials.credentials)
+    except Exception as e:
+        raise Unauthorized(detail=str(e))
 
 
 async def validateJWT(
     credentials: HTTPAuthorizationCredentials,
 ) -> dict[str, str]:
     """
-    Validates the JWT and checks if a user is already known with the given sub
+    Validates the JWT and checks if a user is already known with the given sub.
+    If the JWT is signed with an unknown key the signing keys are refetched once
     If none is known an error is thrown (This is only needed for users not used the auth endpoints)
+    Known users are cached in the KnownUserCache
 
     :param HTTPAuthorizationCredentials credentials: The given JWT
     :raises Unauthorized: Raises, if the JWT is not valid
     :return dict: A dict of the given JWT claims
     """
     try:
-        claims: dict[str, Any] = getClaims(credentials.credentials)
+        try:
+            claims: dict[str, Any] = getClaims(credentials.credentials)
+        except InvalidKeyIdError:
+            if await AppConfig.refetchJWKs() is False:
+                raise
+            claims = getClaims(credentials.credentials)
     except Exception as e:
         raise Unauthorized(detail=str(e))
 
-    with Session(engine) as session:
-        user: User | None = session.get(User, claims["sub"])
-        if not user:
-            raise Forbidden(
-                detail="User not registered. Use /config/service/users to register the user with an id token"
-            )
+    if not KnownUserCache.isKnown(claims["sub"]):
+        async with AsyncSession(asyncEngine) as session:
+            user: User | None = await session.get(User, claims["sub"])
+            if not user:
+                raise Forbidden(
+                    detail="User not registered. Use /config/service/users to register the user with an id token"
+                )
+        KnownUserCache.add(claims["sub"])
 
     return claims
 
@@ -195,6 +373,7 @@ async def checkAccess(jwt: dict, neededRoles: list[str]) -> None:
 
 
 async def getRoles(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(
         HTTPBearerWithUnauthorizedError()
     ),
@@ -202,18 +381,17 @@ async def getRoles(
     """
     Returns the given roles in the JWT claim as array
 
+    :param Request request: The current request
     :param HTTPAuthorizationCredentials credentials: Dependency to get the auth Bearer, defaults to Depends( HTTPBearerWithUnauthorizedError() )
     :raises Unauthorized: Raises, if the claim can't be decoded
     :return list[str]: List of given roles
     """
-    try:
-        claims: dict[str, Any] = getClaims(credentials.credentials)
-    except Exception as e:
-        raise Unauthorized(detail=str(e))
+    claims: dict[str, Any] = getRequestClaims(request, credentials)
     return claims["roles"] if "roles" in claims else []
 
 
 async def getUserId(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(
         HTTPBearerWithUnauthorizedError()
     ),
@@ -221,12 +399,10 @@ async def getUserId(
     """
     Returns the user id (sub) from the given JWT
 
+    :param Request request: The current request
     :param HTTPAuthorizationCredentials credentials: Dependency to get the auth Bearer, defaults to Depends( HTTPBearerWithUnauthorizedError() )
     :raises Unauthorized: Raises, if the claim can't be decoded
     :return str: The user id (sub)
     """
-    try:
-        claims: dict[str, Any] = getClaims(credentials.credentials)
-    except Exception as e:
-        raise Unauthorized(detail=str(e))
+    claims: dict[str, Any] = getRequestClaims(request, credentials)
     return claims["sub"]
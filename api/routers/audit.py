@@ -1,10 +1,16 @@
+from collections.abc import AsyncGenerator
 from typing import Annotated
 
 from fastapi import Depends, status
-from sqlmodel import desc, select
+from fastapi.responses import StreamingResponse
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
 
 from api.error import Forbidden, NotFound, ErrorResponses
-from api.models import SessionDep
+from api.helper import Paginator
+from api.models import AsyncSessionDep, asyncEngine
+from api.models.audit import AuditTrail
 from api.models.db import (
     Audit,
     Catalogue,
@@ -16,11 +22,70 @@ from api.models.db import (
     Topic,
     User,
 )
+from api.models.loader import Loader
+from api.models.public import Audit as PublicAudit
 from api.models.response import Response
 from api.routers import AuthRouter, getRoles
 
 router = AuthRouter()
 
+modelMapping = {
+    "extraEntries": (ExtraEntry, "Requirements.Auditor"),
+    "extraTypes": (ExtraType, "Requirements.Auditor"),
+    "requirements": (Requirement, "Requirements.Auditor"),
+    "tags": (Tag, "Requirements.Auditor"),
+    "topics": (Topic, "Requirements.Auditor"),
+    "catalogues": (Catalogue, "Requirements.Auditor"),
+    "comments": (Comment, "Comments.Auditor"),
+    "users": (User, "Users.Auditor"),
+}
+
+
+def auditStatement(
+    object: str,
+    roles: dict,
+    targetId: str | None,
+    userId: str | None,
+    action: int | None,
+    since: float | None,
+    until: float | None,
+) -> SelectOfScalar[Audit]:
+    """
+    Returns the filtered select statement for the audit log of an object.
+    The filters match the indexes (table, timestamp) and (table, target_id, timestamp) of the audit table
+
+    :param str object: The audited object (e.g. requirements)
+    :param dict roles: The roles of the requesting user
+    :param str | None targetId: Only entries for this object id
+    :param str | None userId: Only entries from this user
+    :param int | None action: Only entries with this action (0: add, 1: update, 2: delete)
+    :param float | None since: Only entries with a timestamp >= since
+    :param float | None until: Only entries with a timestamp < until
+    :raises NotFound: Raises, if the object is unknown
+    :raises Forbidden: Raises, if the user is missing the auditor role for the object
+    :return SelectOfScalar[Audit]: The select statement
+    """
+    if object not in modelMapping.keys():
+        raise NotFound(detail="Audit object not found")
+
+    if modelMapping[object][1] not in roles:
+        raise Forbidden(detail="Forbidden")
+
+    statement = select(Audit).where(
+        Audit.table == modelMapping[object][0].__tablename__
+    )
+    if targetId is not None:
+        statement = statement.where(Audit.target_id == targetId)
+    if userId is not None:
+        statement = statement.where(Audit.userId == userId)
+    if action is not None:
+        statement = statement.where(Audit.action == action)
+    if since is not None:
+        statement = statement.where(col(Audit.timestamp) >= since)
+    if until is not None:
+        statement = statement.where(col(Audit.timestamp) < until)
+    return statement.options(*Loader.options(Response.Audit))
+
 
 @router.get(
     "/audit/{object}",
@@ -34,33 +99,102 @@ router = AuthRouter()
     },
 )
 async def getAudit(
-    session: SessionDep,
+    session: AsyncSessionDep,
+    page: Annotated[Paginator, Depends()],
     object: str,
     roles: Annotated[dict, Depends(getRoles)],
+    targetId: str | None = None,
+    userId: str | None = None,
+    action: int | None = None,
+    since: float | None = None,
+    until: float | None = None,
 ) -> Response.Audit:
+    statement = auditStatement(object, roles, targetId, userId, action, since, until)
+    data = await page.fetch(
+        session, statement, Audit, orderBy=Audit.timestamp, descending=True
+    )
 
-    modelMapping = {
-        "extraEntries": (ExtraEntry, "Requirements.Auditor"),
-        "extraTypes": (ExtraType, "Requirements.Auditor"),
-        "requirements": (Requirement, "Requirements.Auditor"),
-        "tags": (Tag, "Requirements.Auditor"),
-        "topics": (Topic, "Requirements.Auditor"),
-        "catalogues": (Catalogue, "Requirements.Auditor"),
-        "comments": (Comment, "Comments.Auditor"),
-        "users": (User, "Users.Auditor"),
-    }
+    return Response.buildResponse(Response.Audit, data, page=page.page)  # type: ignore
 
-    if object not in modelMapping.keys():
-        raise NotFound(detail="Audit object not found")
 
-    if modelMapping[object][1] not in roles:
-        raise Forbidden(detail="Forbidden")
-
-    statement = (
-        select(Audit)
-        .where(Audit.table == modelMapping[object][0].__tablename__)
-        .order_by(desc(Audit.timestamp))
+@router.get(
+    "/audit/{object}/{targetId}/state",
+    status_code=status.HTTP_200_OK,
+    responses={
+        **ErrorResponses.notFound,
+        **ErrorResponses.forbidden,
+        **ErrorResponses.unauthorized,
+        **ErrorResponses.unprocessable,
+        200: {"description": "Audit log entry with the rebuilt state of the object"},
+    },
+)
+async def getAuditState(
+    session: AsyncSessionDep,
+    object: str,
+    targetId: str,
+    roles: Annotated[dict, Depends(getRoles)],
+    auditId: int | None = None,
+) -> Response.AuditState:
+    """
+    Returns an audit log entry of an object with the complete state of the object after the audited change
+    instead of the stored diff. Defaults to the latest entry of the object
+    """
+    statement = auditStatement(object, roles, targetId, None, None, None, None)
+    if auditId is not None:
+        statement = statement.where(Audit.id == auditId)
+    point: Audit | None = (
+        await session.exec(
+            statement.order_by(col(Audit.timestamp).desc(), col(Audit.id).desc()).limit(
+                1
+            )
+        )
+    ).first()
+    if point is None:
+        raise NotFound(detail="Audit entry not found")
+    data = PublicAudit.model_validate(point).model_copy(
+        update={"data": await AuditTrail.state(session, point), "snapshot": True}
     )
-    data = session.exec(statement)
 
-    return Response.buildResponse(Response.Audit, data)  # type: ignore
+    return Response.buildResponse(Response.AuditState, data)  # type: ignore
+
+
+@router.get(
+    "/audit/{object}/export",
+    status_code=status.HTTP_200_OK,
+    responses={
+        **ErrorResponses.notFound,
+        **ErrorResponses.forbidden,
+        **ErrorResponses.unauthorized,
+        **ErrorResponses.unprocessable,
+        200: {
+            "description": "Audit logs for the requested object as newline delimited JSON",
+            "content": {"application/x-ndjson": {}},
+        },
+    },
+)
+async def getAuditExport(
+    object: str,
+    roles: Annotated[dict, Depends(getRoles)],
+    targetId: str | None = None,
+    userId: str | None = None,
+    action: int | None = None,
+    since: float | None = None,
+    until: float | None = None,
+) -> StreamingResponse:
+    statement = auditStatement(
+        object, roles, targetId, userId, action, since, until
+    ).order_by(col(Audit.timestamp), col(Audit.id))
+
+    async def streamAudit() -> AsyncGenerator[str, None]:
+        async with AsyncSession(asyncEngine) as session:
+            result = await session.stream_scalars(
+                statement.execution_options(yield_per=1000)
+            )
+            async for partition in result.partitions():
+                yield "".join(
+                    f"{PublicAudit.model_validate(item).model_dump_json()}\n"
+                    for item in partition
+                )
+                session.expunge_all()
+
+    return StreamingResponse(streamAudit(), media_type="application/x-ndjson")
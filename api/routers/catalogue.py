@@ -1,16 +1,22 @@
 from typing import Annotated
 
 from fastapi import Depends, status
+from fastapi import Response as FastAPIResponse
 from sqlalchemy.exc import DatabaseError
+from sqlalchemy.orm import selectinload
 from sqlmodel import col, or_, select
 
 from api.error import ConflictError, ErrorResponses, NotFound, raiseDBErrorReadable
-from api.models import SessionDep, audit
+from api.helper import Paginator, setAssociations
+from api.models import AsyncSessionDep, audit
 from api.models.db import Catalogue, Tag, Topic
 from api.models.insert import Insert
+from api.models.loader import Loader
 from api.models.response import Response
+from api.models.softdelete import SoftDelete
 from api.models.update import Update
 from api.routers import AuthRouter, getRoles, getUserId
+from helper.cache import CatalogueCache
 
 router = AuthRouter()
 
@@ -25,14 +31,20 @@ router = AuthRouter()
     },
 )
 async def getCatalogues(
-    session: SessionDep, expandTopics: bool = True
+    session: AsyncSessionDep,
+    page: Annotated[Paginator, Depends()],
+    expandTopics: bool = True,
 ) -> Response.Catalogue.ListWithTags | Response.Catalogue.ListWithTopicsAndRequirements:
-    catalogues = session.exec(select(Catalogue)).unique().all()
-
     if expandTopics is False:
-        return Response.buildResponse(Response.Catalogue.ListWithTags, catalogues)  # type: ignore
+        responseClass = Response.Catalogue.ListWithTags
     else:
-        return Response.buildResponse(Response.Catalogue.ListWithTopicsAndRequirements, catalogues)  # type: ignore
+        responseClass = Response.Catalogue.ListWithTopicsAndRequirements
+    return await page.respond(
+        session,
+        select(Catalogue).options(*Loader.options(responseClass)),
+        Catalogue,
+        responseClass,
+    )
 
 
 @router.get(
@@ -45,26 +57,29 @@ async def getCatalogues(
     },
 )
 async def findCatalogues(
-    session: SessionDep, query: str, expandTopics: bool = True
+    session: AsyncSessionDep,
+    page: Annotated[Paginator, Depends()],
+    query: str,
+    expandTopics: bool = True,
 ) -> Response.Catalogue.ListWithTags | Response.Catalogue.ListWithTopicsAndRequirements:
-    catalogues = (
-        session.exec(
-            select(Catalogue).where(
-                or_(
-                    col(Catalogue.key).contains(query),
-                    col(Catalogue.title).contains(query),
-                )
+    if expandTopics is False:
+        responseClass = Response.Catalogue.ListWithTags
+    else:
+        responseClass = Response.Catalogue.ListWithTopicsAndRequirements
+    return await page.respond(
+        session,
+        select(Catalogue)
+        .where(
+            or_(
+                col(Catalogue.key).contains(query),
+                col(Catalogue.title).contains(query),
             )
         )
-        .unique()
-        .all()
+        .options(*Loader.options(responseClass)),
+        Catalogue,
+        responseClass,
     )
 
-    if expandTopics is False:
-        return Response.buildResponse(Response.Catalogue.ListWithTags, catalogues)  # type: ignore
-    else:
-        return Response.buildResponse(Response.Catalogue.ListWithTopicsAndRequirements, catalogues)  # type: ignore
-
 
 @router.get(
     "/catalogues/{catalogueID}",
@@ -79,7 +94,7 @@ async def findCatalogues(
 )
 async def getCatalogue(
     roles: Annotated[dict, Depends(getRoles)],
-    session: SessionDep,
+    session: AsyncSessionDep,
     catalogueID: int,
     expandTopics: bool = True,
 ) -> (
@@ -87,16 +102,27 @@ async def getCatalogue(
     | Response.Catalogue.OneWithTopicsAndRequirements
     | Response.Catalogue.OneWithTopicsAndRequirementsAndComments
 ):
-    catalogue = session.get(Catalogue, catalogueID)
+    if expandTopics is False:
+        responseClass = Response.Catalogue.OneWithTags
+    elif "Comments.Reader" in roles:
+        responseClass = Response.Catalogue.OneWithTopicsAndRequirementsAndComments
+    else:
+        responseClass = Response.Catalogue.OneWithTopicsAndRequirements
+    generation, tree = await CatalogueCache.getTree(catalogueID, responseClass.__name__)
+    if tree is not None:
+        return FastAPIResponse(content=tree, media_type="application/json")
+    catalogue = await session.get(
+        Catalogue, catalogueID, options=Loader.options(responseClass)
+    )
 
     if not catalogue:
         raise NotFound(detail="Catalogue not found")
-    if expandTopics is False:
-        return Response.buildResponse(Response.Catalogue.OneWithTags, catalogue)  # type: ignore
-    else:
-        if "Comments.Reader" in roles:
-            return Response.buildResponse(Response.Catalogue.OneWithTopicsAndRequirementsAndComments, catalogue)  # type: ignore
-        return Response.buildResponse(Response.Catalogue.OneWithTopicsAndRequirements, catalogue)  # type: ignore
+    response = Response.buildResponse(responseClass, catalogue)  # type: ignore
+    if generation is not None:
+        await CatalogueCache.setTree(
+            catalogueID, responseClass.__name__, generation, response.body.decode()
+        )
+    return response
 
 
 @router.patch(
@@ -107,42 +133,46 @@ async def getCatalogue(
         **ErrorResponses.forbidden,
         **ErrorResponses.unauthorized,
         **ErrorResponses.unprocessable,
+        **ErrorResponses.conflict,
         200: {"description": "The updated catalogue"},
     },
 )
 async def patchCatalogue(
     catalogue: Update.Catalogue,
     catalogueID: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.Catalogue.OneWithTopicsAndRequirements:
-    catalogueFromDB = session.get(Catalogue, catalogueID)
+    catalogueFromDB = await session.get(
+        Catalogue,
+        catalogueID,
+        options=[selectinload(Catalogue.topics), selectinload(Catalogue.tags)],
+    )
     if not catalogueFromDB:
         raise NotFound(detail="Catalogue not found")
     catalogueFromDB.sqlmodel_update(catalogue.model_dump(exclude_unset=True))
-    catalogueFromDB.topics = []
-    topics = catalogue.topics or []
-    for topic in topics:
-        t = session.get(Topic, topic.id)
-        if t:
-            catalogueFromDB.topics.append(t)
-        else:
-            raise NotFound(detail=f"Child with ID {topic.id} not found")
-    catalogueFromDB.tags = []
-    tags = catalogue.tags or []
-    for tag in tags:
-        t = session.get(Tag, tag.id)
-        if t:
-            catalogueFromDB.tags.append(t)
-        else:
-            raise NotFound(detail=f"Tag with ID {tag.id} not found")
+    await setAssociations(
+        session,
+        catalogueFromDB,
+        "topics",
+        Topic,
+        [topic.id for topic in catalogue.topics or []],
+    )
+    await setAssociations(
+        session, catalogueFromDB, "tags", Tag, [tag.id for tag in catalogue.tags or []]
+    )
     session.add(catalogueFromDB)
+    audit(session, 1, catalogueFromDB, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(catalogueFromDB)
-    audit(session, 1, catalogueFromDB, userId)
+    session.expunge_all()
+    catalogueFromDB = await session.get(
+        Catalogue,
+        catalogueID,
+        options=Loader.options(Response.Catalogue.OneWithTopics),
+    )
     return Response.buildResponse(Response.Catalogue.OneWithTopics, catalogueFromDB)  # type: ignore
 
 
@@ -154,12 +184,13 @@ async def patchCatalogue(
         **ErrorResponses.forbidden,
         **ErrorResponses.unauthorized,
         **ErrorResponses.unprocessable,
+        **ErrorResponses.conflict,
         201: {"description": "The new catalogue"},
     },
 )
 async def addCatalogue(
     catalogue: Insert.Catalogue,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.Catalogue.One:
     topics = catalogue.topics
@@ -168,24 +199,16 @@ async def addCatalogue(
     catalogue.tags = []
     catalogueDB = Catalogue.model_validate(catalogue)
     session.add(catalogueDB)
-    for topic in topics:
-        t = session.get(Topic, topic.id)
-        if t:
-            catalogueDB.topics.append(t)
-        else:
-            raise NotFound(detail=f"Child with ID {topic.id} not found")
-    for tag in tags:
-        t = session.get(Tag, tag.id)
-        if t:
-            catalogueDB.tags.append(t)
-        else:
-            raise NotFound(detail=f"Child with ID {tag.id} not found")
+    await setAssociations(
+        session, catalogueDB, "topics", Topic, [topic.id for topic in topics]
+    )
+    await setAssociations(session, catalogueDB, "tags", Tag, [tag.id for tag in tags])
+    audit(session, 0, catalogueDB, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(catalogueDB)
-    audit(session, 0, catalogueDB, userId)
+    await session.refresh(catalogueDB)
     return Response.buildResponse(Response.Catalogue.One, catalogueDB, 201)  # type: ignore
 
 
@@ -203,11 +226,13 @@ async def addCatalogue(
 )
 async def deleteCatalogue(
     catalogueID: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
     force: bool = False,
 ) -> None:
-    catalogue = session.get(Catalogue, catalogueID)
+    catalogue = await session.get(
+        Catalogue, catalogueID, options=[selectinload(Catalogue.topics)]
+    )
     if not catalogue:
         raise NotFound(detail="Catalogue not found")
     if len(catalogue.topics) > 0 and force is False:
@@ -217,10 +242,10 @@ async def deleteCatalogue(
                 "Use force (?force=true) to delete anyway.",
             ]
         )
-    session.delete(catalogue)
+    await SoftDelete.delete(session, catalogue, userId)
+    audit(session, 2, catalogue, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    audit(session, 2, catalogue, userId)
     return None
@@ -0,0 +1,167 @@
+import json
+from collections.abc import AsyncGenerator
+from typing import Annotated
+
+from fastapi import Depends, Query, status
+from fastapi.responses import StreamingResponse
+from sqlmodel import col, select
+
+from api.error import ErrorResponses, NotFound
+from api.models import AsyncSessionDep
+from api.models.base import timestamp
+from api.models.db import (
+    Audit,
+    Catalogue,
+    Comment,
+    ExtraEntry,
+    ExtraType,
+    Requirement,
+    Tag,
+    Topic,
+)
+from api.models.public import Change, Changes
+from api.models.response import Response
+from api.routers import AuthRouter, getRoles
+from helper.feed import ChangeFeed
+
+router = AuthRouter()
+
+# table name: (type in the change feed, role needed to read the changes)
+changeTypes: dict[str, tuple[str, str]] = {
+    Catalogue.__tablename__: ("catalogues", "Requirements.Reader"),
+    Topic.__tablename__: ("topics", "Requirements.Reader"),
+    Requirement.__tablename__: ("requirements", "Requirements.Reader"),
+    Tag.__tablename__: ("tags", "Requirements.Reader"),
+    ExtraType.__tablename__: ("extraTypes", "Requirements.Reader"),
+    ExtraEntry.__tablename__: ("extraEntries", "Requirements.Reader"),
+    Comment.__tablename__: ("comments", "Comments.Reader"),
+}
+
+# seconds since the insert of an audit row before it is returned, so a transaction which got a lower audit id
+# but commits later is not skipped by the cursor. The insert time is used instead of the time of the change,
+# as the batches of the audit queue (AUDIT_QUEUE) are inserted after the change by each worker
+SETTLE_TIME = 2
+
+
+@router.get(
+    "/changes",
+    status_code=status.HTTP_200_OK,
+    responses={
+        **ErrorResponses.forbidden,
+        **ErrorResponses.unauthorized,
+        **ErrorResponses.unprocessable,
+        200: {"description": "The changed objects since the cursor"},
+    },
+)
+async def getChanges(
+    session: AsyncSessionDep,
+    roles: Annotated[dict, Depends(getRoles)],
+    since: int | None = None,
+    limit: Annotated[int, Query(ge=1, le=10000)] = 1000,
+) -> Response.Changes:
+    """
+    Returns the objects changed since a cursor, read from the audit log in the order of the audit ids.
+    Every object is returned once with its last change (an object added and updated since the cursor is an INSERT).
+    Without a cursor only the current cursor is returned, e.g. to start the sync after a full fetch.
+    If more is true, further changes are waiting and the request should be repeated with the returned cursor
+    """
+    tables: list[str] = [
+        table for table, (_, role) in changeTypes.items() if role in roles
+    ]
+    if since is None:
+        cursor: int | None = (
+            await session.exec(select(Audit.id).order_by(col(Audit.id).desc()))
+        ).first()
+        return Response.buildResponse(
+            Response.Changes, Changes(cursor=cursor or 0, more=False, changes=[])
+        )  # type: ignore
+    rows = (
+        await session.exec(
+            select(
+                Audit.id,
+                Audit.table,
+                Audit.target_id,
+                Audit.action,
+                Audit.timestamp,
+                Audit.inserted,
+            )
+            .where(col(Audit.id) > since, col(Audit.table).in_(tables))
+            .order_by(col(Audit.id))
+            .limit(limit + 1)
+        )
+    ).all()
+    more: bool = len(rows) > limit
+    settled: float = timestamp() - SETTLE_TIME
+    changes: dict[tuple[str, str], Change] = {}
+    cursor = since
+    for id, table, targetId, action, changed, inserted in rows[:limit]:
+        if inserted is not None and inserted > settled:
+            more = True
+            break
+        cursor = id
+        previous: Change | None = changes.pop((table, targetId), None)
+        changes[(table, targetId)] = Change(
+            type=changeTypes[table][0],
+            id=targetId,
+            verb=(
+                "INSERT"
+                if previous is not None and previous.verb == "INSERT" and action == 1
+                else ["INSERT", "UPDATE", "DELETE"][action]
+            ),
+            timestamp=changed,
+        )
+
+    return Response.buildResponse(
+        Response.Changes,
+        Changes(cursor=cursor, more=more, changes=list(changes.values())),
+    )  # type: ignore
+
+
+@router.get(
+    "/changes/events",
+    status_code=status.HTTP_200_OK,
+    responses={
+        **ErrorResponses.notFound,
+        **ErrorResponses.forbidden,
+        **ErrorResponses.unauthorized,
+        **ErrorResponses.unprocessable,
+        200: {
+            "description": "Server-sent events with the changed objects of every transaction",
+            "content": {"text/event-stream": {}},
+        },
+    },
+)
+async def getChangeEvents(
+    roles: Annotated[dict, Depends(getRoles)],
+    catalogues: Annotated[list[int] | None, Query()] = None,
+) -> StreamingResponse:
+    """
+    Streams the changed objects of every committed transaction as server-sent events ("changes" event
+    with the data {"changes": [{"type", "id", "verb"}], "catalogues": [ids of the affected catalogues]}).
+    With catalogues only changes affecting one of the catalogues are sent.
+    If the stream ends, the client should reconnect and resync with /changes.
+    Answers 404 if the change feed is not active (CHANGE_FEED_ACTIVE), clients have to poll /changes then
+    """
+    if ChangeFeed.active is False:
+        raise NotFound(
+            detail="The change feed is not active (CHANGE_FEED_ACTIVE). Poll /changes instead."
+        )
+    types: set[str] = {type for type, role in changeTypes.values() if role in roles}
+
+    async def streamChanges() -> AsyncGenerator[str, None]:
+        yield "retry: 5000\n\n"
+        async for event in ChangeFeed.subscribe():
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            if catalogues and not set(catalogues) & set(event["catalogues"]):
+                continue
+            changes: list[dict] = [c for c in event["changes"] if c["type"] in types]
+            if len(changes) > 0:
+                yield f"event: changes\ndata: {json.dumps({'changes': changes, 'catalogues': event['catalogues']})}\n\n"
+
+    return StreamingResponse(
+        streamChanges(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -5,11 +5,14 @@ from sqlalchemy.exc import DatabaseError
 from sqlmodel import col, or_, select
 
 from api.error import ConflictError, ErrorResponses, NotFound, raiseDBErrorReadable
-from api.helper import sendNotificationMailForNewComment
-from api.models import SessionDep, audit
-from api.models.db import Comment
+from api.helper import Paginator, sendNotificationMailForNewComment
+from api.models import AsyncSessionDep, audit
+from api.models.db import Comment, User
 from api.models.insert import Insert
+from api.models.loader import Loader
 from api.models.response import Response
+from api.models.softdelete import SoftDelete
+from api.models.tree import CommentThread
 from api.models.update import Update
 from api.routers import AuthRouter, getUserId
 
@@ -25,10 +28,16 @@ router = AuthRouter()
         200: {"description": "All comments"},
     },
 )
-async def getComments(session: SessionDep) -> Response.Comment.List:
-    comments = session.exec(select(Comment)).unique().all()
+async def getComments(
+    session: AsyncSessionDep, page: Annotated[Paginator, Depends()]
+) -> Response.Comment.List:
+    comments = await page.fetch(
+        session,
+        select(Comment).options(*Loader.options(Response.Comment.List)),
+        Comment,
+    )
 
-    return Response.buildResponse(Response.Comment.List, comments)  # type: ignore
+    return Response.buildResponse(Response.Comment.List, comments, page=page.page)  # type: ignore
 
 
 @router.get(
@@ -40,21 +49,24 @@ async def getComments(session: SessionDep) -> Response.Comment.List:
         200: {"description": "All comments"},
     },
 )
-async def findComments(session: SessionDep, query: str) -> Response.Comment.List:
-    comments = (
-        session.exec(
-            select(Comment).where(
-                or_(
-                    col(Comment.comment).contains(query),
-                    col(Comment.author.email).contains(query),
-                )
+async def findComments(
+    session: AsyncSessionDep, page: Annotated[Paginator, Depends()], query: str
+) -> Response.Comment.List:
+    comments = await page.fetch(
+        session,
+        select(Comment)
+        .join(User)
+        .where(
+            or_(
+                col(Comment.comment).contains(query),
+                col(User.email).contains(query),
             )
         )
-        .unique()
-        .all()
+        .options(*Loader.options(Response.Comment.List)),
+        Comment,
     )
 
-    return Response.buildResponse(Response.Comment.List, comments)  # type: ignore
+    return Response.buildResponse(Response.Comment.List, comments, page=page.page)  # type: ignore
 
 
 @router.get(
@@ -68,8 +80,10 @@ async def findComments(session: SessionDep, query: str) -> Response.Comment.List
         200: {"description": "the selected comment"},
     },
 )
-async def getComment(session: SessionDep, commentID: int) -> Response.Comment.One:
-    comment = session.get(Comment, commentID)
+async def getComment(session: AsyncSessionDep, commentID: int) -> Response.Comment.One:
+    comment = await session.get(
+        Comment, commentID, options=Loader.options(Response.Comment.One)
+    )
 
     if not comment:
         raise NotFound(detail="Comment not found")
@@ -91,20 +105,23 @@ async def getComment(session: SessionDep, commentID: int) -> Response.Comment.On
 async def patchComment(
     comment: Update.Comment,
     commentID: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.Comment.One:
-    commentFromDB = session.get(Comment, commentID)
+    commentFromDB = await session.get(Comment, commentID)
     if not commentFromDB:
         raise NotFound(detail="Comment not found")
     commentFromDB.sqlmodel_update(comment.model_dump(exclude_unset=True))
     session.add(commentFromDB)
+    audit(session, 1, commentFromDB, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(commentFromDB)
-    audit(session, 1, commentFromDB, userId)
+    session.expunge_all()
+    commentFromDB = await session.get(
+        Comment, commentID, options=Loader.options(Response.Comment.One)
+    )
     return Response.buildResponse(Response.Comment.One, commentFromDB)  # type: ignore
 
 
@@ -121,20 +138,23 @@ async def patchComment(
 async def addComment(
     userId: Annotated[str, Depends(getUserId)],
     comment: Insert.Comment,
-    session: SessionDep,
+    session: AsyncSessionDep,
     backgroundTasks: BackgroundTasks,
 ) -> Response.Comment.One:
     comment.authorId = userId
     commentDB = Comment.model_validate(comment)
     session.add(commentDB)
+    audit(session, 0, commentDB, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(commentDB)
-    audit(session, 0, commentDB, userId)
-    # sendNotificationMailForNewComment(session, commentDB.id)
-    backgroundTasks.add_task(sendNotificationMailForNewComment, session, commentDB.id)
+    session.expunge_all()
+    commentDB = await session.get(
+        Comment, commentDB.id, options=Loader.options(Response.Comment.One)
+    )
+    # sendNotificationMailForNewComment(commentDB.id)
+    backgroundTasks.add_task(sendNotificationMailForNewComment, commentDB.id)
     return Response.buildResponse(Response.Comment.One, commentDB, 201)  # type: ignore
 
 
@@ -151,11 +171,11 @@ async def addComment(
 )
 async def deleteComment(
     commentID: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
     force: bool = False,
 ) -> None:
-    comment = session.get(Comment, commentID)
+    comment = await CommentThread.load(session, commentID)
     if not comment:
         raise NotFound(detail="Comment not found")
     if len(comment.children) > 0 and force is False:
@@ -166,10 +186,10 @@ async def deleteComment(
                 "This will also delete the extras.",
             ]
         )
-    session.delete(comment)
+    await SoftDelete.delete(session, comment, userId)
+    audit(session, 2, comment, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    audit(session, 2, comment, userId)
     return None
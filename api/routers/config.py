@@ -1,12 +1,19 @@
 from typing import Annotated
 
 from fastapi import Depends, status
+from fastapi import Response as FastAPIResponse
 from sqlalchemy.exc import DatabaseError
+from sqlalchemy.orm import selectinload
 from sqlmodel import select
 
-from api.config import AppConfig
-from api.error import ErrorResponses, NotFound, raiseDBErrorReadable
-from api.models import SessionDep
+from api.error import (
+    ErrorResponses,
+    NotFound,
+    UnprocessableContent,
+    raiseDBErrorReadable,
+)
+from api.models import AsyncSessionDep
+from api.models.configuration import DynamicConfiguration
 from api.models.db import Configuration, User
 from api.models.public import User as PublicUser
 from api.models.response import Response
@@ -24,36 +31,11 @@ router = AuthRouter()
     },
 )
 async def getStaticConfig(
-    session: SessionDep,
+    session: AsyncSessionDep,
 ) -> Response.Configuration.Static:
-    homeTitle = session.get(Configuration, "HOME_TITLE")
-    homeMOTDPre = session.get(Configuration, "HOME_MOTD_PRE")
-    homeMOTDPost = session.get(Configuration, "HOME_MOTD_POST")
-    loginMOTDPre = session.get(Configuration, "LOGIN_MOTD_PRE")
-    loginMOTDPost = session.get(Configuration, "LOGIN_MOTD_POST")
-
-    return Response.buildResponse(
-        Response.Configuration.Static,
-        {
-            "oauth": {"provider": AppConfig.OAUTH_PROVIDER},
-            "home": {
-                "title": (
-                    homeTitle.value
-                    if homeTitle and homeTitle.value != ""
-                    else "Welcome to ReqDB"
-                ),
-                "MOTD": {
-                    "pre": homeMOTDPre.value if homeMOTDPre else "",
-                    "post": homeMOTDPost.value if homeMOTDPost else "",
-                },
-            },
-            "login": {
-                "MOTD": {
-                    "pre": loginMOTDPre.value if loginMOTDPre else "",
-                    "post": loginMOTDPost.value if loginMOTDPost else "",
-                },
-            },
-        },  # type: ignore
+    return FastAPIResponse(
+        content=await DynamicConfiguration.getStatic(session),
+        media_type="application/json",
     )  # type: ignore
 
 
@@ -67,10 +49,10 @@ async def getStaticConfig(
     },
 )
 async def getSystemConfig(
-    session: SessionDep,
+    session: AsyncSessionDep,
 ) -> Response.Configuration.Dynamic.List:
 
-    conf = session.exec(select(Configuration)).unique().all()
+    conf = (await session.exec(select(Configuration))).unique().all()
     return Response.buildResponse(Response.Configuration.Dynamic.List, conf)  # type: ignore
 
 
@@ -88,22 +70,29 @@ async def getSystemConfig(
 async def patchSystemConfig(
     configuration: Update.Configuration,
     configID: str,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.Configuration.Dynamic.One:
-    configurationFromDB = session.get(Configuration, configID)
+    configurationFromDB = await session.get(Configuration, configID)
     if not configurationFromDB:
         raise NotFound(detail="Configuration item not found")
+    if configuration.value is not None:
+        try:
+            configuration.value = DynamicConfiguration.validate(
+                configurationFromDB.type, configuration.value
+            )
+        except ValueError as e:
+            raise UnprocessableContent(detail=f"{configID}: {e}")
     configurationFromDB.sqlmodel_update(configuration.model_dump(exclude_unset=True))
     session.add(configurationFromDB)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(configurationFromDB)
+    await session.refresh(configurationFromDB)
     # if configurationFromDB.type == "secret":
     #     configurationFromDB.value = "******"
-    # audit(session, 1, configurationFromDB, userId)
+    # await audit(session, 1, configurationFromDB, userId)
     return Response.buildResponse(Response.Configuration.Dynamic.One, configurationFromDB)  # type: ignore
 
 
@@ -117,11 +106,13 @@ async def patchSystemConfig(
     },
 )
 async def getUserConfig(
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.User.One:
 
-    conf: User | None = session.get(User, userId)
+    conf: User | None = await session.get(
+        User, userId, options=[selectinload(User.tokens)]
+    )
     if conf:
         publicConf: PublicUser = PublicUser.model_validate(conf)
         for token in conf.tokens:
@@ -144,17 +135,17 @@ async def getUserConfig(
 )
 async def patchUserConfig(
     configuration: Update.User,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.User.One:
-    configurationFromDB = session.get(User, userId)
+    configurationFromDB = await session.get(User, userId)
     if not configurationFromDB:
         raise NotFound(detail="Configuration item not found")
     configurationFromDB.sqlmodel_update(configuration.model_dump(exclude_unset=True))
     session.add(configurationFromDB)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(configurationFromDB)
+    await session.refresh(configurationFromDB)
     return Response.buildResponse(Response.User.One, configurationFromDB)  # type: ignore
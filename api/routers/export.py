@@ -3,7 +3,7 @@ from typing import Annotated
 from fastapi import Depends, Request, status
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.exc import DatabaseError
-from sqlmodel import Session
+from sqlalchemy.orm import selectinload
 
 from api.connectors.jira import Jira
 from api.error import (
@@ -14,8 +14,8 @@ from api.error import (
     UnprocessableContent,
     raiseDBErrorReadable,
 )
-from api.models import SessionDep, engine
-from api.models.db import Requirement, Token, User
+from api.models import AsyncSessionDep
+from api.models.db import ExtraEntry, Requirement, Token, User
 from api.models.insert import Insert
 from api.models.public import Export
 from api.models.response import Response
@@ -23,11 +23,10 @@ from api.routers import AuthRouter, getRoles, getUserId
 
 router = AuthRouter()
 
-with Session(engine) as session:
-    try:
-        jira = Jira(session=session)
-    except:
-        jira = None
+try:
+    jira = Jira()
+except:
+    jira = None
 
 
 @router.get(
@@ -39,7 +38,7 @@ with Session(engine) as session:
     },
 )
 async def getJiraConfiguration(
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
     roles: Annotated[dict, Depends(getRoles)],
     request: Request,
@@ -61,7 +60,7 @@ async def getJiraConfiguration(
     },
 )
 async def getJiraToken(
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
     roles: Annotated[dict, Depends(getRoles)],
     request: Request,
@@ -137,11 +136,15 @@ async def getJiraCallback(
     },
 )
 async def postJiraConnectUser(
-    session: SessionDep, userId: Annotated[str, Depends(getUserId)], token: Insert.Token
+    session: AsyncSessionDep,
+    userId: Annotated[str, Depends(getUserId)],
+    token: Insert.Token,
 ) -> None:
     if jira:
         token.userId = userId
-        user: User | None = session.get(User, userId)
+        user: User | None = await session.get(
+            User, userId, options=[selectinload(User.tokens)]
+        )
         if user is None:
             raise Unauthorized(detail="User ID not found")
 
@@ -149,18 +152,18 @@ async def postJiraConnectUser(
 
         for userToken in user.tokens:
             if userToken.name == "AtlassianID":
-                session.delete(userToken)
+                await session.delete(userToken)
         try:
-            session.commit()
+            await session.commit()
         except DatabaseError as e:
             raiseDBErrorReadable(e)
 
         session.add(tokenDB)
         try:
-            session.commit()
+            await session.commit()
         except DatabaseError as e:
             raiseDBErrorReadable(e)
-        session.refresh(tokenDB)
+        await session.refresh(tokenDB)
     else:
         raise InternalServerError(detail="Atlassian connection not configured")
 
@@ -178,17 +181,21 @@ async def postJiraConnectUser(
         204: {"description": "Nothing"},
     },
 )
-async def deleteJiraConnectUser(userId: Annotated[str, Depends(getUserId)]) -> None:
+async def deleteJiraConnectUser(
+    session: AsyncSessionDep, userId: Annotated[str, Depends(getUserId)]
+) -> None:
 
-    user: User | None = session.get(User, userId)
+    user: User | None = await session.get(
+        User, userId, options=[selectinload(User.tokens)]
+    )
     if jira:
         if user is None:
             raise Unauthorized(detail="User ID not found")
         for token in user.tokens:
             if token.name == "AtlassianID":
-                session.delete(token)
+                await session.delete(token)
                 try:
-                    session.commit()
+                    await session.commit()
                 except DatabaseError as e:
                     raiseDBErrorReadable(e)
                 return None
@@ -211,7 +218,7 @@ async def deleteJiraConnectUser(userId: Annotated[str, Depends(getUserId)]) -> N
 )
 async def postJiraExport(
     request: Request,
-    session: SessionDep,
+    session: AsyncSessionDep,
     data: Insert.ExportToJira,
     jiraProjectID: int,
     jiraIssueTypeID: int,
@@ -223,7 +230,14 @@ async def postJiraExport(
         requirements: list[Requirement] = []
 
         for id in data.items:
-            requirement: Requirement | None = session.get(Requirement, id)
+            requirement: Requirement | None = await session.get(
+                Requirement,
+                id,
+                options=[
+                    selectinload(Requirement.tags),
+                    selectinload(Requirement.extras).joinedload(ExtraEntry.extraType),
+                ],
+            )
             if requirement:
                 await jira.createIssueFromRequirement(
                     request,
@@ -5,10 +5,13 @@ from sqlalchemy.exc import DatabaseError
 from sqlmodel import col, select
 
 from api.error import ErrorResponses, NotFound, raiseDBErrorReadable
-from api.models import SessionDep, audit
+from api.helper import Paginator
+from api.models import AsyncSessionDep, audit
 from api.models.db import ExtraEntry
 from api.models.insert import Insert
+from api.models.loader import Loader
 from api.models.response import Response
+from api.models.softdelete import SoftDelete
 from api.models.update import Update
 from api.routers import AuthRouter, getUserId
 
@@ -25,14 +28,20 @@ router = AuthRouter()
     },
 )
 async def getExtraEntries(
-    session: SessionDep, expandTopics: bool = True
+    session: AsyncSessionDep,
+    page: Annotated[Paginator, Depends()],
+    expandTopics: bool = True,
 ) -> Response.ExtraEntry.List:
-    extraEntries = session.exec(select(ExtraEntry)).unique().all()
+    extraEntries = await page.fetch(
+        session,
+        select(ExtraEntry).options(*Loader.options(Response.ExtraEntry.List)),
+        ExtraEntry,
+    )
 
     if expandTopics is False:
-        return Response.buildResponse(Response.ExtraEntry.List, extraEntries)  # type: ignore
+        return Response.buildResponse(Response.ExtraEntry.List, extraEntries, page=page.page)  # type: ignore
     else:
-        return Response.buildResponse(Response.ExtraEntry.List, extraEntries)  # type: ignore
+        return Response.buildResponse(Response.ExtraEntry.List, extraEntries, page=page.page)  # type: ignore
 
 
 @router.get(
@@ -45,18 +54,23 @@ async def getExtraEntries(
     },
 )
 async def findExtraEntries(
-    session: SessionDep, query: str, expandTopics: bool = True
+    session: AsyncSessionDep,
+    page: Annotated[Paginator, Depends()],
+    query: str,
+    expandTopics: bool = True,
 ) -> Response.ExtraEntry.List:
-    extraEntries = (
-        session.exec(select(ExtraEntry).where(col(ExtraEntry.content).contains(query)))
-        .unique()
-        .all()
+    extraEntries = await page.fetch(
+        session,
+        select(ExtraEntry)
+        .where(col(ExtraEntry.content).contains(query))
+        .options(*Loader.options(Response.ExtraEntry.List)),
+        ExtraEntry,
     )
 
     if expandTopics is False:
-        return Response.buildResponse(Response.ExtraEntry.List, extraEntries)  # type: ignore
+        return Response.buildResponse(Response.ExtraEntry.List, extraEntries, page=page.page)  # type: ignore
     else:
-        return Response.buildResponse(Response.ExtraEntry.List, extraEntries)  # type: ignore
+        return Response.buildResponse(Response.ExtraEntry.List, extraEntries, page=page.page)  # type: ignore
 
 
 @router.get(
@@ -71,9 +85,11 @@ async def findExtraEntries(
     },
 )
 async def getExtraEntry(
-    session: SessionDep, extraTypeID: int, expandTopics: bool = True
+    session: AsyncSessionDep, extraTypeID: int, expandTopics: bool = True
 ) -> Response.ExtraEntry.One | Response.ExtraEntry.One:
-    extraType = session.get(ExtraEntry, extraTypeID)
+    extraType = await session.get(
+        ExtraEntry, extraTypeID, options=Loader.options(Response.ExtraEntry.One)
+    )
 
     if not extraType:
         raise NotFound(detail="ExtraEntry not found")
@@ -97,20 +113,23 @@ async def getExtraEntry(
 async def patchExtraEntry(
     extraType: Update.ExtraEntry,
     extraTypeID: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.ExtraEntry.One:
-    extraTypeFromDB = session.get(ExtraEntry, extraTypeID)
+    extraTypeFromDB = await session.get(ExtraEntry, extraTypeID)
     if not extraTypeFromDB:
         raise NotFound(detail="ExtraEntry not found")
     extraTypeFromDB.sqlmodel_update(extraType.model_dump(exclude_unset=True))
     session.add(extraTypeFromDB)
+    audit(session, 1, extraTypeFromDB, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(extraTypeFromDB)
-    audit(session, 1, extraTypeFromDB, userId)
+    session.expunge_all()
+    extraTypeFromDB = await session.get(
+        ExtraEntry, extraTypeID, options=Loader.options(Response.ExtraEntry.One)
+    )
     return Response.buildResponse(Response.ExtraEntry.One, extraTypeFromDB)  # type: ignore
 
 
@@ -126,17 +145,20 @@ async def patchExtraEntry(
 )
 async def addExtraEntry(
     extraType: Insert.ExtraEntry,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.ExtraEntry.One:
     extraTypeDB = ExtraEntry.model_validate(extraType)
     session.add(extraTypeDB)
+    audit(session, 0, extraTypeDB, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(extraTypeDB)
-    audit(session, 0, extraTypeDB, userId)
+    session.expunge_all()
+    extraTypeDB = await session.get(
+        ExtraEntry, extraTypeDB.id, options=Loader.options(Response.ExtraEntry.One)
+    )
     return Response.buildResponse(Response.ExtraEntry.One, extraTypeDB, 201)  # type: ignore
 
 
@@ -153,16 +175,16 @@ async def addExtraEntry(
 )
 async def deleteExtraEntry(
     extraTypeID: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> None:
-    extraType = session.get(ExtraEntry, extraTypeID)
+    extraType = await session.get(ExtraEntry, extraTypeID)
     if not extraType:
         raise NotFound(detail="ExtraEntry not found")
-    session.delete(extraType)
+    await SoftDelete.delete(session, extraType, userId)
+    audit(session, 2, extraType, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    audit(session, 2, extraType, userId)
     return None
@@ -2,13 +2,16 @@ from typing import Annotated
 
 from fastapi import Depends, status
 from sqlalchemy.exc import DatabaseError
+from sqlalchemy.orm import selectinload
 from sqlmodel import col, select
 
 from api.error import ConflictError, ErrorResponses, NotFound, raiseDBErrorReadable
-from api.models import SessionDep, audit
+from api.helper import Paginator
+from api.models import AsyncSessionDep, audit
 from api.models.db import ExtraType
 from api.models.insert import Insert
 from api.models.response import Response
+from api.models.softdelete import SoftDelete
 from api.models.update import Update
 from api.routers import AuthRouter, getUserId
 
@@ -25,14 +28,16 @@ router = AuthRouter()
     },
 )
 async def getExtraTypes(
-    session: SessionDep, expandTopics: bool = True
+    session: AsyncSessionDep,
+    page: Annotated[Paginator, Depends()],
+    expandTopics: bool = True,
 ) -> Response.ExtraType.List:
-    extraTypes = session.exec(select(ExtraType)).unique().all()
+    extraTypes = await page.fetch(session, select(ExtraType), ExtraType)
 
     if expandTopics is False:
-        return Response.buildResponse(Response.ExtraType.List, extraTypes)  # type: ignore
+        return Response.buildResponse(Response.ExtraType.List, extraTypes, page=page.page)  # type: ignore
     else:
-        return Response.buildResponse(Response.ExtraType.List, extraTypes)  # type: ignore
+        return Response.buildResponse(Response.ExtraType.List, extraTypes, page=page.page)  # type: ignore
 
 
 @router.get(
@@ -45,18 +50,21 @@ async def getExtraTypes(
     },
 )
 async def findExtraTypes(
-    session: SessionDep, query: str, expandTopics: bool = True
+    session: AsyncSessionDep,
+    page: Annotated[Paginator, Depends()],
+    query: str,
+    expandTopics: bool = True,
 ) -> Response.ExtraType.List:
-    extraTypes = (
-        session.exec(select(ExtraType).where(col(ExtraType.title).contains(query)))
-        .unique()
-        .all()
+    extraTypes = await page.fetch(
+        session,
+        select(ExtraType).where(col(ExtraType.title).contains(query)),
+        ExtraType,
     )
 
     if expandTopics is False:
-        return Response.buildResponse(Response.ExtraType.List, extraTypes)  # type: ignore
+        return Response.buildResponse(Response.ExtraType.List, extraTypes, page=page.page)  # type: ignore
     else:
-        return Response.buildResponse(Response.ExtraType.List, extraTypes)  # type: ignore
+        return Response.buildResponse(Response.ExtraType.List, extraTypes, page=page.page)  # type: ignore
 
 
 @router.get(
@@ -71,9 +79,9 @@ async def findExtraTypes(
     },
 )
 async def getExtraType(
-    session: SessionDep, extraTypeID: int, expandTopics: bool = True
+    session: AsyncSessionDep, extraTypeID: int, expandTopics: bool = True
 ) -> Response.ExtraType.One | Response.ExtraType.One:
-    extraType = session.get(ExtraType, extraTypeID)
+    extraType = await session.get(ExtraType, extraTypeID)
 
     if not extraType:
         raise NotFound(status_code=404, detail="ExtraType not found")
@@ -97,21 +105,21 @@ async def getExtraType(
 async def patchExtraType(
     extraType: Update.ExtraType,
     extraTypeID: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.ExtraType.One:
-    extraTypeFromDB = session.get(ExtraType, extraTypeID)
+    extraTypeFromDB = await session.get(ExtraType, extraTypeID)
     if not extraTypeFromDB:
         raise NotFound(detail="ExtraType not found")
     extraTypeData = extraType.model_dump(exclude_unset=True, mode="python")
     extraTypeFromDB.sqlmodel_update(extraTypeData)
     session.add(extraTypeFromDB)
+    audit(session, 1, extraTypeFromDB, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(extraTypeFromDB)
-    audit(session, 1, extraTypeFromDB, userId)
+    await session.refresh(extraTypeFromDB)
     return Response.buildResponse(Response.ExtraType.One, extraTypeFromDB)  # type: ignore
 
 
@@ -127,17 +135,17 @@ async def patchExtraType(
 )
 async def addExtraType(
     extraType: Insert.ExtraType,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.ExtraType.One:
     extraTypeDB = ExtraType.model_validate(extraType)
     session.add(extraTypeDB)
+    audit(session, 0, extraTypeDB, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(extraTypeDB)
-    audit(session, 0, extraTypeDB, userId)
+    await session.refresh(extraTypeDB)
     return Response.buildResponse(Response.ExtraType.One, extraTypeDB, 201)  # type: ignore
 
 
@@ -155,11 +163,13 @@ async def addExtraType(
 )
 async def deleteExtraType(
     extraTypeID: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
     force: bool = False,
 ) -> None:
-    extraType = session.get(ExtraType, extraTypeID)
+    extraType = await session.get(
+        ExtraType, extraTypeID, options=[selectinload(ExtraType.children)]
+    )
     if not extraType:
         raise NotFound(detail="ExtraType not found")
     if len(extraType.children) > 0 and force is False:
@@ -170,10 +180,10 @@ async def deleteExtraType(
                 "This will also delete the ExtraEntries.",
             ]
         )
-    session.delete(extraType)
+    await SoftDelete.delete(session, extraType, userId)
+    audit(session, 2, extraType, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    audit(session, 2, extraType, userId)
     return None
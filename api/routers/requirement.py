@@ -2,14 +2,30 @@ from typing import Annotated
 
 from fastapi import Depends, status
 from sqlalchemy.exc import DatabaseError
+from sqlalchemy.orm import selectinload
 from sqlmodel import col, or_, select
 
-from api.error import ConflictError, ErrorResponses, NotFound, raiseDBErrorReadable
-from api.helper import checkParentTopicChildren
-from api.models import SessionDep, audit
-from api.models.db import Requirement, Tag
+from api.error import (
+    ConflictError,
+    ErrorResponses,
+    NotFound,
+    UnprocessableContent,
+    raiseDBErrorReadable,
+)
+from api.helper import (
+    Paginator,
+    checkParentTopicChildren,
+    checkParentTopicsChildren,
+    countRows,
+    getByIds,
+    setAssociations,
+)
+from api.models import AsyncSessionDep, audit, auditAll
+from api.models.db import Comment, ExtraEntry, Requirement, Tag
 from api.models.insert import Insert
+from api.models.loader import Loader
 from api.models.response import Response
+from api.models.softdelete import SoftDelete
 from api.models.update import Update
 from api.routers import AuthRouter, getRoles, getUserId
 
@@ -26,14 +42,20 @@ router = AuthRouter()
     },
 )
 async def getRequirements(
-    roles: Annotated[dict, Depends(getRoles)], session: SessionDep
+    roles: Annotated[dict, Depends(getRoles)],
+    session: AsyncSessionDep,
+    page: Annotated[Paginator, Depends()],
 ) -> Response.Requirement.List | Response.Requirement.ListWithComments:
-    requirements = session.exec(select(Requirement)).unique().all()
-
     if "Comments.Reader" in roles:
-        return Response.buildResponse(Response.Requirement.ListWithComments, requirements)  # type: ignore
+        responseClass = Response.Requirement.ListWithComments
     else:
-        return Response.buildResponse(Response.Requirement.List, requirements)  # type: ignore
+        responseClass = Response.Requirement.List
+    return await page.respond(
+        session,
+        select(Requirement).options(*Loader.options(responseClass)),
+        Requirement,
+        responseClass,
+    )
 
 
 @router.get(
@@ -46,27 +68,30 @@ async def getRequirements(
     },
 )
 async def findRequirements(
-    roles: Annotated[dict, Depends(getRoles)], query: str, session: SessionDep
+    roles: Annotated[dict, Depends(getRoles)],
+    query: str,
+    session: AsyncSessionDep,
+    page: Annotated[Paginator, Depends()],
 ) -> Response.Requirement.List | Response.Requirement.ListWithComments:
-    requirements = (
-        session.exec(
-            select(Requirement).where(
-                or_(
-                    col(Requirement.key).contains(query),
-                    col(Requirement.title).contains(query),
-                    col(Requirement.description).contains(query),
-                )
+    if "Comments.Reader" in roles:
+        responseClass = Response.Requirement.ListWithComments
+    else:
+        responseClass = Response.Requirement.List
+    return await page.respond(
+        session,
+        select(Requirement)
+        .where(
+            or_(
+                col(Requirement.key).contains(query),
+                col(Requirement.title).contains(query),
+                col(Requirement.description).contains(query),
             )
         )
-        .unique()
-        .all()
+        .options(*Loader.options(responseClass)),
+        Requirement,
+        responseClass,
     )
 
-    if "Comments.Reader" in roles:
-        return Response.buildResponse(Response.Requirement.ListWithComments, requirements)  # type: ignore
-    else:
-        return Response.buildResponse(Response.Requirement.List, requirements)  # type: ignore
-
 
 @router.get(
     "/requirements/{requirementID}",
@@ -80,17 +105,121 @@ async def findRequirements(
     },
 )
 async def getRequirement(
-    roles: Annotated[dict, Depends(getRoles)], session: SessionDep, requirementID: int
+    roles: Annotated[dict, Depends(getRoles)],
+    session: AsyncSessionDep,
+    requirementID: int,
 ) -> Response.Requirement.One | Response.Requirement.OneWithComments:
-    requirement = session.get(Requirement, requirementID)
+    if "Comments.Reader" in roles:
+        responseClass = Response.Requirement.OneWithComments
+    else:
+        responseClass = Response.Requirement.One
+    requirement = await session.get(
+        Requirement, requirementID, options=Loader.options(responseClass)
+    )
 
     if not requirement:
         raise NotFound(detail="Requirement not found")
 
-    if "Comments.Reader" in roles:
-        return Response.buildResponse(Response.Requirement.OneWithComments, requirement)  # type: ignore
-    else:
-        return Response.buildResponse(Response.Requirement.One, requirement)  # type: ignore
+    return Response.buildResponse(responseClass, requirement)  # type: ignore
+
+
+@router.post(
+    "/requirements/bulk",
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        **ErrorResponses.notFound,
+        **ErrorResponses.forbidden,
+        **ErrorResponses.unauthorized,
+        **ErrorResponses.unprocessable,
+        **ErrorResponses.conflict,
+        201: {"description": "The new requirements"},
+    },
+)
+async def addRequirements(
+    requirements: list[Insert.Requirement],
+    session: AsyncSessionDep,
+    userId: Annotated[str, Depends(getUserId)],
+) -> Response.Requirement.List:
+    await checkParentTopicsChildren(
+        {requirement.parentId for requirement in requirements}, session, False
+    )
+    tags = await getByIds(
+        session,
+        Tag,
+        {tag.id for requirement in requirements for tag in requirement.tags},
+    )
+    requirementsDB: list[Requirement] = []
+    for requirement in requirements:
+        requirementDB = Requirement.model_validate(
+            requirement.model_dump(exclude={"tags"})
+        )
+        requirementDB.tags = [tags[tag.id] for tag in requirement.tags]
+        requirementsDB.append(requirementDB)
+    session.add_all(requirementsDB)
+    auditAll(session, 0, requirementsDB, userId)
+    try:
+        await session.commit()
+    except DatabaseError as e:
+        raiseDBErrorReadable(e)
+    session.expunge_all()
+    requirementsFromDB = await getByIds(
+        session,
+        Requirement,
+        {requirement.id for requirement in requirementsDB},  # type: ignore
+        Loader.options(Response.Requirement.List),
+    )
+    return Response.buildResponse(Response.Requirement.List, list(requirementsFromDB.values()), 201)  # type: ignore
+
+
+@router.patch(
+    "/requirements/bulk",
+    status_code=status.HTTP_200_OK,
+    responses={
+        **ErrorResponses.notFound,
+        **ErrorResponses.forbidden,
+        **ErrorResponses.unauthorized,
+        **ErrorResponses.unprocessable,
+        **ErrorResponses.conflict,
+        200: {"description": "The updated requirements"},
+    },
+)
+async def patchRequirements(
+    requirements: list[Update.RequirementWithId],
+    session: AsyncSessionDep,
+    userId: Annotated[str, Depends(getUserId)],
+) -> Response.Requirement.List:
+    ids: set[int] = {requirement.id for requirement in requirements}
+    if len(ids) < len(requirements):
+        raise UnprocessableContent(detail="Every requirement can only be updated once.")
+    requirementsFromDB = await getByIds(
+        session, Requirement, ids, [selectinload(Requirement.tags)]
+    )
+    tags = await getByIds(
+        session,
+        Tag,
+        {tag.id for requirement in requirements for tag in requirement.tags or []},
+    )
+    for requirement in requirements:
+        requirementFromDB = requirementsFromDB[requirement.id]
+        requirementFromDB.sqlmodel_update(
+            requirement.model_dump(exclude_unset=True, exclude={"id", "tags"})
+        )
+        requirementFromDB.tags = [tags[tag.id] for tag in requirement.tags or []]
+    await checkParentTopicsChildren(
+        {requirement.parentId for requirement in requirementsFromDB.values()},
+        session,
+        False,
+    )
+    auditAll(session, 1, list(requirementsFromDB.values()), userId)
+    try:
+        await session.commit()
+    except DatabaseError as e:
+        raiseDBErrorReadable(e)
+    session.expunge_all()
+    requirementsFromDB = await getByIds(
+        session, Requirement, ids, Loader.options(Response.Requirement.List)
+    )
+    return Response.buildResponse(Response.Requirement.List, list(requirementsFromDB.values()))  # type: ignore
 
 
 @router.patch(
@@ -108,29 +237,33 @@ async def getRequirement(
 async def patchRequirement(
     requirement: Update.Requirement,
     requirementID: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.Requirement.One:
-    requirementFromDB = session.get(Requirement, requirementID)
+    requirementFromDB = await session.get(
+        Requirement, requirementID, options=[selectinload(Requirement.tags)]
+    )
     if not requirementFromDB:
         raise NotFound(detail="Requirement not found")
     requirementFromDB.sqlmodel_update(requirement.model_dump(exclude_unset=True))
-    checkParentTopicChildren(requirementFromDB.parentId, session, False)
-    requirementFromDB.tags = []
-    tags = requirement.tags or []
-    for tag in tags:
-        t = session.get(Tag, tag.id)
-        if t:
-            requirementFromDB.tags.append(t)
-        else:
-            raise NotFound(detail=f"Tag with ID {tag.id} not found")
+    await checkParentTopicChildren(requirementFromDB.parentId, session, False)
+    await setAssociations(
+        session,
+        requirementFromDB,
+        "tags",
+        Tag,
+        [tag.id for tag in requirement.tags or []],
+    )
     session.add(requirementFromDB)
+    audit(session, 1, requirementFromDB, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(requirementFromDB)
-    audit(session, 1, requirementFromDB, userId)
+    session.expunge_all()
+    requirementFromDB = await session.get(
+        Requirement, requirementID, options=Loader.options(Response.Requirement.One)
+    )
     return Response.buildResponse(Response.Requirement.One, requirementFromDB)  # type: ignore
 
 
@@ -141,32 +274,30 @@ async def patchRequirement(
         **ErrorResponses.forbidden,
         **ErrorResponses.unauthorized,
         **ErrorResponses.unprocessable,
+        **ErrorResponses.conflict,
         201: {"description": "The new requirement"},
     },
 )
 async def addRequirement(
     requirement: Insert.Requirement,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.Requirement.One:
     tags = requirement.tags
     requirement.tags = []
     requirementDB = Requirement.model_validate(requirement)
-    checkParentTopicChildren(requirement.parentId, session, False)
-    requirementDB.tags = []
-    for tag in tags:
-        t = session.get(Tag, tag.id)
-        if t:
-            requirementDB.tags.append(t)
-        else:
-            raise NotFound(detail=f"Tag with ID {tag.id} not found")
+    await checkParentTopicChildren(requirement.parentId, session, False)
+    await setAssociations(session, requirementDB, "tags", Tag, [tag.id for tag in tags])
     session.add(requirementDB)
+    audit(session, 0, requirementDB, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(requirementDB)
-    audit(session, 0, requirementDB, userId)
+    session.expunge_all()
+    requirementDB = await session.get(
+        Requirement, requirementDB.id, options=Loader.options(Response.Requirement.One)
+    )
     return Response.buildResponse(Response.Requirement.One, requirementDB, 201)  # type: ignore
 
 
@@ -184,33 +315,39 @@ async def addRequirement(
 )
 async def deleteRequirement(
     requirementID: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
     force: bool = False,
 ) -> None:
-    requirement = session.get(Requirement, requirementID)
+    requirement = await session.get(Requirement, requirementID)
     if not requirement:
         raise NotFound(detail="Requirement not found")
-    if len(requirement.extras) > 0 and force is False:
+    extras: int = await countRows(
+        session, ExtraEntry, col(ExtraEntry.requirementId) == requirementID
+    )
+    if extras > 0 and force is False:
         raise ConflictError(
             detail=[
-                f"Requirement has {len(requirement.extras)} extra(s).",
+                f"Requirement has {extras} extra(s).",
                 "Use force and cascade (?force=true) to delete anyway.",
                 "This will also delete the extras.",
             ]
         )
-    if len(requirement.comments) > 0 and force is False:
+    comments: int = await countRows(
+        session, Comment, col(Comment.requirementId) == requirementID
+    )
+    if comments > 0 and force is False:
         raise ConflictError(
             detail=[
-                f"Requirement has {len(requirement.comments)} comment(s).",
+                f"Requirement has {comments} comment(s).",
                 "Use force and cascade (?force=true) to delete anyway.",
                 "This will also delete the extras.",
             ]
         )
-    session.delete(requirement)
+    await SoftDelete.delete(session, requirement, userId)
+    audit(session, 2, requirement, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    audit(session, 2, requirement, userId)
     return None
@@ -0,0 +1,78 @@
+from itertools import zip_longest
+from typing import Annotated
+
+from fastapi import Depends, Query, status
+from sqlmodel import col, select
+
+from api.error import ErrorResponses, Forbidden, UnprocessableContent
+from api.models import AsyncSessionDep
+from api.models.public import SearchResult
+from api.models.response import Response
+from api.models.search import SearchIndex
+from api.routers import AuthRouter, getRoles
+
+router = AuthRouter()
+
+
+@router.get(
+    "/search",
+    status_code=status.HTTP_200_OK,
+    responses={
+        **ErrorResponses.forbidden,
+        **ErrorResponses.unauthorized,
+        **ErrorResponses.unprocessable,
+        200: {"description": "Ranked search results"},
+    },
+)
+async def search(
+    session: AsyncSessionDep,
+    roles: Annotated[dict, Depends(getRoles)],
+    query: str,
+    types: Annotated[list[str] | None, Query()] = None,
+    limit: Annotated[int, Query(ge=1, le=200)] = 50,
+) -> Response.Search:
+    kinds: list[str] = types if types else list(SearchIndex.tables.keys())
+    for kind in kinds:
+        if kind not in SearchIndex.tables:
+            raise UnprocessableContent(detail=f"Unknown search type: {kind}")
+    if "Comments.Reader" not in roles and "comments" in kinds:
+        if types:
+            raise Forbidden(detail="Missing a needed role for searching comments.")
+        kinds.remove("comments")
+
+    # ranks of different tables are not comparable (e.g. bm25 depends on the statistics of each index),
+    # so the hits of the kinds are interleaved by their position within the kind
+    hits: list[list[SearchResult]] = []
+    for kind in kinds:
+        statement = SearchIndex.statement(kind, query, limit)
+        if statement is None:
+            break
+        ranks: dict[int, float] = dict((await session.exec(statement)).all())
+        if len(ranks) == 0:
+            continue
+        model, _, titleColumn = SearchIndex.tables[kind]
+        items = {
+            item.id: item
+            for item in (
+                await session.exec(select(model).where(col(model.id).in_(ranks.keys())))
+            ).all()
+        }
+        hits.append(
+            [
+                SearchResult(
+                    type=kind,
+                    id=id,
+                    rank=rank,
+                    title=getattr(items[id], titleColumn),
+                    key=getattr(items[id], "key", None),
+                    requirementId=getattr(items[id], "requirementId", None),
+                )
+                for id, rank in ranks.items()
+                if id in items
+            ]
+        )
+    results: list[SearchResult] = [
+        result for round in zip_longest(*hits) for result in round if result is not None
+    ]
+
+    return Response.buildResponse(Response.Search, results[:limit])  # type: ignore
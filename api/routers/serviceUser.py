@@ -5,7 +5,7 @@ from sqlalchemy.exc import DatabaseError
 from sqlmodel import select
 
 from api.error import ConflictError, ErrorResponses, NotFound, raiseDBErrorReadable
-from api.models import SessionDep, audit
+from api.models import AsyncSessionDep, audit
 from api.models.db import User
 from api.models.insert import Insert
 from api.models.response import Response
@@ -24,8 +24,10 @@ router = AuthRouter()
         200: {"description": "All catalogues"},
     },
 )
-async def getServiceUsers(session: SessionDep) -> Response.User.List:
-    serviceUsers = session.exec(select(User).where(User.service == True)).unique().all()
+async def getServiceUsers(session: AsyncSessionDep) -> Response.User.List:
+    serviceUsers = (
+        (await session.exec(select(User).where(User.service == True))).unique().all()
+    )
 
     return Response.buildResponse(Response.User.List, serviceUsers)  # type: ignore
 
@@ -38,18 +40,18 @@ async def getServiceUsers(session: SessionDep) -> Response.User.List:
     },
 )
 async def addServiceUser(
-    session: SessionDep,
+    session: AsyncSessionDep,
     service: Insert.ServiceUser,
 ) -> Response.User.One:
     service.service = True
     serviceDB: User = User.model_validate(service)
     session.add(serviceDB)
+    audit(session, 0, serviceDB, service.id)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(serviceDB)
-    audit(session, 0, serviceDB, service.id)
+    await session.refresh(serviceDB)
     return Response.buildResponse(Response.User.One, serviceDB)  # type: ignore
 
 
@@ -61,22 +63,22 @@ async def addServiceUser(
     },
 )
 async def patchServiceUser(
-    session: SessionDep,
+    session: AsyncSessionDep,
     id: str,
     service: Update.ServiceUser,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.User.One:
-    userFromDB: User | None = session.get(User, id)
+    userFromDB: User | None = await session.get(User, id)
     if not userFromDB or not userFromDB.service:
         raise NotFound(detail="Service user not found")
     userFromDB.sqlmodel_update(service.model_dump(exclude_unset=True))
     session.add(userFromDB)
+    audit(session, 1, userFromDB, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(userFromDB)
-    audit(session, 1, userFromDB, userId)
+    await session.refresh(userFromDB)
     return Response.buildResponse(Response.User.One, userFromDB)  # type: ignore
 
 
@@ -94,10 +96,10 @@ async def patchServiceUser(
 )
 async def deleteServiceUser(
     id: str,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> None:
-    user: User | None = session.get(User, id)
+    user: User | None = await session.get(User, id)
     if not user or not user.service:
         raise NotFound(detail="Service user not found")
     raise ConflictError(
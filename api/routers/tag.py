@@ -2,13 +2,23 @@ from typing import Annotated
 
 from fastapi import Depends, status
 from sqlalchemy.exc import DatabaseError
+from sqlalchemy.orm import selectinload
 from sqlmodel import col, select
 
-from api.error import ConflictError, ErrorResponses, NotFound, raiseDBErrorReadable
-from api.models import SessionDep, audit
+from api.error import (
+    ConflictError,
+    ErrorResponses,
+    NotFound,
+    UnprocessableContent,
+    raiseDBErrorReadable,
+)
+from api.helper import Paginator, getByIds, setAssociations
+from api.models import AsyncSessionDep, audit, auditAll
 from api.models.db import Catalogue, Requirement, Tag
 from api.models.insert import Insert
+from api.models.loader import Loader
 from api.models.response import Response
+from api.models.softdelete import SoftDelete
 from api.models.update import Update
 from api.routers import AuthRouter, getUserId
 
@@ -25,14 +35,19 @@ router = AuthRouter()
     },
 )
 async def getTags(
-    session: SessionDep, expandTopics: bool = True
+    session: AsyncSessionDep,
+    page: Annotated[Paginator, Depends()],
+    expandTopics: bool = True,
 ) -> Response.Tag.List | Response.Tag.ListWithRequirements:
-    tags = session.exec(select(Tag)).unique().all()
-
     if expandTopics is False:
-        return Response.buildResponse(Response.Tag.List, tags)  # type: ignore
+        responseClass = Response.Tag.List
     else:
-        return Response.buildResponse(Response.Tag.ListWithRequirements, tags)  # type: ignore
+        responseClass = Response.Tag.ListWithRequirements
+    tags = await page.fetch(
+        session, select(Tag).options(*Loader.options(responseClass)), Tag
+    )
+
+    return Response.buildResponse(responseClass, tags, page=page.page)  # type: ignore
 
 
 @router.get(
@@ -45,14 +60,24 @@ async def getTags(
     },
 )
 async def findTags(
-    session: SessionDep, query: str, expandTopics: bool = True
+    session: AsyncSessionDep,
+    page: Annotated[Paginator, Depends()],
+    query: str,
+    expandTopics: bool = True,
 ) -> Response.Tag.List | Response.Tag.ListWithRequirements:
-    tags = session.exec(select(Tag).where(col(Tag.name).contains(query))).unique().all()
-
     if expandTopics is False:
-        return Response.buildResponse(Response.Tag.List, tags)  # type: ignore
+        responseClass = Response.Tag.List
     else:
-        return Response.buildResponse(Response.Tag.ListWithRequirements, tags)  # type: ignore
+        responseClass = Response.Tag.ListWithRequirements
+    tags = await page.fetch(
+        session,
+        select(Tag)
+        .where(col(Tag.name).contains(query))
+        .options(*Loader.options(responseClass)),
+        Tag,
+    )
+
+    return Response.buildResponse(responseClass, tags, page=page.page)  # type: ignore
 
 
 @router.get(
@@ -67,16 +92,125 @@ async def findTags(
     },
 )
 async def getTag(
-    session: SessionDep, tagID: int, expandTopics: bool = True
+    session: AsyncSessionDep, tagID: int, expandTopics: bool = True
 ) -> Response.Tag.One | Response.Tag.OneWithRequirementsAndCatalogues:
-    tag = session.get(Tag, tagID)
+    if expandTopics is False:
+        responseClass = Response.Tag.One
+    else:
+        responseClass = Response.Tag.OneWithRequirementsAndCatalogues
+    tag = await session.get(Tag, tagID, options=Loader.options(responseClass))
 
     if not tag:
         raise NotFound(detail="Tag not found")
-    if expandTopics is False:
-        return Response.buildResponse(Response.Tag.One, tag)  # type: ignore
-    else:
-        return Response.buildResponse(Response.Tag.OneWithRequirementsAndCatalogues, tag)  # type: ignore
+    return Response.buildResponse(responseClass, tag)  # type: ignore
+
+
+@router.post(
+    "/tags/bulk",
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        **ErrorResponses.notFound,
+        **ErrorResponses.forbidden,
+        **ErrorResponses.unauthorized,
+        **ErrorResponses.unprocessable,
+        **ErrorResponses.conflict,
+        201: {"description": "The new tags"},
+    },
+)
+async def addTags(
+    tags: list[Insert.Tag],
+    session: AsyncSessionDep,
+    userId: Annotated[str, Depends(getUserId)],
+) -> Response.Tag.ListWithRequirements:
+    requirements = await getByIds(
+        session,
+        Requirement,
+        {requirement.id for tag in tags for requirement in tag.requirements},
+    )
+    catalogues = await getByIds(
+        session,
+        Catalogue,
+        {catalogue.id for tag in tags for catalogue in tag.catalogues},
+    )
+    tagsDB: list[Tag] = []
+    for tag in tags:
+        tagDB = Tag.model_validate(
+            tag.model_dump(exclude={"requirements", "catalogues"})
+        )
+        tagDB.requirements = [requirements[r.id] for r in tag.requirements]
+        tagDB.catalogues = [catalogues[c.id] for c in tag.catalogues]
+        tagsDB.append(tagDB)
+    session.add_all(tagsDB)
+    auditAll(session, 0, tagsDB, userId)
+    try:
+        await session.commit()
+    except DatabaseError as e:
+        raiseDBErrorReadable(e)
+    session.expunge_all()
+    tagsFromDB = await getByIds(
+        session,
+        Tag,
+        {tag.id for tag in tagsDB},  # type: ignore
+        Loader.options(Response.Tag.ListWithRequirements),
+    )
+    return Response.buildResponse(Response.Tag.ListWithRequirements, list(tagsFromDB.values()), 201)  # type: ignore
+
+
+@router.patch(
+    "/tags/bulk",
+    status_code=status.HTTP_200_OK,
+    responses={
+        **ErrorResponses.notFound,
+        **ErrorResponses.forbidden,
+        **ErrorResponses.unauthorized,
+        **ErrorResponses.unprocessable,
+        **ErrorResponses.conflict,
+        200: {"description": "The updated tags"},
+    },
+)
+async def patchTags(
+    tags: list[Update.TagWithId],
+    session: AsyncSessionDep,
+    userId: Annotated[str, Depends(getUserId)],
+) -> Response.Tag.ListWithRequirements:
+    ids: set[int] = {tag.id for tag in tags}
+    if len(ids) < len(tags):
+        raise UnprocessableContent(detail="Every tag can only be updated once.")
+    tagsFromDB = await getByIds(
+        session,
+        Tag,
+        ids,
+        [selectinload(Tag.requirements), selectinload(Tag.catalogues)],
+    )
+    requirements = await getByIds(
+        session,
+        Requirement,
+        {requirement.id for tag in tags for requirement in tag.requirements},
+    )
+    catalogues = await getByIds(
+        session,
+        Catalogue,
+        {catalogue.id for tag in tags for catalogue in tag.catalogues},
+    )
+    for tag in tags:
+        tagFromDB = tagsFromDB[tag.id]
+        tagFromDB.sqlmodel_update(
+            tag.model_dump(
+                exclude_unset=True, exclude={"id", "requirements", "catalogues"}
+            )
+        )
+        tagFromDB.requirements = [requirements[r.id] for r in tag.requirements]
+        tagFromDB.catalogues = [catalogues[c.id] for c in tag.catalogues]
+    auditAll(session, 1, list(tagsFromDB.values()), userId)
+    try:
+        await session.commit()
+    except DatabaseError as e:
+        raiseDBErrorReadable(e)
+    session.expunge_all()
+    tagsFromDB = await getByIds(
+        session, Tag, ids, Loader.options(Response.Tag.ListWithRequirements)
+    )
+    return Response.buildResponse(Response.Tag.ListWithRequirements, list(tagsFromDB.values()))  # type: ignore
 
 
 @router.patch(
@@ -87,40 +221,50 @@ async def getTag(
         **ErrorResponses.forbidden,
         **ErrorResponses.unauthorized,
         **ErrorResponses.unprocessable,
+        **ErrorResponses.conflict,
         200: {"description": "The updated tag"},
     },
 )
 async def patchTag(
     tag: Update.Tag,
     tagID: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.Tag.OneWithRequirementsAndCatalogues:
-    tagFromDB = session.get(Tag, tagID)
+    tagFromDB = await session.get(
+        Tag,
+        tagID,
+        options=[selectinload(Tag.requirements), selectinload(Tag.catalogues)],
+    )
     if not tagFromDB:
         raise NotFound(detail="Tag not found")
     tagFromDB.sqlmodel_update(tag.model_dump(exclude_unset=True))
-    tagFromDB.requirements = []
-    for requirement in tag.requirements:
-        t = session.get(Requirement, requirement.id)
-        if t:
-            tagFromDB.requirements.append(t)
-        else:
-            raise NotFound(detail=f"Requirement with ID {requirement.id} not found")
-    tagFromDB.catalogues = []
-    for catalogue in tag.catalogues:
-        t = session.get(Catalogue, catalogue.id)
-        if t:
-            tagFromDB.catalogues.append(t)
-        else:
-            raise NotFound(detail=f"Catalogue with ID {catalogue.id} not found")
+    await setAssociations(
+        session,
+        tagFromDB,
+        "requirements",
+        Requirement,
+        [requirement.id for requirement in tag.requirements],
+    )
+    await setAssociations(
+        session,
+        tagFromDB,
+        "catalogues",
+        Catalogue,
+        [catalogue.id for catalogue in tag.catalogues],
+    )
     session.add(tagFromDB)
+    audit(session, 1, tagFromDB, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(tagFromDB)
-    audit(session, 1, tagFromDB, userId)
+    session.expunge_all()
+    tagFromDB = await session.get(
+        Tag,
+        tagID,
+        options=Loader.options(Response.Tag.OneWithRequirementsAndCatalogues),
+    )
     return Response.buildResponse(Response.Tag.OneWithRequirementsAndCatalogues, tagFromDB)  # type: ignore
 
 
@@ -131,39 +275,49 @@ async def patchTag(
         **ErrorResponses.forbidden,
         **ErrorResponses.unauthorized,
         **ErrorResponses.unprocessable,
+        **ErrorResponses.conflict,
         201: {"description": "The new tag"},
     },
 )
 async def addTag(
     tag: Insert.Tag,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.Tag.OneWithRequirementsAndCatalogues:
+    catalogues = tag.catalogues
     tag.catalogues = []
+    requirements = tag.requirements
     tag.requirements = []
     tagDB = Tag.model_validate(tag)
     try:
         session.add(tagDB)
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    for requirement in tag.requirements:
-        t = session.get(Requirement, requirement.id)
-        if t:
-            tagDB.requirements.append(t)
-        else:
-            raise NotFound(detail=f"Requirement with ID {requirement.id} not found")
-    for catalogue in tag.catalogues:
-        t = session.get(Catalogue, catalogue.id)
-        if t:
-            tagDB.catalogues.append(t)
-        else:
-            raise NotFound(detail=f"Catalogue with ID {catalogue.id} not found")
+    await setAssociations(
+        session,
+        tagDB,
+        "requirements",
+        Requirement,
+        [requirement.id for requirement in requirements],
+    )
+    await setAssociations(
+        session,
+        tagDB,
+        "catalogues",
+        Catalogue,
+        [catalogue.id for catalogue in catalogues],
+    )
+    audit(session, 0, tagDB, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(tagDB)
-    audit(session, 0, tagDB, userId)
+    session.expunge_all()
+    tagDB = await session.get(
+        Tag,
+        tagDB.id,
+        options=Loader.options(Response.Tag.OneWithRequirementsAndCatalogues),
+    )
     return Response.buildResponse(Response.Tag.OneWithRequirementsAndCatalogues, tagDB, 201)  # type: ignore
 
 
@@ -181,11 +335,11 @@ async def addTag(
 )
 async def deleteTag(
     tagID: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
     force: bool = False,
 ) -> None:
-    tag = session.get(Tag, tagID)
+    tag = await session.get(Tag, tagID, options=[selectinload(Tag.requirements)])
     if not tag:
         raise NotFound(detail="Tag not found")
     if len(tag.requirements) > 0 and force is False:
@@ -195,10 +349,10 @@ async def deleteTag(
                 "Use force (?force=true) to delete anyway.",
             ]
         )
-    session.delete(tag)
+    await SoftDelete.delete(session, tag, userId)
+    audit(session, 2, tag, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    audit(session, 2, tag, userId)
     return None
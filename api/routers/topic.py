@@ -4,12 +4,27 @@ from fastapi import Depends, status
 from sqlalchemy.exc import DatabaseError
 from sqlmodel import col, or_, select
 
-from api.error import ConflictError, ErrorResponses, NotFound, raiseDBErrorReadable
-from api.helper import checkParentTopicChildren
-from api.models import SessionDep, audit
-from api.models.db import Topic
+from api.error import (
+    ConflictError,
+    ErrorResponses,
+    NotFound,
+    UnprocessableContent,
+    raiseDBErrorReadable,
+)
+from api.helper import (
+    Paginator,
+    checkParentTopicChildren,
+    checkParentTopicsChildren,
+    countRows,
+    getByIds,
+)
+from api.models import AsyncSessionDep, audit, auditAll
+from api.models.db import Requirement, Topic
 from api.models.insert import Insert
+from api.models.loader import Loader
 from api.models.response import Response
+from api.models.softdelete import SoftDelete
+from api.models.tree import TopicTree
 from api.models.update import Update
 from api.routers import AuthRouter, getUserId
 
@@ -26,14 +41,20 @@ router = AuthRouter()
     },
 )
 async def getTopics(
-    session: SessionDep, expandTopics: bool = False
+    session: AsyncSessionDep,
+    page: Annotated[Paginator, Depends()],
+    expandTopics: bool = False,
 ) -> Response.Topic.List | Response.Topic.ListWithRequirements:
-    topics = session.exec(select(Topic)).unique().all()
-
     if expandTopics is False:
-        return Response.buildResponse(Response.Topic.List, topics)  # type: ignore
+        responseClass = Response.Topic.List
     else:
-        return Response.buildResponse(Response.Topic.ListWithRequirements, topics)  # type: ignore
+        responseClass = Response.Topic.ListWithRequirements
+    return await page.respond(
+        session,
+        select(Topic).options(*Loader.options(responseClass)),
+        Topic,
+        responseClass,
+    )
 
 
 @router.get(
@@ -46,22 +67,23 @@ async def getTopics(
     },
 )
 async def findTopics(
-    session: SessionDep, query: str, expandTopics: bool = False
+    session: AsyncSessionDep,
+    page: Annotated[Paginator, Depends()],
+    query: str,
+    expandTopics: bool = False,
 ) -> Response.Topic.List | Response.Topic.ListWithRequirements:
-    topics = (
-        session.exec(
-            select(Topic).where(
-                or_(col(Topic.key).contains(query), col(Topic.title).contains(query))
-            )
-        )
-        .unique()
-        .all()
-    )
-
     if expandTopics is False:
-        return Response.buildResponse(Response.Topic.List, topics)  # type: ignore
+        responseClass = Response.Topic.List
     else:
-        return Response.buildResponse(Response.Topic.ListWithRequirements, topics)  # type: ignore
+        responseClass = Response.Topic.ListWithRequirements
+    return await page.respond(
+        session,
+        select(Topic)
+        .where(or_(col(Topic.key).contains(query), col(Topic.title).contains(query)))
+        .options(*Loader.options(responseClass)),
+        Topic,
+        responseClass,
+    )
 
 
 @router.get(
@@ -76,16 +98,110 @@ async def findTopics(
     },
 )
 async def getTopic(
-    session: SessionDep, topicID: int, expandTopics: bool = False
+    session: AsyncSessionDep, topicID: int, expandTopics: bool = False
 ) -> Response.Topic.One | Response.Topic.OneWithRequirements:
-    topic = session.get(Topic, topicID)
+    if expandTopics is False:
+        responseClass = Response.Topic.One
+    else:
+        responseClass = Response.Topic.OneWithRequirements
+    topic = await session.get(Topic, topicID, options=Loader.options(responseClass))
 
     if not topic:
         raise NotFound(detail="Topic not found")
-    if expandTopics is False:
-        return Response.buildResponse(Response.Topic.One, topic)  # type: ignore
-    else:
-        return Response.buildResponse(Response.Topic.OneWithRequirements, topic)  # type: ignore
+    return Response.buildResponse(responseClass, topic)  # type: ignore
+
+
+@router.post(
+    "/topics/bulk",
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        **ErrorResponses.notFound,
+        **ErrorResponses.forbidden,
+        **ErrorResponses.unauthorized,
+        **ErrorResponses.unprocessable,
+        **ErrorResponses.conflict,
+        201: {"description": "The new topics"},
+    },
+)
+async def addTopics(
+    topics: list[Insert.Topic],
+    session: AsyncSessionDep,
+    userId: Annotated[str, Depends(getUserId)],
+) -> Response.Topic.List:
+    await checkParentTopicsChildren(
+        {topic.parentId for topic in topics if topic.parentId is not None},
+        session,
+        True,
+    )
+    topicsDB = [Topic.model_validate(topic) for topic in topics]
+    session.add_all(topicsDB)
+    auditAll(session, 0, topicsDB, userId)
+    try:
+        await session.commit()
+    except DatabaseError as e:
+        raiseDBErrorReadable(e)
+    session.expunge_all()
+    topicsDB = await getByIds(
+        session,
+        Topic,
+        {topic.id for topic in topicsDB},  # type: ignore
+        Loader.options(Response.Topic.List),
+    )
+    return Response.buildResponse(Response.Topic.List, list(topicsDB.values()), 201)  # type: ignore
+
+
+@router.patch(
+    "/topics/bulk",
+    status_code=status.HTTP_200_OK,
+    responses={
+        **ErrorResponses.notFound,
+        **ErrorResponses.forbidden,
+        **ErrorResponses.unauthorized,
+        **ErrorResponses.unprocessable,
+        **ErrorResponses.conflict,
+        200: {"description": "The updated topics"},
+    },
+)
+async def patchTopics(
+    topics: list[Update.TopicWithId],
+    session: AsyncSessionDep,
+    userId: Annotated[str, Depends(getUserId)],
+) -> Response.Topic.List:
+    ids: set[int] = {topic.id for topic in topics}
+    if len(ids) < len(topics):
+        raise UnprocessableContent(detail="Every topic can only be updated once.")
+    topicsFromDB = await getByIds(session, Topic, ids)
+    moves: dict[int, int | None] = {
+        topic.id: topic.parentId for topic in topics if topic.parentId is not None
+    }
+    await checkParentTopicsChildren(
+        {parentId for parentId in moves.values() if parentId is not None},
+        session,
+        True,
+    )
+    cycles = await TopicTree.cycles(session, moves)
+    if len(cycles) > 0:
+        raise ConflictError(
+            detail=[
+                "Can't move topic",
+                "The new parent is the topic itself or one of its children.",
+                f"Topic IDs: {', '.join(str(id) for id in sorted(cycles))}",
+            ]
+        )
+    for topic in topics:
+        topicsFromDB[topic.id].sqlmodel_update(
+            topic.model_dump(exclude_unset=True, exclude={"id"})
+        )
+    auditAll(session, 1, list(topicsFromDB.values()), userId)
+    try:
+        await session.commit()
+    except DatabaseError as e:
+        raiseDBErrorReadable(e)
+    session.expunge_all()
+    topicsFromDB = await getByIds(
+        session, Topic, ids, Loader.options(Response.Topic.List)
+    )
+    return Response.buildResponse(Response.Topic.List, list(topicsFromDB.values()))  # type: ignore
 
 
 @router.patch(
@@ -103,20 +219,33 @@ async def getTopic(
 async def patchTopic(
     topic: Update.Topic,
     topicID: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.Topic.One:
-    topicFromDB = session.get(Topic, topicID)
+    topicFromDB = await session.get(Topic, topicID)
     if not topicFromDB:
         raise NotFound(detail="Topic not found")
+    await checkParentTopicChildren(topic.parentId, session, True)
+    if topic.parentId is not None and await TopicTree.cycles(
+        session, {topicID: topic.parentId}
+    ):
+        raise ConflictError(
+            detail=[
+                "Can't move topic",
+                "The new parent is the topic itself or one of its children.",
+            ]
+        )
     topicFromDB.sqlmodel_update(topic.model_dump(exclude_unset=True))
     session.add(topicFromDB)
+    audit(session, 1, topicFromDB, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(topicFromDB)
-    audit(session, 1, topicFromDB, userId)
+    session.expunge_all()
+    topicFromDB = await session.get(
+        Topic, topicID, options=Loader.options(Response.Topic.One)
+    )
     return Response.buildResponse(Response.Topic.One, topicFromDB)  # type: ignore
 
 
@@ -127,23 +256,27 @@ async def patchTopic(
         **ErrorResponses.forbidden,
         **ErrorResponses.unauthorized,
         **ErrorResponses.unprocessable,
+        **ErrorResponses.conflict,
         201: {"description": "The new topic"},
     },
 )
 async def addTopic(
     topic: Insert.Topic,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
 ) -> Response.Topic.One:
     topicDB = Topic.model_validate(topic)
-    checkParentTopicChildren(topic.parentId, session, True)
+    await checkParentTopicChildren(topic.parentId, session, True)
     session.add(topicDB)
+    audit(session, 0, topicDB, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    session.refresh(topicDB)
-    audit(session, 0, topicDB, userId)
+    session.expunge_all()
+    topicDB = await session.get(
+        Topic, topicDB.id, options=Loader.options(Response.Topic.One)
+    )
     return Response.buildResponse(Response.Topic.One, topicDB, 201)  # type: ignore
 
 
@@ -161,33 +294,37 @@ async def addTopic(
 )
 async def deleteTopic(
     topicID: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     userId: Annotated[str, Depends(getUserId)],
     force: bool = False,
     cascade: bool = False,
 ) -> None:
-    topic = session.get(Topic, topicID)
+    topic = await session.get(Topic, topicID)
     if not topic:
         raise NotFound(detail="Topic not found")
-    if len(topic.children) > 0 and force is False:
+    children: int = await countRows(session, Topic, col(Topic.parentId) == topicID)
+    if children > 0 and force is False:
         raise ConflictError(
             detail=[
-                f"Topic has {len(topic.children)} children.",
+                f"Topic has {children} children.",
                 "Use force (?force=true) to delete anyway.",
             ]
         )
-    if len(topic.requirements) > 0 and force is False and cascade is False:
+    requirements: int = await countRows(
+        session, Requirement, col(Requirement.parentId) == topicID
+    )
+    if requirements > 0 and force is False and cascade is False:
         raise ConflictError(
             detail=[
-                f"Topic has {len(topic.requirements)} requirement(s).",
+                f"Topic has {requirements} requirement(s).",
                 "Use force and cascade (?force=true&cascade=true) to delete anyway.",
                 "This will also delete the requirement.",
             ]
         )
-    session.delete(topic)
+    await SoftDelete.delete(session, topic, userId)
+    audit(session, 2, topic, userId)
     try:
-        session.commit()
+        await session.commit()
     except DatabaseError as e:
         raiseDBErrorReadable(e)
-    audit(session, 2, topic, userId)
     return None
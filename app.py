@@ -1,5 +1,6 @@
 __version__ = "0.1.0"
 
+import asyncio
 import logging
 import logging.config
 import multiprocessing
@@ -16,15 +17,27 @@ from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette.config import Config
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 import api
 import auth
 from api.config import AppConfig
-from api.helper import checkAndUpdateConfigDB
-from api.models import engine
+from api.helper import (
+    checkAndUpdateConfigDB,
+    createMissingColumns,
+    createMissingIndexes,
+)
+from api.models import asyncEngine, engine
+from api.models.audit import AuditArchive, AuditQueue
+from api.models.configuration import DynamicConfiguration
 from api.models.db import *
+from api.models.search import SearchIndex
+from api.models.softdelete import SoftDelete
+from api.models.tree import TopicTree
+from helper.cache import DataVersion, InvalidationBus
+from helper.feed import ChangeFeed
 
 load_dotenv()
 logging.config.dictConfig(AppConfig.LOGGING_CONFIG)
@@ -41,6 +54,19 @@ exception_handlers: dict[
 }
 
 
+def setupDatabase() -> None:
+    """
+    Creates the missing tables, columns, indexes and search indexes, fills the topic closure table and updates the dynamic configuration
+    """
+    SQLModel.metadata.create_all(engine)
+    createMissingColumns()
+    createMissingIndexes()
+    SearchIndex.create()
+    with engine.begin() as connection:
+        TopicTree.create(connection)
+    checkAndUpdateConfigDB()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     AppConfig.checkNeededEnvVariables()
@@ -55,11 +81,29 @@ async def lifespan(app: FastAPI):
         },
     )
     AppConfig.setEmailActiveStatus()
-    SQLModel.metadata.create_all(engine)
-    AppConfig.getOpenIdConfig()
-    AppConfig.getJWKs()
-    checkAndUpdateConfigDB()
+    await asyncio.gather(
+        asyncio.to_thread(setupDatabase), AppConfig.getOpenIdConfigAndJWKs()
+    )
+    await DataVersion.increment()
+    async with AsyncSession(asyncEngine) as session:
+        await DynamicConfiguration.load(session)
+    invalidationListener = asyncio.create_task(InvalidationBus.listen())
+    changeFeedListener = asyncio.create_task(ChangeFeed.listen())
+    keyRefresher = asyncio.create_task(AppConfig.refreshOpenIdConfigAndJWKs())
+    if AuditQueue.active:
+        auditWriter = asyncio.create_task(AuditQueue.work(asyncEngine))
+    auditRetention = asyncio.create_task(AuditArchive.schedule(engine))
+    softDeletePurge = asyncio.create_task(SoftDelete.schedule(engine))
     yield
+    auditRetention.cancel()
+    softDeletePurge.cancel()
+    keyRefresher.cancel()
+    invalidationListener.cancel()
+    changeFeedListener.cancel()
+    if AuditQueue.active:
+        auditWriter.cancel()
+        await asyncio.gather(auditWriter, return_exceptions=True)
+    await asyncEngine.dispose()
 
 
 class SPAStaticFiles(StaticFiles):
@@ -14,14 +14,14 @@ from fastapi.datastructures import URL
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse, RedirectResponse
 from sqlalchemy.exc import DatabaseError
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.middleware.sessions import SessionMiddleware
 
 from api.config import AppConfig
 from api.error import ErrorResponses, Unauthorized, raiseDBErrorReadable
 from api.models import audit as dbAudit
-from api.models import engine
+from api.models import asyncEngine, publishCommitted
 from api.models.db import User
 from api.models.response import Response
 from auth.models import Token, UserInfo
@@ -128,30 +128,24 @@ async def parseCallback(request: Request, response: FastResponse) -> UserInfo:
                     }
                 )
 
-                with Session(engine) as session:
-                    dbUser: User | None = session.get(User, user.sub)
-                    if not dbUser:
-                        try:
-                            session.commit()
-                        except DatabaseError as e:
-                            raiseDBErrorReadable(e)
-                        dbUser = User(id=user.sub, email=user.email)
-                        session.add(dbUser)
-                        try:
-                            session.commit()
-                        except DatabaseError as e:
-                            raiseDBErrorReadable(e)
-                        session.refresh(dbUser)
-                        dbAudit(session, 0, dbUser, user.sub)
-                    elif dbUser.email != user.email:
-                        dbUser.email = user.email
-                        session.add(dbUser)
-                        try:
-                            session.commit()
-                        except DatabaseError as e:
-                            raiseDBErrorReadable(e)
-                        session.refresh(dbUser)
-                        dbAudit(session, 1, dbUser, user.sub)
+                async with AsyncSession(asyncEngine, expire_on_commit=False) as session:
+                    try:
+                        dbUser: User | None = await session.get(User, user.sub)
+                        if not dbUser:
+                            dbUser = User(id=user.sub, email=user.email)
+                            session.add(dbUser)
+                            dbAudit(session, 0, dbUser, user.sub)
+                        elif dbUser.email != user.email:
+                            dbUser.email = user.email
+                            session.add(dbUser)
+                            dbAudit(session, 1, dbUser, user.sub)
+                        if session.new or session.dirty:
+                            try:
+                                await session.commit()
+                            except DatabaseError as e:
+                                raiseDBErrorReadable(e)
+                    finally:
+                        await publishCommitted(session)
 
                 return user
             else:
@@ -1,6 +1,11 @@
+import asyncio
 import base64
+import json
 import logging
 import secrets
+import time
+from collections import OrderedDict
+from collections.abc import Callable
 
 import redis.asyncio as redis
 from cryptography.exceptions import InvalidTag
@@ -117,3 +122,261 @@ class EncryptedRedisCache:
         """
         if await self.store.exists(key):
             await self.store.delete(key)
+
+
+class InvalidationBus:
+    """
+    InvalidationBus distributes the changed entities of committed transactions to the local caches of all workers.
+    Caches subscribe a handler to a type of entities (e.g. users), which is called with the ids of the changed entities.
+    The handlers of the publishing worker are called directly, the other workers receive the ids via Redis.
+    If the connection to Redis is lost, invalidations may be missed, so every handler is called with None to drop all entries.
+    """
+
+    store = EncryptedRedisCache.store
+    channel: str = "ReqDB:InvalidationBus"
+    origin: str = secrets.token_hex(8)
+    handlers: dict[str, list[Callable[[set | None], None]]] = {}
+
+    @classmethod
+    def subscribe(cls, type: str, handler: Callable[[set | None], None]) -> None:
+        """
+        Subscribes a handler to the changes of a type of entities
+
+        :param str type: The type of the entities (e.g. users or configuration)
+        :param Callable[[set | None], None] handler: Evicts the changed ids or all entries if called with None
+        """
+        cls.handlers.setdefault(type, []).append(handler)
+
+    @classmethod
+    async def publish(cls, changes: list[dict]) -> None:
+        """
+        Passes the changed entities to the handlers of this worker and publishes them to the other workers.
+        Only types with subscribed handlers are published
+
+        :param list[dict] changes: The changed entities (type, id and verb)
+        """
+        ids: dict[str, set] = {}
+        for change in changes:
+            if change["type"] in cls.handlers:
+                ids.setdefault(change["type"], set()).add(change["id"])
+        if len(ids) == 0:
+            return
+        cls.dispatch(ids)
+        try:
+            await cls.store.publish(
+                cls.channel,
+                json.dumps(
+                    {
+                        "origin": cls.origin,
+                        "ids": {type: list(changed) for type, changed in ids.items()},
+                    }
+                ),
+            )
+        except redis.RedisError as e:
+            logger.error(f"Can't publish cache invalidation: {e}")
+
+    @classmethod
+    async def listen(cls) -> None:
+        """
+        Listens for invalidations from other workers. Runs until cancelled and reconnects on errors
+        """
+        while True:
+            try:
+                async with cls.store.pubsub() as pubsub:
+                    await pubsub.subscribe(cls.channel)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        data: dict = json.loads(message["data"])
+                        if data["origin"] != cls.origin:
+                            cls.dispatch(
+                                {
+                                    type: set(changed)
+                                    for type, changed in data["ids"].items()
+                                }
+                            )
+            except redis.RedisError as e:
+                logger.error(f"Cache invalidation listener failed: {e}")
+                cls.dispatch({type: None for type in cls.handlers})
+                await asyncio.sleep(5)
+
+    @classmethod
+    def dispatch(cls, ids: dict[str, set | None]) -> None:
+        """
+        Passes the changed ids to the subscribed handlers
+
+        :param dict[str, set | None] ids: The changed ids per type, None drops all entries of the type
+        """
+        for type, changed in ids.items():
+            for handler in cls.handlers.get(type, []):
+                handler(changed)
+
+
+class KnownUserCache:
+    """
+    KnownUserCache is a per worker TTL cache for the ids of registered users.
+    It is used by the JWT validation to skip the user lookup in the database.
+    Changed users are dropped by the InvalidationBus on every worker.
+    """
+
+    ttl: int = AppConfig.USER_CACHE_TTL
+    maxSize: int = 10000
+    users: OrderedDict[str, float] = OrderedDict()
+
+    @classmethod
+    def isKnown(cls, userId: str) -> bool:
+        """
+        Checks if the user is cached as registered
+
+        :param str userId: The user id (sub)
+        :return bool: True if the user is cached and the entry is not expired
+        """
+        expires: float | None = cls.users.get(userId)
+        if expires is None:
+            return False
+        if expires <= time.monotonic():
+            cls.users.pop(userId, None)
+            return False
+        return True
+
+    @classmethod
+    def add(cls, userId: str) -> None:
+        """
+        Caches a registered user for the TTL
+
+        :param str userId: The user id (sub)
+        """
+        if cls.ttl <= 0:
+            return
+        cls.users[userId] = time.monotonic() + cls.ttl
+        cls.users.move_to_end(userId)
+        while len(cls.users) > cls.maxSize:
+            cls.users.popitem(last=False)
+
+    @classmethod
+    def evict(cls, userIds: set | None) -> None:
+        """
+        Drops changed users from the cache
+
+        :param set | None userIds: The ids of the changed users or None to drop all users
+        """
+        if userIds is None:
+            cls.users.clear()
+            return
+        for userId in userIds:
+            cls.users.pop(userId, None)
+
+
+if KnownUserCache.ttl > 0:
+    InvalidationBus.subscribe("users", KnownUserCache.evict)
+
+
+class CatalogueCache:
+    """
+    CatalogueCache is a shared Redis cache for the serialized catalogue trees.
+    Every catalogue has a generation counter which is part of the key of its cached trees.
+    Writes increment the counter instead of deleting entries, so a tree built from data read
+    before the write is stored under the old generation and never served.
+    """
+
+    store = EncryptedRedisCache.store
+    prefix: str = "ReqDB:CatalogueCache"
+    ttl: int = AppConfig.CATALOGUE_CACHE_TTL
+
+    @classmethod
+    async def getTree(
+        cls, catalogueId: int, variant: str
+    ) -> tuple[int, str] | tuple[int, None] | tuple[None, None]:
+        """
+        Gets the cached tree of a catalogue
+
+        :param int catalogueId: The catalogue id
+        :param str variant: The variant of the tree (e.g. the name of the response class)
+        :return tuple[int, str] | tuple[int, None] | tuple[None, None]: The current generation and the cached tree (None if not cached). (None, None) if the cache is not available
+        """
+        if cls.ttl <= 0:
+            return None, None
+        try:
+            generation: int = int(
+                await cls.store.get(f"{cls.prefix}:{catalogueId}:generation") or 0
+            )
+            return generation, await cls.store.get(
+                f"{cls.prefix}:{catalogueId}:{generation}:{variant}"
+            )
+        except redis.RedisError as e:
+            logger.error(f"Can't read catalogue cache: {e}")
+            return None, None
+
+    @classmethod
+    async def setTree(
+        cls, catalogueId: int, variant: str, generation: int, tree: str
+    ) -> None:
+        """
+        Caches the tree of a catalogue for the generation read before building it
+
+        :param int catalogueId: The catalogue id
+        :param str variant: The variant of the tree (e.g. the name of the response class)
+        :param int generation: The generation returned by getTree
+        :param str tree: The serialized tree
+        """
+        try:
+            await cls.store.set(
+                f"{cls.prefix}:{catalogueId}:{generation}:{variant}", tree, cls.ttl
+            )
+        except redis.RedisError as e:
+            logger.error(f"Can't write catalogue cache: {e}")
+
+    @classmethod
+    async def invalidate(cls, catalogueIds: set[int]) -> None:
+        """
+        Invalidates the cached trees of the catalogues by incrementing their generation
+
+        :param set[int] catalogueIds: The ids of the changed catalogues
+        """
+        if cls.ttl <= 0 or len(catalogueIds) == 0:
+            return
+        try:
+            async with cls.store.pipeline(transaction=False) as pipeline:
+                for catalogueId in catalogueIds:
+                    pipeline.incr(f"{cls.prefix}:{catalogueId}:generation")
+                await pipeline.execute()
+        except redis.RedisError as e:
+            logger.error(f"Can't invalidate catalogue cache: {e}")
+
+
+class DataVersion:
+    """
+    DataVersion is a shared Redis counter which is incremented after every committed change.
+    It is the base of the ETags of the API, so a client can revalidate its copy with a single Redis read.
+    """
+
+    store = EncryptedRedisCache.store
+    key: str = "ReqDB:DataVersion"
+    active: bool = AppConfig.ETAG_ACTIVE
+
+    @classmethod
+    async def get(cls) -> int | None:
+        """
+        Gets the current data version
+
+        :return int | None: The data version or None if ETags are not active or Redis is not available
+        """
+        if cls.active is False:
+            return None
+        try:
+            return int(await cls.store.get(cls.key) or 0)
+        except redis.RedisError as e:
+            logger.error(f"Can't read data version: {e}")
+            return None
+
+    @classmethod
+    async def increment(cls) -> None:
+        """
+        Increments the data version after a change
+        """
+        if cls.active is False:
+            return
+        try:
+            await cls.store.incr(cls.key)
+        except redis.RedisError as e:
+            logger.error(f"Can't increment data version: {e}")
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import logging
+from collections.abc import AsyncGenerator
+
+import redis.asyncio as redis
+
+from api.config import AppConfig
+from helper.cache import EncryptedRedisCache
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+class ChangeFeed:
+    """
+    ChangeFeed distributes the changed objects of committed transactions to the live views of all workers.
+    Every transaction is published as one message via Redis, every worker listens to the channel
+    and fans the messages out to the queues of its connected clients.
+    A client which does not keep up is disconnected and has to resync (e.g. with /changes).
+    """
+
+    store = EncryptedRedisCache.store
+    channel: str = "ReqDB:ChangeFeed"
+    active: bool = AppConfig.CHANGE_FEED_ACTIVE
+    maxQueueSize: int = 100
+    # seconds without message after which a keep alive is sent
+    keepAlive: int = 15
+    subscribers: set[asyncio.Queue] = set()
+
+    @classmethod
+    async def publish(cls, changes: list[dict], catalogues: set[int]) -> None:
+        """
+        Publishes the changes of a transaction to all workers
+
+        :param list[dict] changes: The changed objects (type, id and verb)
+        :param set[int] catalogues: The ids of the catalogues affected by the changes
+        """
+        if cls.active is False or len(changes) == 0:
+            return
+        event: dict = {"changes": changes, "catalogues": sorted(catalogues)}
+        try:
+            await cls.store.publish(cls.channel, json.dumps(event))
+        except redis.RedisError as e:
+            logger.error(
+                f"Can't publish changes, only the clients of this worker are notified: {e}"
+            )
+            cls.dispatch(event)
+
+    @classmethod
+    async def listen(cls) -> None:
+        """
+        Listens for published changes and passes them to the clients of this worker. Runs until cancelled and reconnects on errors
+        """
+        if cls.active is False:
+            return
+        while True:
+            try:
+                async with cls.store.pubsub() as pubsub:
+                    await pubsub.subscribe(cls.channel)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            cls.dispatch(json.loads(message["data"]))
+            except redis.RedisError as e:
+                logger.error(f"Change feed listener failed: {e}")
+                await asyncio.sleep(5)
+
+    @classmethod
+    def dispatch(cls, event: dict) -> None:
+        """
+        Passes a message to the queues of the clients of this worker. Clients with a full queue are dropped
+
+        :param dict event: The published changes
+        """
+        for queue in list(cls.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                cls.subscribers.discard(queue)
+
+    @classmethod
+    async def subscribe(cls) -> AsyncGenerator[dict | None, None]:
+        """
+        Yields the published changes for a client until the client is dropped.
+        Yields None if there was no change for keepAlive seconds
+
+        :yield dict | None: The published changes or None
+        """
+        queue: asyncio.Queue = asyncio.Queue(cls.maxQueueSize)
+        cls.subscribers.add(queue)
+        try:
+            while queue in cls.subscribers or not queue.empty():
+                try:
+                    yield await asyncio.wait_for(queue.get(), cls.keepAlive)
+                except TimeoutError:
+                    yield None
+        finally:
+            cls.subscribers.discard(queue)
@@ -23,6 +23,9 @@ export function ConfigurationEditListRow({ item, updateTempItem, edit }: Props)
     case "string":
       value = <td><Form.Control disabled={!edit} type="text" id="value" value={item.value} onChange={e => { updateTempItem({ value: e.target.value }) }} /></td>
       break;
+    case "integer":
+      value = <td><Form.Control disabled={!edit} type="number" step={1} id="value" value={item.value} onChange={e => { updateTempItem({ value: e.target.value }) }} /></td>
+      break;
     case "boolean":
       value = <td><Form.Check disabled={!edit} type="switch" id="value" defaultChecked={item.value === "true"} onChange={e => { updateTempItem({ value: e.target.checked ? "true" : "false" }) }} /></td>
       break;
@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+# The settings are read on import, so they have to be set before the app modules are imported
+os.environ.update(
+    {
+        "DATABASE_URI": f"sqlite:///{tempfile.mkdtemp()}/ReqDB.sqlite",
+        "SESSION_SECRET_KEY": "test",
+        "OAUTH_CLIENT_ID": "test",
+        "OAUTH_PROVIDER": "test",
+        "OAUTH_CONFIG": "http://localhost/.well-known/openid-configuration",
+        "REDIS_HOST": "localhost",
+        "USER_CACHE_TTL": "0",
+        "CATALOGUE_CACHE_TTL": "0",
+        "ETAG_ACTIVE": "0",
+        "CHANGE_FEED_ACTIVE": "0",
+    }
+)
+
+import pytest
+from sqlmodel import SQLModel
+
+from api.helper import checkAndUpdateConfigDB
+from api.models import engine
+from api.models.configuration import DynamicConfiguration
+
+
+@pytest.fixture(autouse=True)
+def database():
+    SQLModel.metadata.create_all(engine)
+    checkAndUpdateConfigDB()
+    DynamicConfiguration.evict(None)
+    yield
+    SQLModel.metadata.drop_all(engine)
@@ -0,0 +1,72 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+import auth
+from api.models import engine
+from api.models.db import Audit, User
+
+
+@pytest.fixture
+def callback(monkeypatch):
+    """
+    Returns a function which calls /callback as the IdP redirect with the given user info
+    """
+
+    async def startSession(token: dict) -> str:
+        return "session"
+
+    monkeypatch.setattr(auth.authSession, "startSession", startSession)
+    client = TestClient(auth.auth)
+
+    def login(sub: str, email: str):
+        async def authorizeAccessToken(request) -> dict:
+            return {"userinfo": {"sub": sub, "email": email, "roles": []}}
+
+        monkeypatch.setattr(
+            auth.oauthClient, "authorize_access_token", authorizeAccessToken
+        )
+        return client.get("/callback")
+
+    return login
+
+
+def userAudit(sub: str) -> list[Audit]:
+    with Session(engine) as session:
+        return list(
+            session.exec(
+                select(Audit)
+                .where(Audit.table == "user", Audit.target_id == sub)
+                .order_by(Audit.id)
+            ).all()
+        )
+
+
+def test_first_login_registers_and_audits_user(callback):
+    response = callback("u1", "u1@example.com")
+
+    assert response.status_code == 202, response.text
+    with Session(engine) as session:
+        user = session.get(User, "u1")
+        assert user is not None and user.email == "u1@example.com"
+    assert [(audit.action, audit.userId) for audit in userAudit("u1")] == [(0, "u1")]
+
+
+def test_login_with_changed_email_updates_and_audits_user(callback):
+    callback("u1", "u1@example.com")
+
+    response = callback("u1", "new@example.com")
+
+    assert response.status_code == 202, response.text
+    with Session(engine) as session:
+        assert session.get(User, "u1").email == "new@example.com"
+    assert [audit.action for audit in userAudit("u1")] == [0, 1]
+
+
+def test_login_of_known_user_writes_nothing(callback):
+    callback("u1", "u1@example.com")
+
+    response = callback("u1", "u1@example.com")
+
+    assert response.status_code == 202, response.text
+    assert len(userAudit("u1")) == 1
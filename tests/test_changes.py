@@ -0,0 +1,72 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlmodel import Session
+
+import api
+import api.routers
+from api.models import engine
+from api.models.base import timestamp
+from api.models.db import Audit, User
+from api.routers.changes import SETTLE_TIME
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(
+        api.routers,
+        "getClaims",
+        lambda token: {"sub": "u1", "roles": ["Requirements.Reader"]},
+    )
+    with Session(engine) as session:
+        session.add(User(id="u1", email="u1@example.com"))
+        session.commit()
+    return TestClient(api.api, headers={"Authorization": "Bearer test"})
+
+
+def addAudit(targetId: int, changed: float, inserted: float) -> None:
+    with Session(engine) as session:
+        session.connection().execute(
+            insert(Audit.__table__),  # type: ignore
+            {
+                "table": "requirement",
+                "target_id": str(targetId),
+                "action": 1,
+                "userId": "u1",
+                "timestamp": changed,
+                "inserted": inserted,
+            },
+        )
+        session.commit()
+
+
+def test_changes_hold_back_recently_inserted_queued_rows(client):
+    now: float = timestamp()
+    addAudit(1, now - 60, now - 60)
+    # a batch of the audit queue inserted just now for a change made a minute ago
+    addAudit(2, now - 60, now)
+
+    response = client.get("/changes", params={"since": 0})
+
+    assert response.status_code == 200, response.text
+    data: dict = response.json()["data"]
+    assert [change["id"] for change in data["changes"]] == ["1"]
+    assert data["more"] is True
+    assert data["cursor"] == 1
+
+
+def test_changes_return_settled_rows(client):
+    now: float = timestamp()
+    addAudit(1, now - 60, now - SETTLE_TIME - 1)
+
+    data: dict = client.get("/changes", params={"since": 0}).json()["data"]
+
+    assert [change["id"] for change in data["changes"]] == ["1"]
+    assert data["more"] is False
+
+
+def test_change_events_answer_not_found_if_the_feed_is_not_active(client):
+    response = client.get("/changes/events")
+
+    assert response.status_code == 404, response.text
+    assert "CHANGE_FEED_ACTIVE" in response.json()["message"]
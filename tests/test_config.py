@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+import api
+import api.routers
+from api.config import AppConfig
+from api.helper import checkAndUpdateConfigDB
+from api.models import engine
+from api.models.db import Configuration, User
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(
+        api.routers,
+        "getClaims",
+        lambda token: {"sub": "u1", "roles": ["Configuration.Writer"]},
+    )
+    with Session(engine) as session:
+        session.add(User(id="u1", email="u1@example.com"))
+        session.commit()
+    return TestClient(api.api, headers={"Authorization": "Bearer test"})
+
+
+def storedValue(key: str) -> str:
+    with Session(engine) as session:
+        return session.get(Configuration, key).value
+
+
+def test_failed_jwk_refetch_is_rate_limited(monkeypatch):
+    calls: list[int] = []
+
+    async def getJWKs() -> None:
+        calls.append(1)
+        raise ConnectionError("authority unavailable")
+
+    monkeypatch.setattr(AppConfig, "getJWKs", getJWKs)
+    monkeypatch.setattr(AppConfig, "JWT_JWK_FETCHED_AT", 0)
+    monkeypatch.setattr(AppConfig, "JWT_JWK_REFETCH_ATTEMPTED_AT", 0)
+    monkeypatch.setattr(AppConfig, "JWT_JWK_REFETCH", None)
+
+    async def refetchTwice() -> list[bool]:
+        return [await AppConfig.refetchJWKs(), await AppConfig.refetchJWKs()]
+
+    assert asyncio.run(refetchTwice()) == [False, False]
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize(
+    "key, value", [("AUDIT_RETENTION_DAYS", "ten"), ("AUDIT_ARCHIVE", "yes")]
+)
+def test_patch_rejects_value_of_wrong_type(client, key, value):
+    before = storedValue(key)
+
+    response = client.patch(f"/config/system/{key}", json={"value": value})
+
+    assert response.status_code == 422, response.text
+    assert storedValue(key) == before
+
+
+def test_patch_stores_integer(client):
+    response = client.patch(
+        "/config/system/AUDIT_RETENTION_DAYS", json={"value": " 10 "}
+    )
+
+    assert response.status_code == 200, response.text
+    assert storedValue("AUDIT_RETENTION_DAYS") == "10"
+
+
+def test_type_change_resets_invalid_value():
+    with Session(engine) as session:
+        item = session.get(Configuration, "AUDIT_RETENTION_DAYS")
+        item.type, item.value = "string", "ten"
+        session.commit()
+
+    checkAndUpdateConfigDB()
+
+    with Session(engine) as session:
+        item = session.get(Configuration, "AUDIT_RETENTION_DAYS")
+        assert (item.type, item.value) == ("integer", "0")
+
+
+def test_patch_rejects_soft_delete_retention_which_is_no_integer(client):
+    response = client.patch(
+        "/config/system/SOFT_DELETE_RETENTION_DAYS", json={"value": "1.5"}
+    )
+
+    assert response.status_code == 422, response.text
+    assert storedValue("SOFT_DELETE_RETENTION_DAYS") == "30"
@@ -0,0 +1,81 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import Session
+
+import api
+import api.routers
+from api.models import engine
+from api.models.configuration import DynamicConfiguration
+from api.models.db import Configuration, Requirement, Tag, Topic, User
+from api.models.search import SearchIndex
+from helper.cache import InvalidationBus
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(
+        api.routers,
+        "getClaims",
+        lambda token: {
+            "sub": "u1",
+            "roles": ["Requirements.Reader", "Requirements.Writer"],
+        },
+    )
+
+    async def publish(committed: list[dict]) -> None:
+        pass
+
+    monkeypatch.setattr(InvalidationBus, "publish", publish)
+    SearchIndex.create()
+    with Session(engine) as session:
+        session.add(User(id="u1", email="u1@example.com"))
+        session.commit()
+    yield TestClient(api.api, headers={"Authorization": "Bearer test"})
+    with engine.begin() as connection:
+        for model, _, _ in SearchIndex.tables.values():
+            connection.execute(text(f"DROP TABLE IF EXISTS {model.__tablename__}_fts"))
+
+
+def search(client, **params) -> list[tuple[str, int]]:
+    response = client.get("/search", params=params)
+    assert response.status_code == 200, response.text
+    return [(result["type"], result["id"]) for result in response.json()["data"]]
+
+
+def test_soft_deleted_rows_do_not_take_result_slots(client):
+    with Session(engine) as session:
+        session.get(Configuration, "SOFT_DELETE").value = "true"
+        topic = Topic(key="T1", title="Topic")
+        requirements = [
+            Requirement(key=f"R{i}", title="Firewall", description="R", parent=topic)
+            for i in range(3)
+        ]
+        session.add_all([topic, *requirements])
+        session.commit()
+        ids = [requirement.id for requirement in requirements]
+    DynamicConfiguration.evict(None)
+    for id in ids[:2]:
+        assert client.delete(f"/requirements/{id}").status_code == 204
+
+    assert search(client, query="firewall", types="requirements", limit=1) == [
+        ("requirements", ids[2])
+    ]
+
+
+def test_kinds_are_interleaved(client):
+    with Session(engine) as session:
+        topic = Topic(key="T1", title="Topic")
+        requirements = [
+            Requirement(key=f"R{i}", title="Firewall", description="R", parent=topic)
+            for i in range(3)
+        ]
+        tag = Tag(name="Firewall")
+        session.add_all([topic, *requirements, tag])
+        session.commit()
+        tagId = tag.id
+
+    results = search(client, query="firewall", limit=2)
+
+    assert [kind for kind, _ in results] == ["requirements", "tags"]
+    assert results[1] == ("tags", tagId)
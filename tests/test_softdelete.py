@@ -0,0 +1,110 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+import api
+import api.routers
+import api.routers.changes
+from api.models import engine
+from api.models.configuration import DynamicConfiguration
+from api.models.db import Audit, Comment, Configuration, Requirement, Topic, User
+from helper.cache import InvalidationBus
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(
+        api.routers,
+        "getClaims",
+        lambda token: {
+            "sub": "u1",
+            "roles": [
+                "Requirements.Reader",
+                "Requirements.Writer",
+                "Comments.Reader",
+                "Comments.Writer",
+            ],
+        },
+    )
+    monkeypatch.setattr(api.routers.changes, "SETTLE_TIME", 0)
+    with Session(engine) as session:
+        session.add(User(id="u1", email="u1@example.com"))
+        session.get(Configuration, "SOFT_DELETE").value = "true"
+        session.commit()
+    DynamicConfiguration.evict(None)
+    return TestClient(api.api, headers={"Authorization": "Bearer test"})
+
+
+@pytest.fixture
+def published(monkeypatch) -> list[dict]:
+    changes: list[dict] = []
+
+    async def publish(committed: list[dict]) -> None:
+        changes.extend(committed)
+
+    monkeypatch.setattr(InvalidationBus, "publish", publish)
+    return changes
+
+
+def addTopicWithRequirements() -> tuple[int, list[int], int]:
+    with Session(engine) as session:
+        topic = Topic(key="T1", title="Topic")
+        requirements = [
+            Requirement(key=f"R{i}", title="R", description="R", parent=topic)
+            for i in range(3)
+        ]
+        comment = Comment(comment="C", requirement=requirements[0], authorId="u1")
+        session.add_all([topic, *requirements, comment])
+        session.commit()
+        return topic.id, [r.id for r in requirements], comment.id
+
+
+def test_soft_delete_reports_marked_children(client, published):
+    topicId, requirementIds, commentId = addTopicWithRequirements()
+    cursor: int = client.get("/changes").json()["data"]["cursor"]
+
+    response = client.delete(f"/topics/{topicId}", params={"force": True})
+
+    assert response.status_code == 204, response.text
+    deleted: set = {
+        (change["type"], change["id"])
+        for change in published
+        if change["verb"] == "DELETE"
+    }
+    assert deleted == {
+        ("topics", topicId),
+        *(("requirements", id) for id in requirementIds),
+        ("comments", commentId),
+    }
+    changes: list[dict] = client.get("/changes", params={"since": cursor}).json()[
+        "data"
+    ]["changes"]
+    assert {(c["type"], c["id"], c["verb"]) for c in changes} == {
+        ("topics", str(topicId), "DELETE"),
+        *(("requirements", str(id), "DELETE") for id in requirementIds),
+        ("comments", str(commentId), "DELETE"),
+    }
+    with Session(engine) as session:
+        audits = session.exec(select(Audit).where(Audit.action == 2)).all()
+        assert {(audit.table, audit.userId) for audit in audits} == {
+            ("topic", "u1"),
+            ("requirement", "u1"),
+            ("comment", "u1"),
+        }
+
+
+def test_key_of_soft_deleted_requirement_conflicts(client, published):
+    topicId, requirementIds, _ = addTopicWithRequirements()
+    client.delete(f"/requirements/{requirementIds[1]}")
+
+    response = client.post(
+        "/requirements",
+        json={"key": "R1", "title": "R", "description": "R", "parentId": topicId},
+    )
+
+    assert response.status_code == 409, response.text
+    assert "belongs to a deleted requirement" in response.json()["message"][0]
+    response = client.patch(f"/requirements/{requirementIds[0]}", json={"key": "R1"})
+    assert response.status_code == 409, response.text
+    response = client.patch(f"/requirements/{requirementIds[0]}", json={"key": "R9"})
+    assert response.status_code == 200, response.text
@@ -0,0 +1,115 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+import api
+import api.routers
+from api.models import engine
+from api.models.configuration import DynamicConfiguration
+from api.models.db import Configuration, Requirement, Topic, User
+from helper.cache import InvalidationBus
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(
+        api.routers,
+        "getClaims",
+        lambda token: {
+            "sub": "u1",
+            "roles": ["Requirements.Reader", "Requirements.Writer"],
+        },
+    )
+
+    async def publish(committed: list[dict]) -> None:
+        pass
+
+    monkeypatch.setattr(InvalidationBus, "publish", publish)
+    with Session(engine) as session:
+        session.add(User(id="u1", email="u1@example.com"))
+        session.commit()
+    return TestClient(api.api, headers={"Authorization": "Bearer test"})
+
+
+def addTopics() -> tuple[int, int, int]:
+    """
+    Adds the topics T1 and T2 and T3 with a requirement
+    """
+    with Session(engine) as session:
+        topics = [Topic(key=f"T{i}", title="Topic") for i in range(1, 4)]
+        requirement = Requirement(
+            key="R1", title="R", description="R", parent=topics[2]
+        )
+        session.add_all([*topics, requirement])
+        session.commit()
+        return topics[0].id, topics[1].id, topics[2].id
+
+
+def parentOf(topicId: int) -> int | None:
+    with Session(engine) as session:
+        return session.get(Topic, topicId).parentId
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_move_below_missing_parent_is_not_found(client, bulk):
+    topicId, _, _ = addTopics()
+
+    if bulk:
+        response = client.patch("/topics/bulk", json=[{"id": topicId, "parentId": 99}])
+    else:
+        response = client.patch(f"/topics/{topicId}", json={"parentId": 99})
+
+    assert response.status_code == 404, response.text
+    assert parentOf(topicId) is None
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_move_below_parent_with_requirements_conflicts(client, bulk):
+    topicId, _, parentId = addTopics()
+
+    if bulk:
+        response = client.patch(
+            "/topics/bulk", json=[{"id": topicId, "parentId": parentId}]
+        )
+    else:
+        response = client.patch(f"/topics/{topicId}", json={"parentId": parentId})
+
+    assert response.status_code == 409, response.text
+    assert "Topic has already requirements." in response.json()["message"]
+    assert parentOf(topicId) is None
+
+
+def test_move_below_parent(client):
+    topicId, parentId, _ = addTopics()
+
+    response = client.patch(f"/topics/{topicId}", json={"parentId": parentId})
+
+    assert response.status_code == 200, response.text
+    assert parentOf(topicId) == parentId
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_move_below_soft_deleted_child_is_not_found(client, bulk):
+    with Session(engine) as session:
+        session.get(Configuration, "SOFT_DELETE").value = "true"
+        topic = Topic(key="T1", title="Topic")
+        child = Topic(key="T2", title="Child", parent=topic)
+        session.add_all([topic, child])
+        session.commit()
+        topicId, childId = topic.id, child.id
+    DynamicConfiguration.evict(None)
+    response = client.delete(
+        f"/topics/{childId}", params={"force": True, "cascade": True}
+    )
+    assert response.status_code == 204, response.text
+
+    if bulk:
+        response = client.patch(
+            "/topics/bulk", json=[{"id": topicId, "parentId": childId}]
+        )
+    else:
+        response = client.patch(f"/topics/{topicId}", json={"parentId": childId})
+
+    assert response.status_code == 404, response.text
+    assert response.json()["message"] == "Parent not found"
+    assert parentOf(topicId) is None